@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+"""
+Cold start benchmark for the three Lambda functions.
+
+Each function's handler module is imported in a fresh interpreter, from its own
+CodeUri directory as Lambda does, several times over. For each function it reports
+the median time to import the handler (the init phase Lambda bills before the first
+invocation) and, from `python -X importtime`, the imports that cost the most.
+
+    python benchmarks/cold_start.py [--runs 10] [--top 8]
+
+No AWS access is needed: clients are built lazily, and the environment the
+functions read at import time is filled with placeholders.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SAM_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FUNCTIONS = ['metric_migrate_trigger', 'migrate_metric', 'timeshift']
+SHARED_DIR = os.path.join(SAM_DIR, 'shared')
+
+# Placeholders for the environment variables read at import time
+ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'benchmark',
+    'AWS_SECRET_ACCESS_KEY': 'benchmark',
+    'S3_CSV_LOADING_LAMBDA_ARN': 'arn:aws:lambda:us-east-1:123456789012:function:s3-csv',
+    'TIMESHIFT_CACHE_DIR': os.path.join(os.environ.get('TMPDIR', '/tmp'), 'timeshift-cold-start'),  # nosec B108 - benchmark scratch space
+    'LOG_LEVEL': 'WARNING'
+}
+
+INIT_SCRIPT = "import time; start = time.perf_counter(); import app; print(time.perf_counter() - start)"
+
+
+def run_init(functionDir, importTime=False):
+    """Import the handler of functionDir in a fresh interpreter; (seconds, stderr)"""
+    command = [sys.executable] + (['-X', 'importtime'] if importTime else []) + ['-c', INIT_SCRIPT]
+    # The shared layer's modules are on the path, as Lambda puts them under /opt/python
+    environment = dict(os.environ, **ENVIRONMENT, PYTHONPATH=SHARED_DIR)
+    completed = subprocess.run(command, cwd=os.path.join(SAM_DIR, functionDir), env=environment,
+                               capture_output=True, text=True, check=True)
+    return float(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def heaviest_imports(importTimeOutput, count):
+    """
+    The modules the handler imports directly, by cumulative import time, from the
+    'import time: self [us] | cumulative | imported package' lines of -X importtime.
+    Each import is listed after the imports it triggered, indented one level deeper.
+    """
+    children = []
+    for line in importTimeOutput.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((name.strip(), int(cumulative)))
+        elif depth == 0:
+            if name.strip() == 'app':
+                return sorted(children, key=lambda child: child[1], reverse=True)[:count]
+            children = []
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='fresh interpreters per function (default 10)')
+    parser.add_argument('--top', type=int, default=8, help='heaviest imports to list per function (default 8)')
+    args = parser.parse_args()
+
+    print(f"Python {sys.version.split()[0]}, {args.runs} runs per function")
+    for functionDir in FUNCTIONS:
+        times = [run_init(functionDir)[0] for _ in range(args.runs)]
+        _, importTimeOutput = run_init(functionDir, importTime=True)
+        print(f"\n{functionDir}: handler init median {statistics.median(times) * 1000:.1f} ms "
+              f"(min {min(times) * 1000:.1f}, max {max(times) * 1000:.1f})")
+        for name, microseconds in heaviest_imports(importTimeOutput, args.top):
+            print(f"  {microseconds / 1000:8.1f} ms  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,497 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+"""
+In-process stand-ins for the AWS services the Lambdas call, for the offline benchmarks.
+
+FakeCloudWatch serves list_metrics and get_metric_data from a series.SeriesSet with the
+API's paging (500 metrics per list_metrics page, 100,800 datapoints per GetMetricData
+page) and can throttle a share of calls. FileSystemS3 keeps objects as files under a
+directory, so archives of any size can be written and read back without holding them
+in memory. CsvLoaderLambda answers invoke() like the S3 CSV data source Lambda, and
+FakeSqs takes the trigger's messages and hands them out in batches like an SQS event
+source mapping.
+"""
+import datetime
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import deque
+
+from botocore.exceptions import ClientError
+
+LIST_METRICS_PAGE_SIZE = 500
+MAX_DATAPOINTS_PER_PAGE = 100800
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def client_error(code, operation):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+
+def to_epoch(value):
+    return int(value.timestamp()) if isinstance(value, datetime.datetime) else int(value)
+
+
+class FakeCloudWatch:
+    """
+    The CloudWatch client calls of migrate_metric. throttleRate is the share of calls
+    that fail with a Throttling error, spread evenly from the first call on so that
+    runs are repeatable; latency is added to every call. Counters of calls and
+    throttles are kept for the report.
+    """
+
+    def __init__(self, seriesSet, throttleRate=0.0, latency=0.0):
+        self.seriesSet = seriesSet
+        self.throttleRate = throttleRate
+        self.latency = latency
+        self.calls = {'ListMetrics': 0, 'GetMetricData': 0}
+        self.throttles = 0
+        self._lock = threading.Lock()
+
+    def _call(self, operation):
+        with self._lock:
+            self.calls[operation] += 1
+            made = sum(self.calls.values())
+            throttled = int(made * self.throttleRate + 1 - self.throttleRate) > int((made - 1) * self.throttleRate + 1 - self.throttleRate)
+            if throttled:
+                self.throttles += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if throttled:
+            raise client_error('Throttling', operation)
+
+    def list_metrics(self, Namespace, MetricName=None, Dimensions=None, NextToken=None, **kwargs):
+        self._call('ListMetrics')
+        matching = [
+            metric for metric in self.seriesSet.metrics()
+            if metric['Namespace'] == Namespace and (MetricName is None or metric['MetricName'] == MetricName)
+            and all(any(have['Name'] == want['Name'] and want.get('Value', have['Value']) == have['Value'] for have in metric['Dimensions'])
+                    for want in Dimensions or [])
+        ]
+        start = int(NextToken or 0)
+        response = {'Metrics': matching[start:start + LIST_METRICS_PAGE_SIZE]}
+        if start + LIST_METRICS_PAGE_SIZE < len(matching):
+            response['NextToken'] = str(start + LIST_METRICS_PAGE_SIZE)
+        return response
+
+    def get_metric_data(self, MetricDataQueries, StartTime, EndTime, ScanBy='TimestampDescending', NextToken=None, **kwargs):
+        """
+        Results in query order, each cut off once the page holds MAX_DATAPOINTS_PER_PAGE
+        points. The NextToken is '<query index>:<timestamp>' of the first point left out.
+        """
+        self._call('GetMetricData')
+        startEpoch, endEpoch = to_epoch(StartTime), to_epoch(EndTime)
+        firstQuery, resumeAt = 0, startEpoch
+        if NextToken is not None:
+            firstQuery, resumeAt = (int(part) for part in NextToken.split(':'))
+
+        results = []
+        remaining = MAX_DATAPOINTS_PER_PAGE
+        nextToken = None
+        for queryIndex, query in enumerate(MetricDataQueries):
+            result = {'Id': query['Id'], 'Label': query['Id'], 'Timestamps': [], 'Values': [], 'StatusCode': 'Complete'}
+            results.append(result)
+            if queryIndex < firstQuery or nextToken is not None:
+                continue
+            stat = query['MetricStat']
+            metricIndex = self.seriesSet.metric_index(stat['Metric'])
+            if metricIndex is None:
+                continue
+            timestamps = self.seriesSet.timestamps(metricIndex, resumeAt if queryIndex == firstQuery else startEpoch, endEpoch, stat['Period'])
+            if len(timestamps) > remaining:
+                nextToken = f"{queryIndex}:{timestamps[remaining]}"
+                timestamps = timestamps[:remaining]
+                result['StatusCode'] = 'PartialData'
+            remaining -= len(timestamps)
+            if ScanBy != 'TimestampAscending':
+                timestamps.reverse()
+            result['Timestamps'] = [datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc) for timestamp in timestamps]
+            result['Values'] = [self.seriesSet.value(metricIndex, stat['Stat'], timestamp) for timestamp in timestamps]
+
+        response = {'MetricDataResults': results, 'Messages': []}
+        if nextToken is not None:
+            response['NextToken'] = nextToken
+        return response
+
+
+class FileBody:
+    """A StreamingBody over a byte range of a file"""
+
+    def __init__(self, path, start=0, length=None):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = length if length is not None else os.path.getsize(path) - start
+
+    def read(self, amt=None):
+        if self._remaining <= 0:
+            return b''
+        size = self._remaining if amt is None else min(amt, self._remaining)
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        if not self._remaining:
+            self._file.close()
+        return data
+
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def iter_lines(self, chunk_size=1024, keepends=False):
+        pending = b''
+        for chunk in self.iter_chunks(chunk_size):
+            lines = (pending + chunk).splitlines(True)
+            pending = b''
+            for line in lines:
+                if line.endswith(b'\n'):
+                    yield line if keepends else line.rstrip(b'\r\n')
+                else:
+                    pending = line
+        if pending:
+            yield pending
+
+    def close(self):
+        self._file.close()
+
+
+class FileSystemS3:
+    """
+    The S3 client calls of the Lambdas, with each object stored as a file at
+    <root>/<bucket>/<key> and its ETag and user metadata in a JSON file beside it
+    under <root>/.metadata. Multipart parts are files under <root>/.uploads until
+    the upload completes.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._uploads = 0
+
+    def _count(self, operation):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, key)
+
+    def _metadata_path(self, bucket, key):
+        return os.path.join(self.root, '.metadata', bucket, key + '.json')
+
+    def _upload_path(self, uploadId, partNumber=None):
+        path = os.path.join(self.root, '.uploads', uploadId)
+        return path if partNumber is None else os.path.join(path, f"{partNumber:05d}")
+
+    def _head(self, bucket, key, operation):
+        try:
+            with open(self._metadata_path(bucket, key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise client_error('404' if operation == 'HeadObject' else 'NoSuchKey', operation)
+
+    def _store(self, bucket, key, source, metadata, contentType):
+        """Move the finished file at source into place and record its ETag"""
+        digest = hashlib.md5(usedforsecurity=False)
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        path = self._path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source, path)
+        head = {'ETag': f'"{digest.hexdigest()}"', 'Metadata': dict(metadata or {}), 'ContentType': contentType, 'ContentLength': os.path.getsize(path)}
+        metadataPath = self._metadata_path(bucket, key)
+        os.makedirs(os.path.dirname(metadataPath), exist_ok=True)
+        with open(metadataPath, 'w') as f:
+            json.dump(head, f)
+        return head
+
+    def _check_conditions(self, bucket, key, operation, IfMatch=None, IfNoneMatch=None):
+        exists = os.path.exists(self._metadata_path(bucket, key))
+        if IfNoneMatch == '*' and exists:
+            raise client_error('PreconditionFailed', operation)
+        if IfMatch is not None and (not exists or self._head(bucket, key, operation)['ETag'] != IfMatch):
+            raise client_error('PreconditionFailed', operation)
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, Metadata=None, ContentType='binary/octet-stream', **kwargs):
+        self._count('PutObject')
+        self._check_conditions(Bucket, Key, 'PutObject', IfMatch, IfNoneMatch)
+        staging = self._upload_path(f"put-{threading.get_ident()}-{time.monotonic_ns()}")
+        os.makedirs(os.path.dirname(staging), exist_ok=True)
+        with open(staging, 'wb') as f:
+            f.write(Body.encode('utf-8') if isinstance(Body, str) else bytes(Body))
+        return {'ETag': self._store(Bucket, Key, staging, Metadata, ContentType)['ETag']}
+
+    def put_chunks(self, Bucket, Key, chunks, ContentType='text/csv'):
+        """Write an object from an iterable of text or byte chunks; for building fixtures, not used by the Lambdas"""
+        staging = self._upload_path(f"put-{threading.get_ident()}-{time.monotonic_ns()}")
+        os.makedirs(os.path.dirname(staging), exist_ok=True)
+        with open(staging, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        return self._store(Bucket, Key, staging, None, ContentType)
+
+    def head_object(self, Bucket, Key, IfMatch=None, **kwargs):
+        self._count('HeadObject')
+        head = self._head(Bucket, Key, 'HeadObject')
+        if IfMatch is not None and head['ETag'] != IfMatch:
+            raise client_error('PreconditionFailed', 'HeadObject')
+        return dict(head)
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None, **kwargs):
+        self._count('GetObject')
+        head = self._head(Bucket, Key, 'GetObject')
+        if IfMatch is not None and head['ETag'] != IfMatch:
+            raise client_error('PreconditionFailed', 'GetObject')
+        size = head['ContentLength']
+        response = {'ETag': head['ETag'], 'Metadata': head['Metadata'], 'ContentType': head['ContentType']}
+        first, length = 0, size
+        if Range is not None:
+            start, _, end = Range.replace('bytes=', '').partition('-')
+            if start == '':
+                first = max(0, size - int(end))
+                last = size - 1
+            else:
+                first = int(start)
+                last = min(size - 1, int(end)) if end else size - 1
+            if first >= size:
+                raise client_error('InvalidRange', 'GetObject')
+            length = last - first + 1
+            response['ContentRange'] = f"bytes {first}-{last}/{size}"
+        response['Body'] = FileBody(self._path(Bucket, Key), first, length)
+        response['ContentLength'] = length
+        return response
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._count('DeleteObject')
+        for path in (self._path(Bucket, Key), self._metadata_path(Bucket, Key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return {}
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        for entry in Delete['Objects']:
+            self.delete_object(Bucket, entry['Key'])
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, MaxKeys=1000, **kwargs):
+        self._count('ListObjectsV2')
+        metadataRoot = os.path.join(self.root, '.metadata', Bucket)
+        keys = []
+        for directory, _, files in os.walk(metadataRoot):
+            for name in files:
+                key = os.path.relpath(os.path.join(directory, name), metadataRoot)[:-len('.json')].replace(os.sep, '/')
+                if key.startswith(Prefix):
+                    keys.append(key)
+        keys.sort()
+        if ContinuationToken is not None:
+            keys = [key for key in keys if key > ContinuationToken]
+        page = keys[:MaxKeys]
+        response = {
+            'Contents': [{'Key': key, 'Size': os.path.getsize(self._path(Bucket, key))} for key in page],
+            'KeyCount': len(page),
+            'IsTruncated': len(keys) > MaxKeys
+        }
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = page[-1]
+        return response
+
+    def create_multipart_upload(self, Bucket, Key, Metadata=None, ContentType='binary/octet-stream', **kwargs):
+        self._count('CreateMultipartUpload')
+        with self._lock:
+            self._uploads += 1
+            uploadId = f"upload-{os.getpid()}-{self._uploads}"
+        os.makedirs(self._upload_path(uploadId))
+        with open(os.path.join(self._upload_path(uploadId), 'upload.json'), 'w') as f:
+            json.dump({'Key': Key, 'Metadata': dict(Metadata or {}), 'ContentType': ContentType}, f)
+        return {'UploadId': uploadId}
+
+    def _upload(self, uploadId, operation):
+        try:
+            with open(os.path.join(self._upload_path(uploadId), 'upload.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise client_error('NoSuchUpload', operation)
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._count('UploadPart')
+        self._upload(UploadId, 'UploadPart')
+        with open(self._upload_path(UploadId, PartNumber), 'wb') as f:
+            f.write(Body.encode('utf-8') if isinstance(Body, str) else bytes(Body))
+        return {'ETag': f'"{UploadId}-{PartNumber}"'}
+
+    def upload_part_copy(self, Bucket, Key, UploadId, PartNumber, CopySource, CopySourceRange=None, CopySourceIfMatch=None, **kwargs):
+        self._count('UploadPartCopy')
+        self._upload(UploadId, 'UploadPartCopy')
+        head = self._head(CopySource['Bucket'], CopySource['Key'], 'UploadPartCopy')
+        if CopySourceIfMatch is not None and head['ETag'] != CopySourceIfMatch:
+            raise client_error('PreconditionFailed', 'UploadPartCopy')
+        start, length = 0, head['ContentLength']
+        if CopySourceRange is not None:
+            first, _, last = CopySourceRange.replace('bytes=', '').partition('-')
+            start, length = int(first), int(last) - int(first) + 1
+        body = FileBody(self._path(CopySource['Bucket'], CopySource['Key']), start, length)
+        with open(self._upload_path(UploadId, PartNumber), 'wb') as f:
+            for chunk in body.iter_chunks(READ_CHUNK_SIZE):
+                f.write(chunk)
+        return {'CopyPartResult': {'ETag': f'"{UploadId}-{PartNumber}"'}}
+
+    def list_parts(self, Bucket, Key, UploadId, **kwargs):
+        self._count('ListParts')
+        self._upload(UploadId, 'ListParts')
+        parts = sorted(int(name) for name in os.listdir(self._upload_path(UploadId)) if name.isdigit())
+        return {'Parts': [{'PartNumber': number, 'ETag': f'"{UploadId}-{number}"', 'Size': os.path.getsize(self._upload_path(UploadId, number))}
+                          for number in parts]}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._count('CompleteMultipartUpload')
+        upload = self._upload(UploadId, 'CompleteMultipartUpload')
+        staging = self._upload_path(UploadId) + '.object'
+        with open(staging, 'wb') as target:
+            for part in MultipartUpload['Parts']:
+                with open(self._upload_path(UploadId, part['PartNumber']), 'rb') as source:
+                    shutil.copyfileobj(source, target, READ_CHUNK_SIZE)
+        head = self._store(Bucket, Key, staging, upload['Metadata'], upload['ContentType'])
+        shutil.rmtree(self._upload_path(UploadId))
+        return {'ETag': head['ETag']}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self._count('AbortMultipartUpload')
+        shutil.rmtree(self._upload_path(UploadId), ignore_errors=True)
+        return {}
+
+
+class CsvLoaderLambda:
+    """
+    The Lambda client call of the timeshift function, answered as the S3 CSV data source
+    would: the archive at Arguments [bucket, key] is read whole from a FileSystemS3 and
+    each column returned as a result over [StartTime, EndTime), Timestamps in epoch
+    seconds. With pagePoints set, responses are paged with a NextToken.
+    """
+
+    def __init__(self, s3, pagePoints=None):
+        self.s3 = s3
+        self.pagePoints = pagePoints
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _results(self, bucket, key, startEpoch, endEpoch):
+        body = self.s3.get_object(Bucket=bucket, Key=key)['Body']
+        lines = body.iter_lines(chunk_size=READ_CHUNK_SIZE)
+        columns = next(lines).decode('utf-8').split(',')[1:]
+        results = [{'Label': column, 'StatusCode': 'Complete', 'Timestamps': [], 'Values': []} for column in columns]
+        for line in lines:
+            cells = line.decode('utf-8').split(',')
+            timestamp = int(datetime.datetime.fromisoformat(cells[0]).timestamp())
+            if timestamp < startEpoch:
+                continue
+            if timestamp >= endEpoch:
+                break
+            for result, cell in zip(results, cells[1:]):
+                if cell:
+                    result['Timestamps'].append(timestamp)
+                    result['Values'].append(float(cell))
+        return results
+
+    def invoke(self, FunctionName, Payload, InvocationType='RequestResponse', **kwargs):
+        with self._lock:
+            self.calls += 1
+        request = json.loads(Payload)['GetMetricDataRequest']
+        bucket, key = request['Arguments'][:2]
+        results = self._results(bucket, key, request['StartTime'], request['EndTime'])
+        response = {'MetricDataResults': results}
+        if self.pagePoints:
+            offset = int(request.get('NextToken') or 0)
+            flat = [(index, n) for index, result in enumerate(results) for n in range(len(result['Timestamps']))]
+            page = flat[offset:offset + self.pagePoints]
+            pageResults = {}
+            for index, n in page:
+                result = pageResults.setdefault(index, dict(results[index], Timestamps=[], Values=[]))
+                result['Timestamps'].append(results[index]['Timestamps'][n])
+                result['Values'].append(results[index]['Values'][n])
+            response = {'MetricDataResults': list(pageResults.values())}
+            if offset + self.pagePoints < len(flat):
+                response['NextToken'] = str(offset + self.pagePoints)
+        return {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(response).encode('utf-8'))}
+
+
+class FakeSqs:
+    """
+    The SQS client calls of the trigger, plus the receiving side of an event source
+    mapping: receive() hands out up to batchSize visible messages as Lambda records,
+    delete() removes them once processed and release() makes them visible again.
+    Messages received more than maxReceiveCount times go to deadLetters instead.
+    """
+
+    def __init__(self, maxReceiveCount=5):
+        self.maxReceiveCount = maxReceiveCount
+        self.sent = 0
+        self.peakDepth = 0
+        self.deadLetters = []
+        self._visible = deque()
+        self._inFlight = {}
+        self._condition = threading.Condition()
+
+    def _enqueue(self, body):
+        message = {'messageId': str(uuid.uuid4()), 'body': body, 'attributes': {'ApproximateReceiveCount': '0'}, 'sentAt': time.perf_counter()}
+        self._visible.append(message)
+        self.sent += 1
+        self.peakDepth = max(self.peakDepth, len(self._visible) + len(self._inFlight))
+        return message['messageId']
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        with self._condition:
+            messageId = self._enqueue(MessageBody)
+            self._condition.notify()
+        return {'MessageId': messageId}
+
+    def send_message_batch(self, QueueUrl, Entries, **kwargs):
+        if len(Entries) > 10:
+            raise client_error('AWS.SimpleQueueService.TooManyEntriesInBatchRequest', 'SendMessageBatch')
+        with self._condition:
+            successful = [{'Id': entry['Id'], 'MessageId': self._enqueue(entry['MessageBody'])} for entry in Entries]
+            self._condition.notify_all()
+        return {'Successful': successful, 'Failed': []}
+
+    def depth(self):
+        """Messages waiting or being processed"""
+        with self._condition:
+            return len(self._visible) + len(self._inFlight)
+
+    def receive(self, batchSize=10, waitSeconds=0.1):
+        """Up to batchSize messages as SQS event records, waiting up to waitSeconds for the first"""
+        with self._condition:
+            if not self._visible:
+                self._condition.wait(waitSeconds)
+            batch = []
+            while self._visible and len(batch) < batchSize:
+                message = self._visible.popleft()
+                message['attributes']['ApproximateReceiveCount'] = str(int(message['attributes']['ApproximateReceiveCount']) + 1)
+                message['receivedAt'] = time.perf_counter()
+                self._inFlight[message['messageId']] = message
+                batch.append(message)
+        return batch
+
+    def delete(self, messageId):
+        with self._condition:
+            self._inFlight.pop(messageId, None)
+
+    def release(self, messageId):
+        """Return a failed message to the queue, or to deadLetters after maxReceiveCount receives"""
+        with self._condition:
+            message = self._inFlight.pop(messageId, None)
+            if message is None:
+                return
+            if int(message['attributes']['ApproximateReceiveCount']) >= self.maxReceiveCount:
+                self.deadLetters.append(message)
+            else:
+                self._visible.append(message)
+                self._condition.notify()
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+"""
+Local end-to-end load test of the trigger -> queue -> migrate -> archive -> timeshift pipeline.
+
+Migration requests arrive on the ramping arrival-rate profile of k6/script.js and go
+through the real handlers of all three functions, in this process:
+
+    trigger     each request is handled by the trigger, called directly or, with --http,
+                through a local HTTP server standing in for API Gateway
+    queue       messages wait in a local SQS stand-in until one of --workers pollers,
+                the migrate function's concurrency, takes them in batches of up to 10
+    migrate     each batch is one worker invocation, fetching from a CloudWatch fake
+                and archiving to an S3 stand-in on the local filesystem
+    timeshift   once a job's archive is complete, a dashboard query shifted by one day
+                reads it back through the timeshift connector and the loader stand-in
+    end-to-end  from a request's scheduled arrival until its timeshift query returns
+
+For each stage the run reports p50/p95/p99 latency and throughput. As in k6, a request
+that finds all --vus busy when it is due is dropped and counted. The profile takes 40
+minutes as written; --time-scale shortens it and --rate-scale lowers its arrival rates.
+
+    python benchmarks/load.py --time-scale 0.05 --rate-scale 0.5
+    python benchmarks/load.py --stages 30s:20,1m:20,30s:0 --http
+
+Everything shares one interpreter, so absolute numbers are bounded by the GIL rather
+than by Lambda scaling; compare runs made on the same machine.
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAM_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+K6_SCRIPT = os.path.join(SAM_DIR, '..', 'k6', 'script.js')
+FUNCTIONS = ['metric_migrate_trigger', 'migrate_metric', 'timeshift']
+BUCKET = 'load-test'
+QUEUE_URL = 'https://sqs.us-east-1.amazonaws.com/123456789012/load-test'
+SHIFT = 'P1D'
+SHIFT_SECONDS = 86400
+STAGE_NAMES = ['trigger', 'queue', 'migrate', 'timeshift', 'end-to-end']
+
+# Matches the migrate function's event source mapping and redrive policy in template.yaml
+BATCH_SIZE = 10
+MAX_RECEIVE_COUNT = 5
+
+ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'load-test',
+    'AWS_SECRET_ACCESS_KEY': 'load-test',
+    'ARCHIVED_METRICS_BUCKET_NAME': BUCKET,
+    'MIGRATION_QUEUE_URL': QUEUE_URL,
+    'S3_CSV_LOADING_LAMBDA_ARN': 'arn:aws:lambda:us-east-1:123456789012:function:s3-csv',
+    # Records of concurrent invocations would be interleaved in one process
+    'STAGE_METRICS_ENABLED': 'false'
+}
+
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_duration(text):
+    """Seconds in a k6 duration such as '90s', '2m' or '1h30m'"""
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|s|m|h)', text)
+    if not parts or ''.join(number + unit for number, unit in parts) != text.strip():
+        raise ValueError(f"Invalid duration: {text}")
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+
+def parse_stages(text):
+    """[(seconds, target rate)] from '30s:10,1m:40'"""
+    stages = []
+    for stage in text.split(','):
+        duration, _, target = stage.partition(':')
+        stages.append((parse_duration(duration), float(target)))
+    return stages
+
+
+def k6_profile(path):
+    """(startRate, [(seconds, target rate)]) of the ramping-arrival-rate scenario in a k6 script"""
+    with open(path) as f:
+        script = f.read()
+    startRate = re.search(r"startRate:\s*'?(\d+(?:\.\d+)?)'?", script)
+    stages = re.findall(r"\{\s*duration:\s*'([^']+)',\s*target:\s*(\d+(?:\.\d+)?)\s*\}", script)
+    if startRate is None or not stages:
+        raise ValueError(f"No ramping-arrival-rate stages found in {path}")
+    return float(startRate.group(1)), [(parse_duration(duration), float(target)) for duration, target in stages]
+
+
+def arrival_offsets(stages, startRate, timeScale=1.0, rateScale=1.0):
+    """
+    Start offsets in seconds of the iterations of a ramping-arrival-rate scenario: the
+    rate moves linearly to each stage's target over its duration, and an iteration
+    starts each time the number due, the integral of the rate, passes a whole number.
+    """
+    stageStart = 0.0
+    due = 0.0
+    count = 0
+    rate = startRate * rateScale
+    for seconds, target in stages:
+        duration = seconds * timeScale
+        target *= rateScale
+        slope = (target - rate) / duration if duration else 0.0
+        while duration:
+            needed = count - due
+            if slope:
+                discriminant = rate * rate + 2 * slope * needed
+                if discriminant < 0:
+                    break
+                offset = (math.sqrt(discriminant) - rate) / slope
+            elif rate > 0:
+                offset = needed / rate
+            else:
+                break
+            if offset >= duration:
+                break
+            yield stageStart + offset
+            count += 1
+        due += rate * duration + slope * duration * duration / 2
+        stageStart += duration
+        rate = target
+
+
+class Latencies:
+    """Latencies and failures of each stage, safe to record from any thread"""
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGE_NAMES}
+        self.errors = {stage: 0 for stage in STAGE_NAMES}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, ok=True):
+        with self._lock:
+            if ok:
+                self.samples[stage].append(seconds)
+            else:
+                self.errors[stage] += 1
+
+    def count(self, stage):
+        with self._lock:
+            return len(self.samples[stage])
+
+    def summary(self, elapsed):
+        """{stage: {count, errors, perSecond, p50, p95, p99, max}} with latencies in milliseconds"""
+        summary = {}
+        with self._lock:
+            for stage in STAGE_NAMES:
+                samples = sorted(self.samples[stage])
+                summary[stage] = {
+                    'count': len(samples),
+                    'errors': self.errors[stage],
+                    'perSecond': len(samples) / elapsed if elapsed else 0.0
+                }
+                for name, fraction in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99), ('max', 1.0)):
+                    # Nearest rank
+                    summary[stage][name] = samples[max(0, math.ceil(fraction * len(samples)) - 1)] * 1000 if samples else None
+        return summary
+
+
+class LocalApi(ThreadingHTTPServer):
+    """API Gateway stand-in: POST /migrate is handed to the trigger as a proxy integration event"""
+    daemon_threads = True
+
+    def __init__(self, handler):
+        self.handler = handler
+        super().__init__(('127.0.0.1', 0), ApiRequestHandler)
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        if self.path != '/migrate':
+            response = {'statusCode': 404, 'headers': {}, 'body': '{"message": "Not Found"}'}
+        else:
+            response = self.server.handler({'httpMethod': 'POST', 'path': self.path, 'headers': dict(self.headers), 'body': body}, None)
+        payload = response.get('body', '').encode('utf-8')
+        self.send_response(response['statusCode'])
+        for name, value in response.get('headers', {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Pipeline:
+    """The three functions wired to the local stand-ins, and the bookkeeping of the jobs going through them"""
+
+    def __init__(self, args, workDir):
+        os.environ.update(ENVIRONMENT, TIMESHIFT_READER_MODE=args.reader, TIMESHIFT_CACHE_DIR=os.path.join(workDir, 'cache'))
+        for functionDir in FUNCTIONS + ['shared']:
+            sys.path.insert(0, os.path.join(SAM_DIR, functionDir))
+        sys.path.insert(0, SAM_DIR)
+        import metric_migrate_trigger.app as trigger
+        import migrate_metric.app as worker
+        import timeshift.app as timeshift
+        from fakes import CsvLoaderLambda, FakeCloudWatch, FakeSqs, FileSystemS3
+        from series import SeriesSet
+        logging.getLogger().setLevel(args.log_level)
+
+        self.args = args
+        self.seriesSet = SeriesSet(args.metrics, args.stats, args.points)
+        self.s3 = FileSystemS3(os.path.join(workDir, 's3'))
+        self.sqs = FakeSqs(MAX_RECEIVE_COUNT)
+        trigger.sqs_client = self.sqs
+        worker.metrics = FakeCloudWatch(self.seriesSet)
+        worker.s3_client = self.s3
+        timeshift.s3_client = self.s3
+        timeshift.lambda_client = CsvLoaderLambda(self.s3)
+        self.trigger, self.worker, self.timeshift = trigger, worker, timeshift
+
+        self.latencies = Latencies()
+        self.jobs = {}
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._vus = threading.BoundedSemaphore(args.vus)
+        self._iterations = ThreadPoolExecutor(max_workers=args.vus, thread_name_prefix='vu')
+        self._queries = ThreadPoolExecutor(max_workers=args.timeshift_concurrency, thread_name_prefix='timeshift')
+        self._pendingQueries = 0
+        self._stopping = threading.Event()
+        self._pollers = [threading.Thread(target=self.poll, name=f"worker-{n}", daemon=True) for n in range(args.workers)]
+        self._api = None
+        self._connections = threading.local()
+
+    def job(self, index):
+        return {
+            'namespace': self.seriesSet.metric(0)['Namespace'],
+            'metricName': self.seriesSet.metric(0)['MetricName'],
+            'dimensions': [{'Name': self.seriesSet.metric(0)['Dimensions'][0]['Name']}],
+            'cloudwatchStats': self.seriesSet.stats,
+            'destinationMetricName': 'load',
+            'destinationKey': f"load/job-{index:06d}.csv",
+            'startTime': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.seriesSet.start)),
+            'endTime': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.seriesSet.end))
+        }
+
+    def start(self):
+        if self.args.http:
+            self._api = LocalApi(self.trigger.lambda_handler)
+            threading.Thread(target=self._api.serve_forever, name='api', daemon=True).start()
+        for poller in self._pollers:
+            poller.start()
+
+    def call_trigger(self, body):
+        """(statusCode, response body) of the trigger for a request body"""
+        if self._api is None:
+            response = self.trigger.lambda_handler({'httpMethod': 'POST', 'path': '/migrate', 'body': body}, None)
+            return response['statusCode'], response['body']
+        connection = getattr(self._connections, 'connection', None)
+        if connection is None:
+            connection = self._connections.connection = http.client.HTTPConnection(*self._api.server_address)
+        connection.request('POST', '/migrate', body=body, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, response.read().decode('utf-8')
+
+    def arrive(self, index, scheduledAt):
+        """Start iteration index if a VU is free, as k6 does; otherwise count it as dropped"""
+        if not self._vus.acquire(blocking=False):
+            with self._lock:
+                self.dropped += 1
+            return
+        self._iterations.submit(self.iterate, index, scheduledAt)
+
+    def iterate(self, index, scheduledAt):
+        try:
+            job = self.job(index)
+            with self._lock:
+                self.jobs[job['destinationKey']] = {'arrival': scheduledAt, 'queried': False}
+            start = time.perf_counter()
+            try:
+                statusCode, _ = self.call_trigger(json.dumps(job))
+            except Exception:
+                statusCode = None
+            self.latencies.record('trigger', time.perf_counter() - start, statusCode == 200)
+        finally:
+            self._vus.release()
+
+    def poll(self):
+        """One unit of the migrate function's concurrency, invoked with batches from the queue"""
+        while not self._stopping.is_set():
+            messages = self.sqs.receive(BATCH_SIZE)
+            if not messages:
+                continue
+            for message in messages:
+                self.latencies.record('queue', message['receivedAt'] - message['sentAt'])
+            event = {'Records': [{'messageId': message['messageId'], 'body': message['body'], 'attributes': dict(message['attributes']),
+                                  'eventSource': 'aws:sqs'} for message in messages]}
+            start = time.perf_counter()
+            try:
+                failed = {failure['itemIdentifier'] for failure in self.worker.lambda_handler(event, None)['batchItemFailures']}
+            except Exception:
+                failed = {message['messageId'] for message in messages}
+            self.latencies.record('migrate', time.perf_counter() - start, not failed)
+            for message in messages:
+                if message['messageId'] in failed:
+                    self.sqs.release(message['messageId'])
+                else:
+                    self.sqs.delete(message['messageId'])
+                    self.archived(json.loads(message['body'])['destinationKey'])
+
+    def archived(self, key):
+        """Query a job's archive through timeshift once it is complete; sliced jobs are only complete once assembled"""
+        with self._lock:
+            job = self.jobs.get(key)
+            if job is None or job['queried']:
+                return
+            try:
+                self.s3.head_object(Bucket=BUCKET, Key=key)
+            except Exception:
+                return
+            job['queried'] = True
+            self._pendingQueries += 1
+        self._queries.submit(self.query, key, job['arrival'])
+
+    def query(self, key, arrival):
+        try:
+            request = {
+                'Arguments': [BUCKET, key, SHIFT],
+                'StartTime': self.seriesSet.start + SHIFT_SECONDS,
+                'EndTime': self.seriesSet.end + SHIFT_SECONDS,
+                'Period': self.seriesSet.period
+            }
+            start = time.perf_counter()
+            ok = True
+            while True:
+                try:
+                    response = self.timeshift.lambda_handler({'EventType': 'GetMetricData', 'GetMetricDataRequest': dict(request)}, None)
+                except Exception:
+                    response = {}
+                if 'MetricDataResults' not in response:
+                    ok = False
+                    break
+                if not response.get('NextToken'):
+                    break
+                request['NextToken'] = response['NextToken']
+            end = time.perf_counter()
+            self.latencies.record('timeshift', end - start, ok)
+            self.latencies.record('end-to-end', end - arrival, ok)
+        finally:
+            with self._lock:
+                self._pendingQueries -= 1
+
+    def finish_arrivals(self):
+        """Wait for the requests already started to get their trigger response"""
+        self._iterations.shutdown(wait=True)
+
+    def busy(self):
+        with self._lock:
+            return self.sqs.depth() > 0 or self._pendingQueries > 0
+
+    def stop(self):
+        self._stopping.set()
+        for poller in self._pollers:
+            poller.join()
+        self._queries.shutdown(wait=True)
+        if self._api is not None:
+            self._api.shutdown()
+            self._api.server_close()
+
+
+def run(args, startRate, stages, report=sys.stdout):
+    """Run the profile through a fresh pipeline; returns the run's results"""
+    workDir = tempfile.mkdtemp(prefix='metric-load-')
+    try:
+        # The handlers print their own diagnostics; keep them out of the report
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            pipeline = Pipeline(args, workDir)
+            pipeline.start()
+            offsets = list(arrival_offsets(stages, startRate, args.time_scale, args.rate_scale))
+            print(f"{len(offsets)} requests over {sum(seconds for seconds, _ in stages) * args.time_scale:.0f} s", file=report, flush=True)
+
+            runStart = time.perf_counter()
+            nextReport = runStart + args.report_interval
+            for index, offset in enumerate(offsets):
+                while True:
+                    now = time.perf_counter()
+                    if now >= nextReport:
+                        print(f"  {now - runStart:7.1f} s  {index} sent, {pipeline.sqs.depth()} queued, "
+                              f"{pipeline.latencies.count('end-to-end')} done", file=report, flush=True)
+                        nextReport += args.report_interval
+                    wait = runStart + offset - now
+                    if wait <= 0:
+                        break
+                    time.sleep(min(wait, nextReport - now))
+                pipeline.arrive(index, runStart + offset)
+            pipeline.finish_arrivals()
+
+            drainDeadline = time.perf_counter() + args.drain_timeout
+            while pipeline.busy() and time.perf_counter() < drainDeadline:
+                time.sleep(0.05)
+            undrained = pipeline.sqs.depth()
+            elapsed = time.perf_counter() - runStart
+            pipeline.stop()
+        return {
+            'requests': len(offsets),
+            'dropped': pipeline.dropped,
+            'deadLetters': len(pipeline.sqs.deadLetters),
+            'undrained': undrained,
+            'peakQueueDepth': pipeline.sqs.peakDepth,
+            'seconds': elapsed,
+            'stages': pipeline.latencies.summary(elapsed)
+        }
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+
+
+def print_report(results, report=sys.stdout):
+    print(f"\n{results['requests']} requests in {results['seconds']:.1f} s, {results['dropped']} dropped, "
+          f"{results['deadLetters']} dead-lettered, {results['undrained']} left in the queue, peak queue depth {results['peakQueueDepth']}", file=report)
+    print(f"{'stage':<12}{'count':>8}{'errors':>8}{'per s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}", file=report)
+    for stage in STAGE_NAMES:
+        row = results['stages'][stage]
+        latencies = ''.join(f"{row[name]:>10.1f}" if row[name] is not None else f"{'-':>10}" for name in ('p50', 'p95', 'p99', 'max'))
+        print(f"{stage:<12}{row['count']:>8}{row['errors']:>8}{row['perSecond']:>9.1f}{latencies}", file=report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--script', default=K6_SCRIPT, help='k6 script whose ramping-arrival-rate profile is replayed (default k6/script.js)')
+    parser.add_argument('--stages', help="profile to run instead, as duration:target rate pairs, e.g. '30s:10,1m:40,30s:0'")
+    parser.add_argument('--start-rate', type=float, help='requests per second at the start (default the script\'s startRate, or 0 with --stages)')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='multiply every stage duration by this (default 1)')
+    parser.add_argument('--rate-scale', type=float, default=1.0, help='multiply every arrival rate by this (default 1)')
+    parser.add_argument('--vus', type=int, default=100, help='requests in flight at once before arrivals are dropped (default 100, the trigger\'s reserved concurrency)')
+    parser.add_argument('--workers', type=int, default=10, help='concurrent migrate invocations (default 10, its reserved concurrency)')
+    parser.add_argument('--timeshift-concurrency', type=int, default=50, help='concurrent timeshift queries (default 50, its reserved concurrency)')
+    parser.add_argument('--http', action='store_true', help='send requests to the trigger through a local HTTP server')
+    parser.add_argument('--reader', choices=['lambda', 'native'], default='lambda', help='timeshift reader mode (default lambda)')
+    parser.add_argument('--metrics', type=int, default=2, help='metrics per job (default 2)')
+    parser.add_argument('--stats', type=int, default=2, help='stats per metric (default 2)')
+    parser.add_argument('--points', type=int, default=1440, help='points per series at one a minute (default 1440, one day)')
+    parser.add_argument('--drain-timeout', type=float, default=300, help='seconds to wait for the queue to drain after the last arrival (default 300)')
+    parser.add_argument('--report-interval', type=float, default=10, help='seconds between progress lines (default 10)')
+    parser.add_argument('--log-level', default='ERROR', help='level of the handlers\' logs, written to stderr (default ERROR)')
+    parser.add_argument('--json', metavar='PATH', help='also write the results to PATH')
+    args = parser.parse_args()
+
+    if args.stages:
+        startRate, stages = args.start_rate or 0.0, parse_stages(args.stages)
+    else:
+        startRate, stages = k6_profile(args.script)
+        if args.start_rate is not None:
+            startRate = args.start_rate
+    results = run(args, startRate, stages)
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0 if not results['undrained'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
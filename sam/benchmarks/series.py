@@ -0,0 +1,104 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+"""
+Synthetic metric series for the offline benchmarks.
+
+A SeriesSet is a grid of metrics x stats x points at a fixed period. Every value is a
+pure function of (metric, stat, timestamp), so any window of any series can be
+generated on demand, in any order and from any thread, without holding millions of
+points in memory. Values follow a daily cycle with per-metric phase plus hashed noise;
+gapPercent drops that share of points so series no longer line up on timestamp.
+"""
+import datetime
+import math
+
+NAMESPACE = 'Benchmark/Synthetic'
+METRIC_NAME = 'Latency'
+DIMENSION = 'Host'
+STATS = ['Average', 'Minimum', 'Maximum', 'Sum', 'SampleCount', 'p99', 'IQM', 'tm99']
+
+# Start of every generated window: Monday 2024-01-01 00:00 UTC
+START = int(datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc).timestamp())
+
+# How each stat relates to the underlying per-minute average
+STAT_SCALE = {'Average': 1.0, 'Minimum': 0.6, 'Maximum': 1.8, 'Sum': 60.0, 'p99': 1.6, 'IQM': 0.95, 'tm99': 1.05}
+SAMPLE_COUNT = 60.0
+
+
+def _noise(metricIndex, timestamp):
+    """Deterministic value in [0, 1) for a point"""
+    return ((timestamp * 2654435761 + metricIndex * 40503) & 0xFFFF) / 65536.0
+
+
+class SeriesSet:
+    def __init__(self, metrics, stats, points, period=60, start=START, gapPercent=0):
+        if stats > len(STATS):
+            raise ValueError(f"At most {len(STATS)} stats can be generated")
+        self.metricCount = metrics
+        self.stats = STATS[:stats]
+        self.points = points
+        self.period = period
+        self.start = start
+        self.end = start + points * period
+        self.gapPercent = gapPercent
+
+    @property
+    def totalPoints(self):
+        """Points across every series, before gaps"""
+        return self.metricCount * len(self.stats) * self.points
+
+    def metric(self, metricIndex):
+        return {
+            'Namespace': NAMESPACE,
+            'MetricName': METRIC_NAME,
+            'Dimensions': [{'Name': DIMENSION, 'Value': f"host-{metricIndex:05d}"}]
+        }
+
+    def metrics(self):
+        return [self.metric(metricIndex) for metricIndex in range(self.metricCount)]
+
+    def metric_index(self, metric):
+        """Index of a metric built by metric(), or None for any other metric"""
+        if metric.get('Namespace') != NAMESPACE or metric.get('MetricName') != METRIC_NAME:
+            return None
+        dimensions = metric.get('Dimensions') or []
+        if len(dimensions) != 1 or dimensions[0].get('Name') != DIMENSION:
+            return None
+        value = dimensions[0].get('Value', '')
+        return int(value[len('host-'):]) if value.startswith('host-') else None
+
+    def columns(self):
+        """Archive column names, one per (metric, stat) in archive order"""
+        return [f"host-{metricIndex:05d}-{stat}" for metricIndex in range(self.metricCount) for stat in self.stats]
+
+    def value(self, metricIndex, stat, timestamp):
+        if stat == 'SampleCount':
+            return SAMPLE_COUNT
+        phase = metricIndex * 0.7
+        average = 100.0 + 40.0 * math.sin(2 * math.pi * (timestamp - self.start) / 86400 + phase) + 10.0 * _noise(metricIndex, timestamp)
+        return round(average * STAT_SCALE.get(stat, 1.0), 3)
+
+    def present(self, metricIndex, timestamp):
+        return self.gapPercent <= 0 or _noise(metricIndex + 7919, timestamp) * 100 >= self.gapPercent
+
+    def timestamps(self, metricIndex, startEpoch, endEpoch, period=None):
+        """Timestamps of a metric's points with startEpoch <= timestamp < endEpoch, at period (the set's by default)"""
+        period = period or self.period
+        first = max(startEpoch, self.start)
+        first = self.start + -(-(first - self.start) // period) * period
+        last = min(endEpoch, self.end)
+        return [timestamp for timestamp in range(first, last, period) if self.present(metricIndex, timestamp)]
+
+    def csv_chunks(self, rowsPerChunk=5000):
+        """The whole set as an archive CSV in migrate_metric's layout, in chunks of text"""
+        yield 'timestamp,' + ','.join(self.columns()) + '\n'
+        for chunkStart in range(0, self.points, rowsPerChunk):
+            lines = []
+            for row in range(chunkStart, min(self.points, chunkStart + rowsPerChunk)):
+                timestamp = self.start + row * self.period
+                cells = []
+                for metricIndex in range(self.metricCount):
+                    present = self.present(metricIndex, timestamp)
+                    cells.extend(str(self.value(metricIndex, stat, timestamp)) if present else '' for stat in self.stats)
+                lines.append(datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc).isoformat() + ',' + ','.join(cells) + '\n')
+            yield ''.join(lines)
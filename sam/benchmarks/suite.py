@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+"""
+Offline benchmark suite for the migration worker and the timeshift data source.
+
+Each scenario runs the real lambda_handler against the in-process fakes of fakes.py,
+fed by the synthetic series of series.py: no AWS account or network is needed. Every
+run happens in a fresh interpreter, from the function's CodeUri directory as Lambda
+does, so peak RSS belongs to that one run. For each scenario the suite reports
+throughput (datapoints per second through the handler), peak RSS and the time spent in
+each stage as recorded by stage_metrics.
+
+    python benchmarks/suite.py [--size small|medium|large] [--scenario NAME ...] [--runs 3]
+    python benchmarks/suite.py --save              # store the results as the baseline
+    python benchmarks/suite.py --compare           # check the results against it
+
+With --compare the exit status is 1 when a scenario's throughput fell, or its peak RSS
+grew, by more than --tolerance against the baseline. Baselines only compare like with
+like: scenarios run at other sizes than the baseline's are reported but not checked.
+
+Scenarios:
+    migrate-csv         one SQS record archiving every (metric, stat) series to CSV
+    migrate-binary      the same window in the binary archive format
+    migrate-throttled   migrate-csv with every fifth CloudWatch call throttled
+    timeshift-lambda    a shifted read of the whole archive through the CSV loader Lambda,
+                        following NextToken until every page is returned
+    timeshift-native    the same read with TIMESHIFT_READER_MODE=native
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SAM_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+BUCKET = 'benchmark'
+ARCHIVE_KEY = 'benchmark/archive.csv'
+SHIFT = 'P7D'
+SHIFT_SECONDS = 7 * 86400
+
+# metrics x stats x points per series, at one point a minute
+SIZES = {
+    'small': {'metrics': 10, 'stats': 2, 'points': 10080},
+    'medium': {'metrics': 20, 'stats': 4, 'points': 20160},
+    'large': {'metrics': 50, 'stats': 4, 'points': 20160}
+}
+DEFAULT_PARAMS = {'gaps': 0, 'throttleRate': 0.0, 'latency': 0.0}
+
+SCENARIOS = {
+    'migrate-csv': {'function': 'migrate_metric', 'format': 'csv'},
+    'migrate-binary': {'function': 'migrate_metric', 'format': 'binary'},
+    'migrate-throttled': {'function': 'migrate_metric', 'format': 'csv', 'params': {'throttleRate': 0.2}},
+    'timeshift-lambda': {'function': 'timeshift', 'readerMode': 'lambda'},
+    'timeshift-native': {'function': 'timeshift', 'readerMode': 'native'}
+}
+
+# The environment the functions read at import time
+ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'benchmark',
+    'AWS_SECRET_ACCESS_KEY': 'benchmark',
+    'ARCHIVED_METRICS_BUCKET_NAME': BUCKET,
+    'S3_CSV_LOADING_LAMBDA_ARN': 'arn:aws:lambda:us-east-1:123456789012:function:s3-csv',
+    'STAGE_METRICS_ENABLED': 'true',
+    'LOG_LEVEL': 'WARNING'
+}
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def invoke(handler, event):
+    """Call a handler, returning its response and the stage_metrics records it wrote to stdout"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        response = handler(event, None)
+    records = [json.loads(line) for line in output.getvalue().splitlines() if line.startswith('{"_aws"')]
+    return response, records
+
+
+def combine_records(records):
+    """Totals across the stage_metrics records of a run, as {name: value}"""
+    totals = {}
+    for record in records:
+        for name, value in record.items():
+            if name not in ('_aws', 'Function') and isinstance(value, (int, float)):
+                totals[name] = totals.get(name, 0) + value
+    return totals
+
+
+def run_migrate(app, scenario, params, seriesSet, s3):
+    from fakes import FakeCloudWatch
+    from job_rules import DEFAULT_MAX_CONCURRENCY, MAX_TPS_LIMIT
+    cloudwatch = FakeCloudWatch(seriesSet, throttleRate=params['throttleRate'], latency=params['latency'])
+    app.metrics = cloudwatch
+    app.s3_client = s3
+    body = {
+        'namespace': seriesSet.metric(0)['Namespace'],
+        'metricName': seriesSet.metric(0)['MetricName'],
+        'dimensions': [{'Name': seriesSet.metric(0)['Dimensions'][0]['Name']}],
+        'cloudwatchStats': seriesSet.stats,
+        'destinationMetricName': 'benchmark',
+        'destinationKey': 'benchmark/migrated.' + ('bin' if scenario['format'] == 'binary' else 'csv'),
+        'startTime': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(seriesSet.start)),
+        'endTime': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(seriesSet.end)),
+        'format': scenario['format'],
+        'maxTps': MAX_TPS_LIMIT,
+        'maxConcurrency': DEFAULT_MAX_CONCURRENCY
+    }
+    event = {'Records': [{'messageId': 'benchmark-0', 'body': json.dumps(body)}]}
+
+    start = time.perf_counter()
+    response, records = invoke(app.lambda_handler, event)
+    seconds = time.perf_counter() - start
+    if response['batchItemFailures']:
+        raise RuntimeError("The migration failed; rerun with LOG_LEVEL=INFO to see why")
+    totals = combine_records(records)
+    return seconds, totals.get('Datapoints', 0), totals, {
+        'cloudWatchCalls': sum(cloudwatch.calls.values()),
+        'injectedThrottles': cloudwatch.throttles,
+        'archiveBytes': s3.head_object(Bucket=BUCKET, Key=body['destinationKey'])['ContentLength']
+    }
+
+
+def run_timeshift(app, scenario, params, seriesSet, s3):
+    from fakes import CsvLoaderLambda
+    loader = CsvLoaderLambda(s3)
+    app.s3_client = s3
+    app.lambda_client = loader
+
+    points = 0
+    pages = 0
+    allRecords = []
+    nextToken = None
+    start = time.perf_counter()
+    while True:
+        request = {
+            'Arguments': [BUCKET, ARCHIVE_KEY, SHIFT],
+            'StartTime': seriesSet.start + SHIFT_SECONDS,
+            'EndTime': seriesSet.end + SHIFT_SECONDS,
+            'Period': seriesSet.period
+        }
+        if nextToken is not None:
+            request['NextToken'] = nextToken
+        response, records = invoke(app.lambda_handler, {'EventType': 'GetMetricData', 'GetMetricDataRequest': request})
+        if 'MetricDataResults' not in response:
+            raise RuntimeError(f"The timeshift query failed: {response.get('body')}")
+        allRecords.extend(records)
+        pages += 1
+        points += sum(len(result['Timestamps']) for result in response['MetricDataResults'])
+        nextToken = response.get('NextToken')
+        if nextToken is None:
+            break
+    seconds = time.perf_counter() - start
+    return seconds, points, combine_records(allRecords), {'pages': pages, 'loaderCalls': loader.calls}
+
+
+def run_child(name, params):
+    """Run one scenario in this interpreter and print its result as a JSON line"""
+    scenario = SCENARIOS[name]
+    workDir = tempfile.mkdtemp(prefix='metric-benchmark-')
+    try:
+        os.environ.update(ENVIRONMENT, TIMESHIFT_CACHE_DIR=os.path.join(workDir, 'cache'),
+                          TIMESHIFT_READER_MODE=scenario.get('readerMode', 'lambda'))
+        functionDir = os.path.join(SAM_DIR, scenario['function'])
+        os.chdir(functionDir)
+        sys.path.insert(0, os.path.join(SAM_DIR, 'shared'))
+        sys.path.insert(0, functionDir)
+        import app
+        # Backoff jitter is drawn from the shared generator; seed it so throttled runs repeat
+        random.seed(0)
+        from fakes import FileSystemS3
+        from series import SeriesSet
+
+        seriesSet = SeriesSet(params['metrics'], params['stats'], params['points'], gapPercent=params['gaps'])
+        s3 = FileSystemS3(os.path.join(workDir, 's3'))
+        if scenario['function'] == 'timeshift':
+            s3.put_chunks(Bucket=BUCKET, Key=ARCHIVE_KEY, chunks=seriesSet.csv_chunks())
+        setupRss = peak_rss_mb()
+
+        runner = run_timeshift if scenario['function'] == 'timeshift' else run_migrate
+        seconds, points, totals, details = runner(app, scenario, params, seriesSet, s3)
+        result = {
+            'scenario': name,
+            'params': params,
+            'points': points,
+            'seconds': seconds,
+            'pointsPerSecond': points / seconds if seconds else 0.0,
+            'setupRssMb': setupRss,
+            'peakRssMb': peak_rss_mb(),
+            'stages': {stage: value for stage, value in totals.items() if stage.endswith('Time')},
+            'counts': {count: value for count, value in totals.items() if not count.endswith('Time')},
+            'details': details
+        }
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+    print(json.dumps(result))
+
+
+def run_scenario(name, params, runs):
+    """Median of runs fresh-interpreter runs of a scenario"""
+    results = []
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', name, '--params', json.dumps(params)],
+                                   capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"{name} failed:\n{completed.stderr}")
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    seconds = statistics.median(result['seconds'] for result in results)
+    stages = sorted({stage for result in results for stage in result['stages']})
+    return {
+        'params': params,
+        'points': results[0]['points'],
+        'seconds': seconds,
+        'pointsPerSecond': statistics.median(result['pointsPerSecond'] for result in results),
+        'peakRssMb': max(result['peakRssMb'] for result in results),
+        'setupRssMb': max(result['setupRssMb'] for result in results),
+        'stages': {stage: statistics.median(result['stages'].get(stage, 0) for result in results) for stage in stages},
+        'counts': results[0]['counts'],
+        'details': results[0]['details']
+    }
+
+
+def compare(name, summary, baseline, tolerance):
+    """(text, regressed) of a scenario against its baseline entry"""
+    base = baseline.get('results', {}).get(name)
+    if base is None:
+        return 'no baseline', False
+    if base['params'] != summary['params']:
+        return 'baseline ran other params', False
+    throughput = summary['pointsPerSecond'] / base['pointsPerSecond'] - 1 if base['pointsPerSecond'] else 0.0
+    rss = summary['peakRssMb'] / base['peakRssMb'] - 1 if base['peakRssMb'] else 0.0
+    regressed = throughput < -tolerance or rss > tolerance
+    return f"{throughput:+.1%} points/s, {rss:+.1%} RSS" + (' REGRESSION' if regressed else ''), regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='scenario to run, repeatable (default all)')
+    parser.add_argument('--size', choices=sorted(SIZES), default='small', help='preset metrics x stats x points (default small)')
+    parser.add_argument('--metrics', type=int, help='metrics, overriding the size preset')
+    parser.add_argument('--stats', type=int, help='stats per metric, overriding the size preset')
+    parser.add_argument('--points', type=int, help='points per series at one a minute, overriding the size preset')
+    parser.add_argument('--gaps', type=int, help='percent of points missing, so series do not line up (default 0)')
+    parser.add_argument('--throttle-rate', type=float, dest='throttleRate', help='share of CloudWatch calls throttled')
+    parser.add_argument('--latency', type=float, help='seconds added to every CloudWatch call (default 0)')
+    parser.add_argument('--runs', type=int, default=3, help='fresh interpreters per scenario, the median is reported (default 3)')
+    parser.add_argument('--save', nargs='?', const=DEFAULT_BASELINE, metavar='PATH', help='store the results as a baseline')
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, metavar='PATH', help='check the results against a baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed throughput drop or RSS growth against the baseline (default 0.15)')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--params', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, json.loads(args.params))
+        return 0
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    overrides = {name: getattr(args, name) for name in ('metrics', 'stats', 'points', 'gaps', 'throttleRate', 'latency') if getattr(args, name) is not None}
+    print(f"Python {sys.version.split()[0]}, {args.runs} runs per scenario")
+    results = {}
+    regressions = []
+    for name in args.scenario or list(SCENARIOS):
+        params = dict(DEFAULT_PARAMS, **SIZES[args.size])
+        params.update(SCENARIOS[name].get('params', {}))
+        params.update(overrides)
+        summary = results[name] = run_scenario(name, params, args.runs)
+        print(f"\n{name}: {summary['points']} points ({params['metrics']} metrics x {params['stats']} stats x {params['points']})"
+              f" in {summary['seconds']:.2f} s, {summary['pointsPerSecond']:,.0f} points/s, peak RSS {summary['peakRssMb']:.0f} MB")
+        if baseline is not None:
+            text, regressed = compare(name, summary, baseline, args.tolerance)
+            print(f"  vs baseline: {text}")
+            if regressed:
+                regressions.append(name)
+        for stage, milliseconds in sorted(summary['stages'].items(), key=lambda item: item[1], reverse=True):
+            print(f"  {milliseconds:10.1f} ms  {stage[:-len('Time')]}")
+        print('  ' + ', '.join(f"{label} {value:g}" for label, value in sorted(dict(summary['counts'], **summary['details']).items())))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2, sort_keys=True)
+        print(f"\nSaved the results to {args.save}")
+    if regressions:
+        print(f"\nRegressed against the baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
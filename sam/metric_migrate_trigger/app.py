@@ -1,16 +1,43 @@
 # Copyright 2026 Amazon.com and its affiliates; all rights reserved.
 # This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
 
+import hashlib
 import json
 import logging
-from datetime import datetime
-import boto3
+import math
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 import os
+import uuid
+
+from job_rules import CLOUDWATCH_STATISTICS, DEFAULT_PERIOD, max_concurrency_error, max_tps_error, period_error, rollup_error
+from lazy_client import LazyClient
+import stage_metrics
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-CLOUDWATCH_STATISTICS = ["Average", "Minimum", "Maximum", "Sum", "SampleCount", "IQM", "p99", "tm99", "tc99", "ts99"]
+# Partitioned archives write one object per day or hour under destinationKey
+PARTITION_GRANULARITIES = ['day', 'hour']
+
+# Binary archives are smaller and faster to read, but only the timeshift connector's native reader reads them
+ARCHIVE_FORMATS = ['csv', 'binary']
+
+# Long windows are split into slices of this many hours, each migrated by its own worker invocation.
+# A window that would need more than MAX_SLICES of them gets a whole multiple of it instead
+DEFAULT_SLICE_HOURS = int(os.environ.get('MIGRATION_SLICE_HOURS', '24'))
+MAX_SLICES = 1000
+SQS_BATCH_SIZE = 10
+MAX_SEND_ATTEMPTS = 3
+# SendMessageBatch calls in flight at once
+SEND_CONCURRENCY = 8
+
+# Limits for bulk requests that carry an array of jobs
+MAX_JOBS_PER_REQUEST = 1000
+MAX_MESSAGES_PER_REQUEST = 10000
+
+# Reused across invocations of a warm container
+sqs_client = LazyClient('sqs', max_pool_connections=SEND_CONCURRENCY)
 
 def validate_request(body):
     """Validate the request body"""
@@ -25,6 +52,8 @@ def validate_request(body):
         raise ValueError("Dimensions must be a list")
     
     # Validate time format
+    if not isinstance(body['startTime'], str) or not isinstance(body['endTime'], str):
+        raise ValueError("startTime and endTime must be ISO 8601 strings (e.g., 2024-01-01T00:00:00Z)")
     try:
         datetime.fromisoformat(body['startTime'].replace('Z', '+00:00'))
         datetime.fromisoformat(body['endTime'].replace('Z', '+00:00'))
@@ -43,7 +72,229 @@ def validate_request(body):
         if cwStat not in CLOUDWATCH_STATISTICS:
             raise ValueError(f"{cwStat} is not a valid cloudwatch stat. Valid stats are {json.dumps(CLOUDWATCH_STATISTICS)}")
 
+    # Validate the optional fetch concurrency settings and period, by the same rules as the worker
+    if 'maxConcurrency' in body and max_concurrency_error(body['maxConcurrency']):
+        raise ValueError(max_concurrency_error(body['maxConcurrency']))
+
+    if 'maxTps' in body and max_tps_error(body['maxTps']):
+        raise ValueError(max_tps_error(body['maxTps']))
+
+    if 'period' in body and period_error(body['period']):
+        raise ValueError(period_error(body['period']))
+
+    # Validate slicing
+    if 'slice' in body:
+        raise ValueError("slice is reserved for messages created by the trigger")
+
+    if 'sliceHours' in body:
+        sliceHours = body['sliceHours']
+        if isinstance(sliceHours, bool) or not isinstance(sliceHours, int) or sliceHours < 0:
+            raise ValueError("sliceHours must be a non-negative integer (0 disables slicing)")
+
+    # Incremental jobs append to what is already archived at destinationKey
+    if 'incremental' in body and not isinstance(body['incremental'], bool):
+        raise ValueError("incremental must be true or false")
+
+    if 'partitionBy' in body and body['partitionBy'] not in PARTITION_GRANULARITIES:
+        raise ValueError(f"partitionBy must be one of {json.dumps(PARTITION_GRANULARITIES)}")
+
+    if 'format' in body and body['format'] not in ARCHIVE_FORMATS:
+        raise ValueError(f"format must be one of {json.dumps(ARCHIVE_FORMATS)}")
+
+    if body.get('format') == 'binary' and (body.get('incremental', False) or 'partitionBy' in body):
+        raise ValueError("binary format cannot be combined with incremental or partitionBy")
+
+    if 'rollups' in body:
+        error = rollup_error(body['rollups'], body['cloudwatchStats'], body.get('period', DEFAULT_PERIOD))
+        if error is not None:
+            raise ValueError(error)
+        if 'partitionBy' in body:
+            raise ValueError("rollups cannot be combined with partitionBy")
+
+    sliceCount = len(plan_slices(parse_time(body['startTime']), parse_time(body['endTime']), slice_hours(body)))
+    if sliceCount > MAX_SLICES:
+        raise ValueError(f"The window would be split into {sliceCount} slices; at most {MAX_SLICES} are allowed. Use a larger sliceHours.")
+
+def parse_time(value):
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+def format_time(value):
+    return value.isoformat().replace('+00:00', 'Z')
+
+def slice_hours(body):
+    """
+    Incremental jobs are never sliced: each run appends to the one object at destinationKey.
+    Neither are partitioned jobs, whose partitions already bound the size of each object,
+    nor binary ones, whose slices could not be concatenated.
+    """
+    if body.get('incremental', False) or body.get('partitionBy') is not None or body.get('format') == 'binary':
+        return 0
+    if 'sliceHours' in body:
+        return body['sliceHours']
+    return default_slice_hours(parse_time(body['startTime']), parse_time(body['endTime']))
+
+def default_slice_hours(startTime, endTime):
+    """
+    DEFAULT_SLICE_HOURS, widened to the smallest multiple of it that splits the
+    window into at most MAX_SLICES slices. A window that does not start on a slice
+    boundary takes one slice more than it spans.
+    """
+    if DEFAULT_SLICE_HOURS == 0:
+        return 0
+    windowHours = (endTime - startTime).total_seconds() / 3600
+    return DEFAULT_SLICE_HOURS * max(1, math.ceil(windowHours / (DEFAULT_SLICE_HOURS * (MAX_SLICES - 1))))
+
+def plan_slices(startTime, endTime, sliceHours):
+    """
+    Split [startTime, endTime) at UTC multiples of sliceHours. Returns a single
+    slice when slicing is disabled or the window fits in one slice.
+    """
+    if sliceHours == 0 or endTime <= startTime:
+        return [(startTime, endTime)]
+
+    sliceSeconds = sliceHours * 3600
+    slices = []
+    sliceStart = startTime
+    while sliceStart < endTime:
+        boundary = (int(sliceStart.timestamp()) // sliceSeconds + 1) * sliceSeconds
+        sliceEnd = min(endTime, datetime.fromtimestamp(boundary, tz=timezone.utc))
+        slices.append((sliceStart, sliceEnd))
+        sliceStart = sliceEnd
+    return slices
+
+def build_messages(body):
+    """
+    Build the queue messages for a validated request: the request itself, or one
+    message per time slice sharing a jobId so the worker can assemble the slices.
+    """
+    slices = plan_slices(parse_time(body['startTime']), parse_time(body['endTime']), slice_hours(body))
+    if len(slices) == 1:
+        return None, [body]
+
+    jobId = str(uuid.uuid4())
+    messages = []
+    for index, (sliceStart, sliceEnd) in enumerate(slices):
+        message = dict(body)
+        message['startTime'] = format_time(sliceStart)
+        message['endTime'] = format_time(sliceEnd)
+        message['slice'] = {
+            'jobId': jobId,
+            'index': index,
+            'count': len(slices)
+        }
+        messages.append(message)
+    return jobId, messages
+
+def send_batch(sqs_client, queue_url, batch):
+    """
+    Send up to 10 (index, message) pairs with one SendMessageBatch call, retrying
+    entries SQS reports as failed. Returns the indexes that could not be sent.
+    """
+    entries = [{'Id': str(index), 'MessageBody': json.dumps(message)} for index, message in batch]
+    stage_metrics.count('Messages', len(entries))
+    for attempt in range(MAX_SEND_ATTEMPTS):
+        with stage_metrics.stage('SqsSend'):
+            response = sqs_client.send_message_batch(QueueUrl=queue_url, Entries=entries)
+        stage_metrics.count('SqsCalls')
+        failedIds = {failure['Id'] for failure in response.get('Failed', [])}
+        entries = [entry for entry in entries if entry['Id'] in failedIds]
+        if not entries:
+            return []
+        logger.warning(f"{len(entries)} messages failed to send, retrying")
+    return [int(entry['Id']) for entry in entries]
+
+def send_messages(sqs_client, queue_url, messages):
+    """
+    Send messages in SendMessageBatch calls of up to 10, with up to SEND_CONCURRENCY
+    calls in flight. Returns the indexes of the messages that could not be sent.
+    """
+    indexed = list(enumerate(messages))
+    batches = [indexed[i:i + SQS_BATCH_SIZE] for i in range(0, len(indexed), SQS_BATCH_SIZE)]
+    if len(batches) <= 1:
+        return [index for batch in batches for index in send_batch(sqs_client, queue_url, batch)]
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=min(SEND_CONCURRENCY, len(batches))) as executor:
+        for batchFailed in executor.map(lambda batch: send_batch(sqs_client, queue_url, batch), batches):
+            failed.extend(batchFailed)
+    return failed
+
+def job_hash(body):
+    """Content hash identifying identical jobs, independent of key order"""
+    return hashlib.sha256(json.dumps(body, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+def handle_bulk(jobs, queue_url):
+    """
+    Validate, deduplicate and enqueue an array of jobs. Returns (statusCode, body)
+    listing the accepted and rejected jobs by their index in the request.
+    """
+    if len(jobs) == 0:
+        raise ValueError("The jobs array must contain at least one job")
+    if len(jobs) > MAX_JOBS_PER_REQUEST:
+        raise ValueError(f"At most {MAX_JOBS_PER_REQUEST} jobs can be sent in one request")
+
+    rejected = []
+    pending = []
+    seen = {}
+    messageCount = 0
+    for index, job in enumerate(jobs):
+        try:
+            if not isinstance(job, dict):
+                raise ValueError("Each job must be a JSON object")
+            with stage_metrics.stage('Validate'):
+                validate_request(job)
+        except ValueError as e:
+            rejected.append({'index': index, 'error': 'Validation Error', 'message': str(e)})
+            continue
+
+        key = job_hash(job)
+        if key in seen:
+            rejected.append({'index': index, 'error': 'Duplicate Job', 'message': f"Identical to job {seen[key]}"})
+            continue
+        seen[key] = index
+
+        jobId, messages = build_messages(job)
+        if messageCount + len(messages) > MAX_MESSAGES_PER_REQUEST:
+            rejected.append({'index': index, 'error': 'Too Many Messages', 'message': f"The request would queue more than {MAX_MESSAGES_PER_REQUEST} messages; send this job again in another request"})
+            continue
+        messageCount += len(messages)
+        pending.append((index, key, jobId, messages))
+
+    failed = set(send_messages(sqs_client, queue_url, [message for _, _, _, messages in pending for message in messages]))
+
+    accepted = []
+    offset = 0
+    for index, key, jobId, messages in pending:
+        messageIndexes = range(offset, offset + len(messages))
+        offset += len(messages)
+        if any(messageIndex in failed for messageIndex in messageIndexes):
+            rejected.append({'index': index, 'error': 'Enqueue Error', 'message': 'The job could not be queued, or was only partly queued; send it again'})
+            continue
+        entry = {'index': index, 'hash': key}
+        if jobId is not None:
+            entry['jobId'] = jobId
+            entry['slices'] = len(messages)
+        accepted.append(entry)
+
+    logger.info(f"Bulk request: {len(accepted)} jobs accepted as {messageCount - len(failed)} messages, {len(rejected)} rejected")
+    stage_metrics.count('AcceptedJobs', len(accepted))
+    stage_metrics.count('RejectedJobs', len(rejected))
+    rejected.sort(key=lambda entry: entry['index'])
+    return (200 if accepted else 400), {'accepted': accepted, 'rejected': rejected}
+
 def lambda_handler(event, context):
+    stage_metrics.begin('trigger')
+    try:
+        response = handle_request(event, context)
+        stage_metrics.count(f"Status{response['statusCode'] // 100}xx")
+        return response
+    finally:
+        stage_metrics.emit()
+
+def handle_request(event, context):
     """
     Handle metric query requests
     
@@ -62,33 +313,61 @@ def lambda_handler(event, context):
         "period": 300,
         "statistic": "Sum"
     }
+
+    The body may also be an array of such requests; each one is validated and
+    queued on its own, identical requests are queued once, and the response lists
+    the accepted and rejected requests by index.
     """
     try:
         # Parse request body
         body = json.loads(event['body']) if isinstance(event.get('body'), str) else event.get('body', {})
-        
+        queue_url = os.environ['MIGRATION_QUEUE_URL']
+
+        if isinstance(body, list):
+            statusCode, responseBody = handle_bulk(body, queue_url)
+            return {
+                'statusCode': statusCode,
+                'headers': {
+                    'Content-Type': 'application/json'
+                },
+                'body': json.dumps(responseBody)
+            }
+
         # Validate request
-        validate_request(body)
+        with stage_metrics.stage('Validate'):
+            validate_request(body)
         
         # Log the request
         logger.info(f"Processing metric query: {json.dumps(body)}")
         
-        # Write the request to an SQS queue
-        sqs_client = boto3.client('sqs')
-        queue_url = os.environ['MIGRATION_QUEUE_URL'] 
-        sqs_client.send_message(QueueUrl=queue_url, MessageBody=json.dumps(body))
-        logger.info(f"Request sent to SQS: {json.dumps(body)}")
+        # Write the request to an SQS queue, as one message per slice for long windows
+        jobId, messages = build_messages(body)
+        if jobId is None:
+            with stage_metrics.stage('SqsSend'):
+                sqs_client.send_message(QueueUrl=queue_url, MessageBody=json.dumps(body))
+            stage_metrics.count('SqsCalls')
+            stage_metrics.count('Messages')
+            logger.info(f"Request sent to SQS: {json.dumps(body)}")
+        else:
+            failed = send_messages(sqs_client, queue_url, messages)
+            if failed:
+                raise RuntimeError(f"Failed to send {len(failed)} of {len(messages)} slices of job {jobId} to SQS")
+            logger.info(f"Request sent to SQS as {len(messages)} slices of job {jobId}")
 
+        responseBody = {
+            'request': body,
+            'message': 'Query request received successfully'
+        }
+        if jobId is not None:
+            responseBody['jobId'] = jobId
+            responseBody['slices'] = len(messages)
 
         return {
             'statusCode': 200,
             'headers': {
                 'Content-Type': 'application/json'
             },
-            'body': json.dumps({
-                'request': body,
-                'message': 'Query request received successfully'
-            })
+            'body': json.dumps(responseBody)
         }
         
     except ValueError as e:
@@ -2,296 +2,427 @@
 # This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
 
 import logging
-import boto3
 import json
 import datetime
+import math
 import os
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from binary_writer import BinaryArchiveWriter
+from checkpoint import delete_checkpoint, job_fingerprint, load_checkpoint, save_checkpoint
+from fetch_pool import FetchPool, budget_share
+from fetcher import fetch_chunks, list_job_queries, plan_segment_chunks
+from incremental import archive_metadata, archived_state, carry_over
+from job_rules import (CLOUDWATCH_STATISTICS, DEFAULT_MAX_CONCURRENCY, DEFAULT_MAX_TPS, DEFAULT_PERIOD, MAX_CONCURRENCY_LIMIT,
+                       max_concurrency_error, max_tps_error, period_error, rollup_error)
+from lazy_client import LazyClient
+from merge import format_rows, merge_series
+from partitions import PARTITION_SECONDS, PartitionWriter, partitioned_state
+from periods import format_periods, merge_periods, plan_periods
+from rollups import RollupWriter, build_rollups, extend_rollups, rebuild_missing_rollups
+from s3_writer import MultipartUploadWriter
+from slices import assemble, is_complete, load_manifest, record_slice, slice_key
+import stage_metrics
 
 # Set up logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-metrics = boto3.client('cloudwatch')
-s3_client = boto3.client('s3')
+# Throttling and server errors are retried by the fetch pool's adaptive rate limiter rather
+# than by botocore, so that every throttle is seen and slows the pool down. The records of
+# a batch share the client, and between them never have more than MAX_CONCURRENCY_LIMIT
+# calls in flight (see fetch_pool.budget_share), so that is all the connections it needs
+metrics = LazyClient('cloudwatch', retries={'mode': 'standard', 'max_attempts': 1}, max_pool_connections=MAX_CONCURRENCY_LIMIT)
+s3_client = LazyClient('s3')
 
-CLOUDWATCH_STATISTICS = ["Average", "Minimum", "Maximum", "Sum", "SampleCount", "IQM", "p99", "tm99", "tc99", "ts99"]
+# Archives are CSV, which the S3 CSV data source can read, or the compact binary layout of binary_writer.py
+ARCHIVE_FORMATS = ['csv', 'binary']
 
-def lambda_handler(event, context):
-    logger.info(f"Received event: {event}")
-    count = 0
-    batchFailures = {
-        'batchItemFailures': []
-    }
+# Records of one SQS batch migrated concurrently; matches the event source BatchSize
+MAX_CONCURRENT_RECORDS = 10
+
+def archive_window(pool, queries, destinationMetrics, windowStartTime, windowEndTime, bucketName, key, fingerprint=None, existing=None,
+                   segments=None, rollups=None):
+    """
+    Fetch the window chunk by chunk on a bounded pool that backs off when we are
+    throttled. Each chunk's series are k-way merged on timestamp and streamed straight
+    into a multipart upload while later chunks are still fetching.
+
+    When a fingerprint of the request is given and the window spans more than one
+    chunk, progress is checkpointed next to the key as parts finish uploading. A
+    redelivered message for the same request then reopens the multipart upload and
+    fetches only the chunks after the last checkpoint.
+
+    existing describes an object already archived at key (see incremental.archived_state);
+    the new rows are appended after its contents.
+
+    segments splits the window into (start, end, period) parts fetched at their own
+    period (see periods.plan_periods); by default the whole window uses the queries' period.
 
-    for record in event['Records']:
-        body = record['body']
-        # Parse body into json
-        body = json.loads(body)
-
-        # Check to see if the event does not include a metricName
-        if 'metricName' not in body or body['metricName'] == '':
-            logger.error("No metricName found in body")  # nosemgrep: logging-error-without-handling
-            return {
-                'statusCode': 400,
-                'message': 'No metricName found in body'
-            }
-        
-        metricName = body['metricName']
-
-        if 'destinationMetricName' not in body or body['destinationMetricName'] == '':
-            logger.error("No destination metric name found in body")  # nosemgrep: logging-error-without-handling
-            return {
-                'statusCode': 400, 
-                'message': 'No destination metric name found in body'
-            }
-
-        destinationMetricName = body['destinationMetricName']
-
-        if 'destinationKey' not in body or body['destinationKey'] == '':
-            logger.error("No destination key found in body")  # nosemgrep: logging-error-without-handling
-            return {
-                'statusCode': 400,
-                'message': 'No destination key found in body'
-            }
-        
-        destinationKey = body['destinationKey']
-
-        # Check to see if the event does not include a namespace
-        if 'namespace' not in body or body['namespace'] == '':
-            logger.error("No namespace found in body")  # nosemgrep: logging-error-without-handling
-            return {
-                'statusCode': 400,
-                'message': 'No namespace found in body'
-            }
-        
-        namespace = body['namespace']
-
-        if 'startTime' not in body or body['startTime'] == '':
-            logger.error("No startTime found in body")  # nosemgrep: logging-error-without-handling
-            raise RuntimeError("No startTime found in body")
-        if 'endTime' not in body or body['endTime'] == '':
-            logger.error("No endTime found in body")  # nosemgrep: logging-error-without-handling
-            raise RuntimeError("No endTime found in body")
-        
-        windowStartTimeStr = body['startTime']
-        windowEndTimeStr = body['endTime']
-
-        try:
-            windowStartTime = datetime.datetime.fromisoformat(windowStartTimeStr.replace('Z', '+00:00'))
-        except Exception as e:
-            logger.error("Error parsing startTime")  # nosemgrep: logging-error-without-handling
-            raise RuntimeError("Error parsing startTime")
-
-        try:
-            windowEndTime = datetime.datetime.fromisoformat(windowEndTimeStr.replace('Z', '+00:00'))
-        except Exception as e:
-            logger.error("Error parsing endTime")  # nosemgrep: logging-error-without-handling
-            raise RuntimeError("Error parsing endTime")
-
-        if 'dimensions' not in body:
-            logger.info("No dimensions found in body - this might be fine (but probably not.)")
-            dimensions = []
+    rollups lists the rollup periods to build. They are fed the rows as they are
+    written, carrying on from the existing rollups when appending (see
+    rollups.extend_rollups), and only rebuilt from the finished object when that is
+    not possible, after resuming from a checkpoint or when there are none to extend.
+
+    Returns the number of bytes written to s3://bucketName/key.
+    """
+    fileHeader = ','.join(['timestamp'] + destinationMetrics)
+    if existing is not None and existing['header'] != fileHeader:
+        logger.error(f"Columns of s3://{bucketName}/{key} do not match the metrics being archived")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError(f"Cannot append to s3://{bucketName}/{key}: existing columns {existing['header']} do not match {fileHeader}")
+    if segments is None:
+        segments = [(windowStartTime, windowEndTime, queries[0]['MetricStat']['Period'] if queries else DEFAULT_PERIOD)]
+    chunks = plan_segment_chunks(segments, len(queries))
+    checkpointed = fingerprint is not None and len(chunks) > 1
+
+    state = None
+    if checkpointed:
+        state = load_checkpoint(s3_client, bucketName, key, fingerprint)
+        if state is not None and state['header'] != fileHeader:
+            logger.info(f"Metrics for s3://{bucketName}/{key} changed since the checkpoint, starting over")
+            state = None
+        if state is not None:
+            resumeTime = datetime.datetime.fromtimestamp(state['position'], tz=windowStartTime.tzinfo)
+            chunks = [chunk for chunk in chunks if chunk[1] > resumeTime]
+            if chunks:
+                chunks[0] = (resumeTime,) + tuple(chunks[0][1:])
+            logger.info(f"Resuming s3://{bucketName}/{key} from {resumeTime.isoformat()}")
+
+    periods = format_periods(segments)
+    if existing is not None:
+        periods = merge_periods(existing.get('periods'), periods)
+
+    def save(writerState):
+        save_checkpoint(s3_client, bucketName, key, dict(writerState, fingerprint=fingerprint, header=fileHeader))
+
+    # Rows uploaded before a checkpoint are not fetched again, so a resumed migration rebuilds its rollups at the end
+    rollupWriter = None
+    if rollups and state is None:
+        if existing is None:
+            rollupWriter = RollupWriter(s3_client, bucketName, key, destinationMetrics, rollups)
         else:
-            dimensions = body['dimensions']
-
-        if 'cloudwatchStats' not in body:
-            logger.error("cloudwatchStats missing from body.")  # nosemgrep: logging-error-without-handling
-            raise RuntimeError("cloudwatchStats missing from body")
-        
-        if not isinstance(body['cloudwatchStats'], list):
-            logger.error("cloudwatchStats must be a list.")  # nosemgrep: logging-error-without-handling
-            raise RuntimeError("cloudwatchStats must be a list")
-        
-        if not (len(body['cloudwatchStats']) > 0):
-            logger.error("cloudwatchStats list must contain at least one cloudwatch stat to migrate")  # nosemgrep: logging-error-without-handling
-            raise RuntimeError("cloudwatchStats must contain a list of at least one cloudwatch stat to migrate")
-        
-        for cwStat in body['cloudwatchStats']:
-            if cwStat not in CLOUDWATCH_STATISTICS:
-                logger.error(f"{cwStat} is not a valid cloudwatchStat")  # nosemgrep: logging-error-without-handling
-        
-        cloudwatchStatsToMigrate = body['cloudwatchStats']
-
-        continuePaginating = True
-        nextToken = None;
-        seriesToSync = []
-        while continuePaginating:
-            if nextToken is not None:
-                print(f"Paginating from a next token")
-            else:
-                print("Starting Metric Query")
-
-            if nextToken is None:
-                metricsListFromCloudWatch = metrics.list_metrics(
-                    Namespace=namespace,
-                    MetricName=metricName,
-                    Dimensions=dimensions
-                )
-            else:
-                metricsListFromCloudWatch = metrics.list_metrics(
-                    Namespace=namespace,
-                    MetricName=metricName,
-                    Dimensions=dimensions,
-                    NextToken=nextToken
-                )
-            if 'NextToken' in metricsListFromCloudWatch:
-                nextToken = metricsListFromCloudWatch['NextToken']
-                logger.info(f"Found nextToken: {nextToken}")
-                continuePaginating = True
-            else:
-                logger.info("No nextToken found")
-                continuePaginating = False
-
-            seriesToSync.append(metricsListFromCloudWatch['Metrics'])
-
-        logger.info(f"list_metrics response: {metricsListFromCloudWatch}")
-
-        metricsToSyncAfterDimensionsFilter = []
-        for metric in metricsListFromCloudWatch['Metrics']:
-            if len(metric['Dimensions']) == len(dimensions):
-                metricsToSyncAfterDimensionsFilter.append(metric)
-
-        logger.info(f"metrics to sync after getting rid of metrics with extra dimensions: {metricsToSyncAfterDimensionsFilter}")
-
-
-        dataToSync = []
-        for metric in metricsToSyncAfterDimensionsFilter:
-            logger.info(f"Syncing metric: {metric}")
-            for stat in cloudwatchStatsToMigrate:
-                # Check to see if the metric has dimensions
-                namespace = metric['Namespace']
-                name = metric['MetricName']
-                dimensions = metric['Dimensions']
-                print(f"Ready to fetch {stat}")
-                # Fetch the metric data from CloudWatch
-                count += 1
-                continueFetchingData = True
-                nextDataToken = None
-                while continueFetchingData:
-                    if nextDataToken == None:
-                        fetchedMetricData = metrics.get_metric_data(
-                            MetricDataQueries=[
-                                {
-                                    'Id': "r"+str(count),
-                                    'MetricStat': {
-                                        'Metric': {
-                                            'Namespace': namespace,
-                                            'MetricName': name,
-                                            'Dimensions': dimensions
-                                        },
-                                        'Period': 60,
-                                        'Stat': stat
-                                    }
-                                }
-                            ],
-                            StartTime=windowStartTime,
-                            EndTime=windowEndTime
-                        )
-                    else:
-                            fetchedMetricData = metrics.get_metric_data(
-                            MetricDataQueries=[
-                                {
-                                    'Id': "r"+str(count),
-                                    'MetricStat': {
-                                        'Metric': {
-                                            'Namespace': namespace,
-                                            'MetricName': name,
-                                            'Dimensions': dimensions
-                                        },
-                                        'Period': 60,
-                                        'Stat': stat
-                                    }
-                                }
-                            ],
-                            StartTime=windowStartTime,
-                            EndTime=windowEndTime,
-                            NextToken=nextDataToken
-                        )
-                            
-                    if 'NextToken' in fetchedMetricData:
-                        logger.info(f"Found nextToken: {fetchedMetricData['NextToken']}")
-                        continueFetchingData = True
-                    else:
-                        logger.info("No nextToken found")
-                        continueFetchingData = False
-                        nextDataToken = None
-                    
-                    dataToSync.append(
-                        { 
-                            'results': fetchedMetricData['MetricDataResults'][0],
-                            'query': {
-                                'MetricStat': {
-                                    'Metric': {
-                                        'Namespace': namespace,
-                                        'MetricName': name,
-                                        'Dimensions': dimensions
-                                    },
-                                    'ReturnData': True,
-                                    'Period': 60,
-                                    'Stat': stat
-                                }
-                            }
-                        }
-                    )
-                    
-            
-    print("DATA TO SYNC")
-    print(json.dumps(dataToSync, default=str))
-
-    destinationMetrics = []
-    fileHeader = "timestamp,"
-    for queryResult in dataToSync:
-        sourceStatName = queryResult['query']['MetricStat']['Stat']
-        headerEntry = destinationMetricName+'-'+sourceStatName
-        destinationMetrics.append(headerEntry)
-        fileHeader = fileHeader+headerEntry+","
-    
-    fileHeader = fileHeader[:-1]
-
-    timestampKeyedMetrics = {}
-    # Use tempfile for secure temporary file creation with proper permissions
-    # Safe in Lambda: isolated container with ephemeral /tmp, secure file permissions (0600), proper cleanup in finally block
-    with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', delete=False, dir='/tmp', suffix='.csv') as tempFile:  # nosec B108
-        temp_file_path = tempFile.name  # nosemgrep: tempfile-without-flush - File is flushed before context exit and used after
-        tempFile.write(fileHeader + '\n')
-        for queryResult in dataToSync:
-            sourceStatName = queryResult['query']['MetricStat']['Stat']
-            headerEntry = destinationMetricName+'-'+sourceStatName
-            zipped = zip(queryResult['results']['Timestamps'], queryResult['results']['Values'])
-            for z in zipped:
-                if z[0] not in timestampKeyedMetrics:
-                    timestampKeyedMetrics[z[0]] = {}
-                timestampKeyedMetric = timestampKeyedMetrics[z[0]]
-                timestampKeyedMetric[headerEntry] = z[1]
-        for timestamp, values in timestampKeyedMetrics.items():
-            s = timestamp.isoformat()+","
-            for headerEntry in destinationMetrics:
-                s = s + str(values[headerEntry]) + ","
-            s = s[:-1]
-            tempFile.write(s+'\n')
-        tempFile.flush()  # Ensure all data is written to disk before upload
+            rollupWriter = extend_rollups(s3_client, bucketName, key, destinationMetrics, rollups, existing)
+
+    try:
+        with MultipartUploadWriter(s3_client, bucketName, key, resume=state,
+                                   onCheckpoint=save if checkpointed else None,
+                                   abortOnError=not checkpointed,
+                                   metadata=archive_metadata(windowEndTime, periods, rollups)) as writer, \
+             (rollupWriter if rollupWriter is not None else nullcontext()):
+            if state is None and existing is not None:
+                carry_over(s3_client, writer, bucketName, key, existing)
+            elif state is None:
+                writer.write(fileHeader + '\n')
+            for chunkStart, chunkEnd, chunkResults in fetch_chunks(metrics, pool, queries, chunks):
+                chunkSeries = [chunkResults[query['Id']] for query in queries]
+                chunkEndEpoch = math.ceil(chunkEnd.timestamp())
+                writer.write(format_rows(chunkSeries, math.floor(chunkStart.timestamp()), chunkEndEpoch,
+                                         onRow=rollupWriter.add_row if rollupWriter is not None else None),
+                             position=chunkEndEpoch)
+        logger.info(f"Successfully uploaded {writer.bytesWritten} bytes of metrics to s3://{bucketName}/{key}")
+    except Exception as e:
+        logger.error(f"Error uploading file to S3: {str(e)}")  # nosemgrep: logging-error-without-handling
+        raise
+    if checkpointed:
+        delete_checkpoint(s3_client, bucketName, key)
+    if rollups and rollupWriter is None:
+        build_rollups(s3_client, bucketName, key, rollups)
+    return writer.bytesWritten
+
+def archive_partitions(pool, queries, destinationMetrics, windowStartTime, windowEndTime, bucketName, destinationKey, partitionBy,
+                       existing=None, segments=None):
+    """
+    Fetch the window like archive_window, but write one object per day or hour
+    under destinationKey plus an index of the partitions (see partitions.py).
+
+    existing describes the partitioned archive already at destinationKey (see
+    partitions.partitioned_state); its partitions are kept and the new rows appended.
+
+    Returns the number of bytes written.
+    """
+    fileHeader = ','.join(['timestamp'] + destinationMetrics)
+    if existing is not None and existing['header'] != fileHeader:
+        logger.error(f"Columns of s3://{bucketName}/{destinationKey} do not match the metrics being archived")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError(f"Cannot append to s3://{bucketName}/{destinationKey}: existing columns {existing['header']} do not match {fileHeader}")
+    if segments is None:
+        segments = [(windowStartTime, windowEndTime, queries[0]['MetricStat']['Period'] if queries else DEFAULT_PERIOD)]
+    chunks = plan_segment_chunks(segments, len(queries))
+
+    periods = format_periods(segments)
+    if existing is not None:
+        periods = merge_periods(existing.get('periods'), periods)
 
+    writer = PartitionWriter(s3_client, bucketName, destinationKey, partitionBy, fileHeader, existing)
     try:
-        s3_key = destinationKey
-        s3_client.upload_file(
-            temp_file_path,
-            os.environ['ARCHIVED_METRICS_BUCKET_NAME'],
-            s3_key
-        )
-        logger.info(f"Successfully uploaded metrics to s3://{os.environ['ARCHIVED_METRICS_BUCKET_NAME']}/{s3_key}")
+        for chunkStart, chunkEnd, chunkResults in fetch_chunks(metrics, pool, queries, chunks):
+            chunkSeries = [chunkResults[query['Id']] for query in queries]
+            writer.write_rows(chunkSeries, math.floor(chunkStart.timestamp()), math.ceil(chunkEnd.timestamp()))
+        index = writer.close(windowEndTime, periods)
+    except Exception as e:
+        logger.error(f"Error uploading partitions to S3: {str(e)}")  # nosemgrep: logging-error-without-handling
+        raise
+    logger.info(f"Successfully uploaded {writer.bytesWritten} bytes of metrics in {len(index['partitions'])} partitions under s3://{bucketName}/{destinationKey}/")
+    return writer.bytesWritten
+
+def archive_binary(pool, queries, destinationMetrics, windowStartTime, windowEndTime, bucketName, key, segments=None, rollups=None):
+    """
+    Fetch the window like archive_window, but encode it in the binary layout of
+    binary_writer.py. Binary archives are written in one go: they are not
+    checkpointed and cannot be appended to, so their rollups are built from the
+    same rows as they are written.
 
+    Returns the number of bytes written to s3://bucketName/key.
+    """
+    if segments is None:
+        segments = [(windowStartTime, windowEndTime, queries[0]['MetricStat']['Period'] if queries else DEFAULT_PERIOD)]
+    chunks = plan_segment_chunks(segments, len(queries))
+
+    try:
+        with MultipartUploadWriter(s3_client, bucketName, key, contentType='application/octet-stream',
+                                   metadata=archive_metadata(windowEndTime, format_periods(segments), rollups)) as writer, \
+             (RollupWriter(s3_client, bucketName, key, destinationMetrics, rollups, binary=True) if rollups else nullcontext()) as rollupWriter:
+            encoder = BinaryArchiveWriter(writer, destinationMetrics)
+            for chunkStart, chunkEnd, chunkResults in fetch_chunks(metrics, pool, queries, chunks):
+                chunkSeries = [chunkResults[query['Id']] for query in queries]
+                with stage_metrics.stage('BinaryEncode'):
+                    for timestamp, values in merge_series(chunkSeries, math.floor(chunkStart.timestamp()), math.ceil(chunkEnd.timestamp())):
+                        encoder.append(timestamp, values)
+                        if rollupWriter is not None:
+                            rollupWriter.add_row(timestamp, values)
+            encoder.close()
+        logger.info(f"Successfully uploaded {writer.bytesWritten} bytes of metrics in {len(encoder.blocks)} blocks to s3://{bucketName}/{key}")
     except Exception as e:
         logger.error(f"Error uploading file to S3: {str(e)}")  # nosemgrep: logging-error-without-handling
         raise
-    finally:
-        # Clean up the temporary file
-        if os.path.exists(temp_file_path):
-            os.unlink(temp_file_path)
+    return writer.bytesWritten
+
+def process_record(record, sharedBy=1):
+    """
+    Migrate the request carried by one SQS record. Raises when the request is
+    invalid or the migration fails, so the caller can report the record as failed.
+
+    sharedBy is the number of records migrating at the same time; the request's
+    maxConcurrency and maxTps are cut to its share of the function's limits.
+    """
+    body = record['body']
+    # Parse body into json
+    body = json.loads(body)
+
+    # Check to see if the event does not include a metricName
+    if 'metricName' not in body or body['metricName'] == '':
+        logger.error("No metricName found in body")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError("No metricName found in body")
+
+    metricName = body['metricName']
+
+    if 'destinationMetricName' not in body or body['destinationMetricName'] == '':
+        logger.error("No destination metric name found in body")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError("No destination metric name found in body")
+
+    destinationMetricName = body['destinationMetricName']
+
+    if 'destinationKey' not in body or body['destinationKey'] == '':
+        logger.error("No destination key found in body")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError("No destination key found in body")
+
+    destinationKey = body['destinationKey']
 
-    print("DESTINATION METRICS")
-    print(json.dumps(destinationMetrics))
+    # Check to see if the event does not include a namespace
+    if 'namespace' not in body or body['namespace'] == '':
+        logger.error("No namespace found in body")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError("No namespace found in body")
+
+    namespace = body['namespace']
+
+    if 'startTime' not in body or body['startTime'] == '':
+        logger.error("No startTime found in body")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError("No startTime found in body")
+    if 'endTime' not in body or body['endTime'] == '':
+        logger.error("No endTime found in body")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError("No endTime found in body")
+
+    windowStartTimeStr = body['startTime']
+    windowEndTimeStr = body['endTime']
+
+    try:
+        windowStartTime = datetime.datetime.fromisoformat(windowStartTimeStr.replace('Z', '+00:00'))
+    except Exception:
+        logger.error("Error parsing startTime")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError("Error parsing startTime")
+
+    try:
+        windowEndTime = datetime.datetime.fromisoformat(windowEndTimeStr.replace('Z', '+00:00'))
+    except Exception:
+        logger.error("Error parsing endTime")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError("Error parsing endTime")
+
+    if 'dimensions' not in body:
+        logger.info("No dimensions found in body - this might be fine (but probably not.)")
+        dimensions = []
+    else:
+        dimensions = body['dimensions']
+
+    if 'cloudwatchStats' not in body:
+        logger.error("cloudwatchStats missing from body.")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError("cloudwatchStats missing from body")
+
+    if not isinstance(body['cloudwatchStats'], list):
+        logger.error("cloudwatchStats must be a list.")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError("cloudwatchStats must be a list")
+
+    if not (len(body['cloudwatchStats']) > 0):
+        logger.error("cloudwatchStats list must contain at least one cloudwatch stat to migrate")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError("cloudwatchStats must contain a list of at least one cloudwatch stat to migrate")
+
+    for cwStat in body['cloudwatchStats']:
+        if cwStat not in CLOUDWATCH_STATISTICS:
+            logger.error(f"{cwStat} is not a valid cloudwatchStat")  # nosemgrep: logging-error-without-handling
+
+    cloudwatchStatsToMigrate = body['cloudwatchStats']
+
+    maxConcurrency = body.get('maxConcurrency', DEFAULT_MAX_CONCURRENCY)
+    maxTps = body.get('maxTps', DEFAULT_MAX_TPS)
+    error = max_concurrency_error(maxConcurrency) or max_tps_error(maxTps)
+    if error is not None:
+        logger.error(error)  # nosemgrep: logging-error-without-handling
+        raise RuntimeError(error)
+
+    sliceInfo = body.get('slice')
+    if sliceInfo is not None:
+        if not isinstance(sliceInfo, dict) or not all(field in sliceInfo for field in ['jobId', 'index', 'count']):
+            logger.error("slice must include jobId, index and count")  # nosemgrep: logging-error-without-handling
+            raise RuntimeError("slice must include jobId, index and count")
+
+    period = body.get('period', DEFAULT_PERIOD)
+    error = period_error(period)
+    if error is not None:
+        logger.error(error)  # nosemgrep: logging-error-without-handling
+        raise RuntimeError(error)
+
+    incremental = body.get('incremental', False)
+    if not isinstance(incremental, bool):
+        logger.error("incremental must be true or false")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError("incremental must be true or false")
+
+    partitionBy = body.get('partitionBy')
+    if partitionBy is not None and partitionBy not in PARTITION_SECONDS:
+        logger.error(f"partitionBy must be one of {sorted(PARTITION_SECONDS)}")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError(f"partitionBy must be one of {sorted(PARTITION_SECONDS)}")
+    if partitionBy is not None and sliceInfo is not None:
+        logger.error("partitionBy cannot be combined with slice")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError("partitionBy cannot be combined with slice")
+
+    archiveFormat = body.get('format', 'csv')
+    if archiveFormat not in ARCHIVE_FORMATS:
+        logger.error(f"format must be one of {ARCHIVE_FORMATS}")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError(f"format must be one of {ARCHIVE_FORMATS}")
+    if archiveFormat == 'binary' and (incremental or partitionBy is not None or sliceInfo is not None):
+        logger.error("binary archives cannot be incremental, partitioned or sliced")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError("binary archives cannot be incremental, partitioned or sliced")
+
+    rollups = body.get('rollups')
+    if rollups is not None:
+        error = rollup_error(rollups, cloudwatchStatsToMigrate, period)
+        if error is None and partitionBy is not None:
+            error = "rollups cannot be combined with partitionBy"
+        if error is not None:
+            logger.error(error)  # nosemgrep: logging-error-without-handling
+            raise RuntimeError(error)
+
+    bucketName = os.environ['ARCHIVED_METRICS_BUCKET_NAME']
+
+    # Incremental jobs only fetch what is newer than the archive already at destinationKey
+    existing = None
+    if incremental and sliceInfo is None:
+        if partitionBy is not None:
+            existing = partitioned_state(s3_client, bucketName, destinationKey)
+            if existing is not None and existing['partitionBy'] != partitionBy:
+                logger.error(f"s3://{bucketName}/{destinationKey} is partitioned by {existing['partitionBy']}, not {partitionBy}")  # nosemgrep: logging-error-without-handling
+                raise RuntimeError(f"s3://{bucketName}/{destinationKey} is partitioned by {existing['partitionBy']}, not {partitionBy}")
+        else:
+            existing = archived_state(s3_client, bucketName, destinationKey)
+        archivedThrough = existing['archivedThrough'] if existing is not None else None
+        if archivedThrough is not None and archivedThrough >= windowEndTime:
+            logger.info(f"s3://{bucketName}/{destinationKey} is already archived through {archivedThrough.isoformat()}")
+            if partitionBy is None:
+                rebuild_missing_rollups(s3_client, bucketName, destinationKey)
+            return
+        if archivedThrough is not None and archivedThrough > windowStartTime:
+            logger.info(f"s3://{bucketName}/{destinationKey} is archived through {archivedThrough.isoformat()}, fetching only newer data")
+            windowStartTime = archivedThrough
+
+    # A slice of a sharded job writes its own intermediate object; the job's
+    # destinationKey is only written once every slice is done
+    outputKey = destinationKey
+    manifest = None
+    if sliceInfo is not None:
+        outputKey = slice_key(destinationKey, sliceInfo['jobId'], sliceInfo['index'])
+        manifest, _ = load_manifest(s3_client, bucketName, destinationKey, sliceInfo['jobId'])
+        if manifest is not None and manifest.get('assembled'):
+            logger.info(f"Job {sliceInfo['jobId']} is already assembled, nothing to do for slice {sliceInfo['index']}")
+            rebuild_missing_rollups(s3_client, bucketName, destinationKey)
+            return
+
+    if manifest is not None and str(sliceInfo['index']) in manifest['slices']:
+        logger.info(f"Slice {sliceInfo['index']} of job {sliceInfo['jobId']} was already recorded")
+    else:
+        # In auto mode older parts of the window are fetched at the coarser periods CloudWatch still retains
+        segments = plan_periods(windowStartTime, windowEndTime, period)
+        with FetchPool(*budget_share(maxConcurrency, maxTps, sharedBy)) as pool:
+            queries = list_job_queries(metrics, pool, namespace, metricName, dimensions, cloudwatchStatsToMigrate, segments[0][2])
+
+            destinationMetrics = [destinationMetricName+'-'+query['MetricStat']['Stat'] for query in queries]
+            if partitionBy is not None:
+                archive_partitions(pool, queries, destinationMetrics, windowStartTime, windowEndTime, bucketName, destinationKey, partitionBy,
+                                   existing=existing, segments=segments)
+                return
+            if archiveFormat == 'binary':
+                archive_binary(pool, queries, destinationMetrics, windowStartTime, windowEndTime, bucketName, destinationKey,
+                               segments=segments, rollups=rollups)
+                return
+            bytesWritten = archive_window(pool, queries, destinationMetrics, windowStartTime, windowEndTime, bucketName, outputKey,
+                                          fingerprint=job_fingerprint(body), existing=existing, segments=segments,
+                                          rollups=rollups if sliceInfo is None else None)
+
+        if sliceInfo is not None:
+            manifest = record_slice(s3_client, bucketName, destinationKey, sliceInfo, {
+                'key': outputKey,
+                'startTime': windowStartTimeStr,
+                'endTime': windowEndTimeStr,
+                'bytes': bytesWritten,
+                'periods': format_periods(segments)
+            })
+
+    if sliceInfo is not None and is_complete(manifest):
+        if assemble(s3_client, bucketName, manifest, rollups) and rollups:
+            build_rollups(s3_client, bucketName, destinationKey, rollups)
+
+def lambda_handler(event, context):
+    logger.info(f"Received event: {event}")
+    batchFailures = {
+        'batchItemFailures': []
+    }
+
+    # Records of a batch are independent migrations; run them side by side and
+    # report only the ones that failed so SQS redelivers just those
+    records = event['Records']
+    stage_metrics.begin('migrate')
+    stage_metrics.count('Records', len(records))
+    concurrentRecords = max(1, min(len(records), MAX_CONCURRENT_RECORDS))
+    try:
+        with ThreadPoolExecutor(max_workers=concurrentRecords, thread_name_prefix='record') as executor:
+            futures = [(record, executor.submit(process_record, record, concurrentRecords)) for record in records]
+            for record, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Failed to process message {record.get('messageId')}: {str(e)}")  # nosemgrep: logging-error-without-handling
+                    batchFailures['batchItemFailures'].append({'itemIdentifier': record.get('messageId')})
+                    stage_metrics.count('FailedRecords')
+    finally:
+        stage_metrics.emit()
 
-    print("BATCH FAILURES")
-    print(json.dumps(batchFailures, default=str))
+    if batchFailures['batchItemFailures']:
+        logger.warning(f"Batch failures: {[failure['itemIdentifier'] for failure in batchFailures['batchItemFailures']]}")
     return batchFailures
\ No newline at end of file
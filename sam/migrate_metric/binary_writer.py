@@ -0,0 +1,98 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import json
+import operator
+import struct
+import zlib
+from array import array
+from itertools import chain
+
+# Binary archives hold the same rows as the CSV format in a fraction of the space:
+#
+#   MAGIC
+#   block, block, ...   each a BLOCK_HEADER (payload length, rows, first and last
+#                       timestamp) followed by a zlib compressed payload
+#   footer              zlib compressed JSON with the columns and an index of the blocks
+#   TRAILER             footer offset and length, then MAGIC again
+#
+# A block payload holds the rows' timestamps as delta-of-delta int64s, then for each
+# column a presence byte per row and the XOR of each present value's IEEE 754 bits with
+# the previous one's. Like Gorilla, regular timestamps turn into runs of zeros and slowly
+# changing values into words with long runs of zero bits; the int64 arrays are stored
+# byte-shuffled (all first bytes, then all second bytes, ...) so that zlib sees those
+# runs, and decoding stays in C instead of unpacking bits one by one in Python.
+#
+# timeshift/binary_reader.py decodes this layout; keep the two in step.
+MAGIC = b'MAB1'
+FORMAT_VERSION = 1
+BLOCK_HEADER = struct.Struct('<IIqq')
+TRAILER = struct.Struct('<QI4s')
+BLOCK_ROWS = 1024
+COMPRESSION_LEVEL = 6
+
+
+def shuffle(words):
+    """Byte-shuffle an array of 8 byte words"""
+    raw = words.tobytes()
+    return b''.join(raw[byte::8] for byte in range(8))
+
+
+def encode_block(timestamps, columns):
+    """Payload of one block: timestamps as epoch seconds, columns as lists with None for gaps"""
+    deltas = [0] + list(map(operator.sub, timestamps[1:], timestamps))
+    parts = [shuffle(array('q', [0] + list(map(operator.sub, deltas[1:], deltas))))]
+    for values in columns:
+        parts.append(bytes(value is not None for value in values))
+        bits = array('Q', array('d', [value for value in values if value is not None]).tobytes())
+        parts.append(shuffle(array('Q', map(operator.xor, bits, chain((0,), bits)))))
+    return zlib.compress(b''.join(parts), COMPRESSION_LEVEL)
+
+
+class BinaryArchiveWriter:
+    """
+    Encode rows into blocks of BLOCK_ROWS rows and write them to sink, an
+    object with a write_bytes method such as s3_writer.MultipartUploadWriter.
+    Chunks must arrive in time order. close() writes the footer and trailer.
+    """
+
+    def __init__(self, sink, columns):
+        self.sink = sink
+        self.columns = columns
+        self.blocks = []
+        self.offset = 0
+        self.timestamps = []
+        self.values = [[] for _ in columns]
+        self._write(MAGIC)
+
+    def _write(self, data):
+        self.sink.write_bytes(data)
+        self.offset += len(data)
+
+    def append(self, timestamp, values):
+        """Add one row, None marking a gap, after every row added so far"""
+        self.timestamps.append(timestamp)
+        for column, value in zip(self.values, values):
+            column.append(value)
+        if len(self.timestamps) >= BLOCK_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if not self.timestamps:
+            return
+        payload = encode_block(self.timestamps, self.values)
+        rows, first, last = len(self.timestamps), self.timestamps[0], self.timestamps[-1]
+        self.blocks.append([self.offset, BLOCK_HEADER.size + len(payload), rows, first, last])
+        self._write(BLOCK_HEADER.pack(len(payload), rows, first, last) + payload)
+        self.timestamps = []
+        self.values = [[] for _ in self.columns]
+
+    def close(self):
+        self._flush()
+        footer = zlib.compress(json.dumps({
+            'version': FORMAT_VERSION,
+            'columns': self.columns,
+            'blocks': self.blocks
+        }).encode('utf-8'), COMPRESSION_LEVEL)
+        footerOffset = self.offset
+        self._write(footer + TRAILER.pack(footerOffset, len(footer), MAGIC))
@@ -0,0 +1,74 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import hashlib
+import json
+import logging
+
+from lazy_client import error_code
+
+logger = logging.getLogger()
+
+# Request fields that only tune how a job runs and do not change its output
+TUNING_FIELDS = {'maxConcurrency', 'maxTps'}
+
+# A checkpoint lives next to the object being written:
+#   <outputKey>.checkpoint.json
+# and records the open multipart upload, the parts already uploaded, and the
+# time position up to which those parts hold every row.
+
+
+def checkpoint_key(outputKey):
+    return f"{outputKey}.checkpoint.json"
+
+
+def job_fingerprint(body):
+    """Stable hash of everything in a request that affects its output"""
+    relevant = {field: value for field, value in body.items() if field not in TUNING_FIELDS}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def load_checkpoint(s3, bucket, outputKey, fingerprint):
+    """
+    Return the saved state for outputKey, or None when there is nothing to resume.
+    Checkpoints left by a different request for the same key are ignored.
+    """
+    try:
+        response = s3.get_object(Bucket=bucket, Key=checkpoint_key(outputKey))
+    except Exception as e:
+        if error_code(e) in ('NoSuchKey', '404'):
+            return None
+        raise
+
+    state = json.loads(response['Body'].read())
+    if state.get('fingerprint') != fingerprint:
+        logger.info(f"Ignoring checkpoint for s3://{bucket}/{outputKey} left by a different request")
+        return None
+
+    # The multipart upload may have been aborted since (for example by the bucket lifecycle rule)
+    try:
+        listed = s3.list_parts(Bucket=bucket, Key=outputKey, UploadId=state['uploadId'])
+    except Exception as e:
+        if error_code(e) == 'NoSuchUpload':
+            logger.info(f"Multipart upload in checkpoint for s3://{bucket}/{outputKey} no longer exists")
+            return None
+        raise
+    uploaded = {part['PartNumber'] for part in listed.get('Parts', [])}
+    if not all(part['PartNumber'] in uploaded for part in state['parts']):
+        logger.warning(f"Checkpoint for s3://{bucket}/{outputKey} references parts that are missing")
+        return None
+
+    return state
+
+
+def save_checkpoint(s3, bucket, outputKey, state):
+    s3.put_object(
+        Bucket=bucket,
+        Key=checkpoint_key(outputKey),
+        Body=json.dumps(state).encode('utf-8'),
+        ContentType='application/json'
+    )
+
+
+def delete_checkpoint(s3, bucket, outputKey):
+    s3.delete_object(Bucket=bucket, Key=checkpoint_key(outputKey))
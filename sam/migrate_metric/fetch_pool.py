@@ -0,0 +1,168 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from job_rules import DEFAULT_MAX_CONCURRENCY, DEFAULT_MAX_TPS, MAX_CONCURRENCY_LIMIT, MAX_TPS_LIMIT
+import stage_metrics
+
+logger = logging.getLogger()
+
+MAX_RETRIES = 8
+BASE_BACKOFF_SECONDS = 0.25
+MAX_BACKOFF_SECONDS = 10
+MIN_TPS = 0.5
+
+THROTTLING_ERROR_CODES = {
+    'Throttling',
+    'ThrottlingException',
+    'LimitExceeded',
+    'LimitExceededException',
+    'RequestLimitExceeded',
+    'TooManyRequestsException'
+}
+
+# Server-side failures worth retrying: botocore's own retries are off (see app.metrics)
+TRANSIENT_ERROR_CODES = {
+    'InternalFailure',
+    'InternalError',
+    'InternalServiceError',
+    'ServiceUnavailable',
+    'ServiceUnavailableException',
+    'RequestTimeout',
+    'RequestTimeoutException'
+}
+
+
+def budget_share(maxConcurrency, maxTps, sharedBy):
+    """
+    A job's (maxConcurrency, maxTps) cut down to its share of the function's limits,
+    MAX_CONCURRENCY_LIMIT calls in flight and MAX_TPS_LIMIT calls a second, when
+    sharedBy jobs fetch at the same time through one CloudWatch client
+    """
+    sharedBy = max(1, sharedBy)
+    return max(1, min(maxConcurrency, MAX_CONCURRENCY_LIMIT // sharedBy)), min(maxTps, MAX_TPS_LIMIT / sharedBy)
+
+
+def is_throttling_error(error):
+    from botocore.exceptions import ClientError
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+
+def is_transient_error(error):
+    """A 5xx or other server-side failure that may succeed when retried"""
+    from botocore.exceptions import ClientError
+    if not isinstance(error, ClientError):
+        return False
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    return error.response.get('Error', {}).get('Code') in TRANSIENT_ERROR_CODES or (isinstance(status, int) and status >= 500)
+
+
+class AdaptiveRateLimiter:
+    """
+    Paces calls to at most `tps` per second with at most `concurrency` in flight.
+
+    Both limits start at their configured maximum. A throttled call halves them;
+    every window of successful calls raises them again by a small step, so the
+    limiter settles just under whatever rate CloudWatch is willing to serve.
+    """
+
+    def __init__(self, maxConcurrency=DEFAULT_MAX_CONCURRENCY, maxTps=DEFAULT_MAX_TPS):
+        self.maxConcurrency = maxConcurrency
+        self.maxTps = maxTps
+        self.concurrency = float(maxConcurrency)
+        self.tps = float(maxTps)
+        self.calls = 0
+        self.throttles = 0
+        self._inFlight = 0
+        self._successStreak = 0
+        self._nextStart = time.monotonic()
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self._inFlight >= max(1, int(self.concurrency)):
+                self._condition.wait()
+            self._inFlight += 1
+            now = time.monotonic()
+            startAt = max(now, self._nextStart)
+            self._nextStart = startAt + 1.0 / self.tps
+        if startAt > now:
+            time.sleep(startAt - now)
+
+    def release(self, throttled=None):
+        """Release a slot. `throttled` is None when the call failed for an unrelated reason."""
+        with self._condition:
+            self._inFlight -= 1
+            self.calls += 1
+            if throttled:
+                self.throttles += 1
+                stage_metrics.count('Throttles')
+                self._successStreak = 0
+                self.concurrency = max(1.0, self.concurrency / 2)
+                self.tps = max(MIN_TPS, self.tps / 2)
+                logger.warning(f"Throttled by CloudWatch, backing off to concurrency {int(self.concurrency)} and {self.tps:.1f} TPS")
+            elif throttled is False:
+                self._successStreak += 1
+                if self._successStreak >= max(1, int(self.concurrency)):
+                    self._successStreak = 0
+                    self.concurrency = min(float(self.maxConcurrency), self.concurrency + 1)
+                    self.tps = min(float(self.maxTps), self.tps + self.maxTps / 20)
+            self._condition.notify_all()
+
+    def call(self, fn, **kwargs):
+        """Call fn under the limiter, retrying throttling, server and connection errors with jittered backoff"""
+        attempt = 0
+        while True:
+            self.acquire()
+            outcome = None
+            try:
+                result = fn(**kwargs)
+                outcome = False
+                return result
+            except Exception as e:
+                # botocore is only imported once a call fails, so the function's init never pays for it
+                from botocore.exceptions import ConnectionError, HTTPClientError
+                if attempt >= MAX_RETRIES:
+                    raise
+                if is_throttling_error(e):
+                    outcome = True
+                elif is_transient_error(e) or isinstance(e, (ConnectionError, HTTPClientError)):
+                    logger.warning(f"Transient error calling CloudWatch, retrying: {str(e)}")
+                else:
+                    raise
+            finally:
+                self.release(outcome)
+
+            backoff = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * (2 ** attempt))
+            time.sleep(random.uniform(0, backoff))  # nosec B311 - jitter, not security sensitive
+            attempt += 1
+
+
+class FetchPool:
+    """Bounded thread pool whose CloudWatch calls all share one adaptive rate limiter"""
+
+    def __init__(self, maxConcurrency=DEFAULT_MAX_CONCURRENCY, maxTps=DEFAULT_MAX_TPS):
+        self.limiter = AdaptiveRateLimiter(maxConcurrency, maxTps)
+        self._executor = ThreadPoolExecutor(max_workers=maxConcurrency, thread_name_prefix='cloudwatch-fetch')
+
+    def call(self, fn, **kwargs):
+        return self.limiter.call(fn, **kwargs)
+
+    def submit(self, fn, *args, **kwargs):
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self, cancel=False):
+        self._executor.shutdown(wait=True, cancel_futures=cancel)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.shutdown(cancel=excType is not None)
+        logger.info(f"Fetch pool made {self.limiter.calls} CloudWatch calls, {self.limiter.throttles} throttled")
+        return False
@@ -0,0 +1,222 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import datetime
+import logging
+from collections import deque
+
+from merge import Series
+import stage_metrics
+
+logger = logging.getLogger()
+
+# GetMetricData accepts at most 500 entries in MetricDataQueries per call
+MAX_QUERIES_PER_REQUEST = 500
+# and returns at most 100,800 datapoints per page
+MAX_DATAPOINTS_PER_PAGE = 100800
+# Datapoints fetched per time chunk across all of a job's queries. This bounds
+# memory while keeping each GetMetricData page close to full.
+DATAPOINTS_PER_CHUNK = 3 * MAX_DATAPOINTS_PER_PAGE
+# Number of time chunks being fetched ahead of the one being written
+PREFETCH_CHUNKS = 2
+
+
+def _direct_call(fn, **kwargs):
+    return fn(**kwargs)
+
+
+def list_metrics_pages(client, namespace, metricName, dimensions, call=_direct_call):
+    """Yield each page of list_metrics results, following NextToken"""
+    nextToken = None
+    while True:
+        request = {
+            'Namespace': namespace,
+            'MetricName': metricName,
+            'Dimensions': dimensions
+        }
+        if nextToken is not None:
+            logger.info(f"Paginating list_metrics from nextToken: {nextToken}")
+            request['NextToken'] = nextToken
+        with stage_metrics.stage('ListMetrics'):
+            response = call(client.list_metrics, **request)
+        stage_metrics.count('ListMetricsCalls')
+        yield response['Metrics']
+
+        nextToken = response.get('NextToken')
+        if nextToken is None:
+            return
+
+
+def build_metric_data_queries(metricsToSync, stats, period=60, firstId=0):
+    """Build one MetricDataQuery per (metric, stat) pair, each with a unique Id"""
+    queries = []
+    for metric in metricsToSync:
+        for stat in stats:
+            queries.append({
+                'Id': f"q{firstId + len(queries)}",
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': metric['Namespace'],
+                        'MetricName': metric['MetricName'],
+                        'Dimensions': metric['Dimensions']
+                    },
+                    'Period': period,
+                    'Stat': stat
+                },
+                'ReturnData': True
+            })
+    return queries
+
+
+def batch_queries(queries, batchSize=MAX_QUERIES_PER_REQUEST):
+    """Split queries into GetMetricData sized batches"""
+    for i in range(0, len(queries), batchSize):
+        yield queries[i:i + batchSize]
+
+
+def fetch_batch(client, batch, startTime, endTime, call=_direct_call):
+    """
+    Run a single batch of queries through GetMetricData, following NextToken
+    until the batch is drained. Results are routed back to their query by Id
+    and accumulated into array-backed Series.
+    """
+    results = {query['Id']: Series() for query in batch}
+    nextToken = None
+    pages = 0
+    while True:
+        request = {
+            'MetricDataQueries': batch,
+            'StartTime': startTime,
+            'EndTime': endTime,
+            'ScanBy': 'TimestampAscending'
+        }
+        if nextToken is not None:
+            request['NextToken'] = nextToken
+        with stage_metrics.stage('GetMetricData'):
+            response = call(client.get_metric_data, **request)
+        pages += 1
+
+        datapoints = 0
+        for result in response['MetricDataResults']:
+            series = results.get(result['Id'])
+            if series is None:
+                logger.warning(f"Ignoring result for unknown query Id {result['Id']}")
+                continue
+            series.extend(result['Timestamps'], result['Values'])
+            datapoints += len(result['Timestamps'])
+        stage_metrics.count('GetMetricDataCalls')
+        stage_metrics.count('Datapoints', datapoints)
+
+        nextToken = response.get('NextToken')
+        if nextToken is None:
+            break
+
+    logger.info(f"Fetched {len(batch)} queries in {pages} GetMetricData page(s)")
+    return results
+
+
+def fetch_metric_data(client, queries, startTime, endTime, pool=None):
+    """
+    Fetch every query, packing up to MAX_QUERIES_PER_REQUEST queries into each call.
+    When a FetchPool is given the batches are fetched concurrently under its rate limiter.
+    """
+    results = {}
+    if pool is None:
+        for batch in batch_queries(queries):
+            results.update(fetch_batch(client, batch, startTime, endTime))
+        return results
+
+    futures = [pool.submit(fetch_batch, client, batch, startTime, endTime, pool.call) for batch in batch_queries(queries)]
+    for future in futures:
+        results.update(future.result())
+    return results
+
+
+def list_job_queries(client, pool, namespace, metricName, dimensions, stats, period=60):
+    """
+    List the metrics matching a job and build one query per (metric, stat) pair.
+    Metrics carrying more dimensions than were asked for are skipped.
+    """
+    queries = []
+    for page in list_metrics_pages(client, namespace, metricName, dimensions, pool.call):
+        matching = [metric for metric in page if len(metric['Dimensions']) == len(dimensions)]
+        queries.extend(build_metric_data_queries(matching, stats, period, firstId=len(queries)))
+    logger.info(f"Built {len(queries)} queries for {namespace}/{metricName}")
+    return queries
+
+
+def plan_chunks(startTime, endTime, queryCount, period=60):
+    """
+    Split [startTime, endTime) into consecutive time chunks holding roughly
+    DATAPOINTS_PER_CHUNK datapoints across all queries. Inner chunk boundaries
+    are aligned to the period so no datapoint falls into two chunks.
+    """
+    periodsPerChunk = max(1, DATAPOINTS_PER_CHUNK // max(1, queryCount))
+    chunkSeconds = periodsPerChunk * period
+
+    chunks = []
+    chunkStart = startTime
+    while chunkStart < endTime:
+        epoch = int(chunkStart.timestamp())
+        boundary = (epoch // period) * period + chunkSeconds
+        chunkEnd = min(endTime, datetime.datetime.fromtimestamp(boundary, tz=startTime.tzinfo))
+        chunks.append((chunkStart, chunkEnd))
+        chunkStart = chunkEnd
+    return chunks
+
+
+def plan_segment_chunks(segments, queryCount):
+    """
+    Chunk each (segmentStart, segmentEnd, period) segment at its own period.
+    Returns (chunkStart, chunkEnd, period) chunks in time order.
+    """
+    return [
+        (chunkStart, chunkEnd, period)
+        for segmentStart, segmentEnd, period in segments
+        for chunkStart, chunkEnd in plan_chunks(segmentStart, segmentEnd, queryCount, period)
+    ]
+
+
+def with_period(queries, period):
+    """Copy of queries asking for a different period; the Ids stay the same"""
+    return [
+        dict(query, MetricStat=dict(query['MetricStat'], Period=period)) if query['MetricStat']['Period'] != period else query
+        for query in queries
+    ]
+
+
+def fetch_chunks(client, pool, queries, chunks):
+    """
+    Yield (chunkStart, chunkEnd, results) for each chunk in time order, where
+    results maps query Id to that chunk's Series. Chunks given as
+    (chunkStart, chunkEnd, period) are fetched at that period.
+
+    Every batch of a chunk is fetched concurrently on the pool, and up to
+    PREFETCH_CHUNKS chunks are in flight while the caller consumes the current one.
+    """
+    batchesByPeriod = {None: list(batch_queries(queries))}
+    pending = deque()
+    remaining = iter(chunks)
+
+    def submit_next():
+        chunk = next(remaining, None)
+        if chunk is None:
+            return False
+        period = chunk[2] if len(chunk) > 2 else None
+        if period not in batchesByPeriod:
+            batchesByPeriod[period] = list(batch_queries(with_period(queries, period)))
+        futures = [pool.submit(fetch_batch, client, batch, chunk[0], chunk[1], pool.call) for batch in batchesByPeriod[period]]
+        pending.append((chunk, futures))
+        return True
+
+    while len(pending) < PREFETCH_CHUNKS and submit_next():
+        pass
+
+    while pending:
+        chunk, futures = pending.popleft()
+        chunkStart, chunkEnd = chunk[0], chunk[1]
+        submit_next()
+        results = {}
+        for future in futures:
+            results.update(future.result())
+        yield chunkStart, chunkEnd, results
@@ -0,0 +1,112 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import datetime
+import logging
+
+from lazy_client import error_code
+from s3_writer import MIN_PART_SIZE
+
+logger = logging.getLogger()
+
+# Every archive object records, as user metadata, the end of the window it covers
+ARCHIVED_THROUGH_METADATA = 'archived-through'
+# and the periods its rows were fetched at (see periods.format_periods)
+PERIODS_METADATA = 'periods'
+# and the periods of the rollups written next to it (see rollups.py)
+ROLLUPS_METADATA = 'rollups'
+HEADER_READ_SIZE = 64 * 1024
+TAIL_READ_SIZE = 64 * 1024
+
+
+def format_time(value):
+    return value.astimezone(datetime.timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def parse_time(value):
+    return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def archive_metadata(windowEndTime, periods=None, rollups=None):
+    metadata = {ARCHIVED_THROUGH_METADATA: format_time(windowEndTime)}
+    if periods:
+        metadata[PERIODS_METADATA] = periods
+    if rollups:
+        metadata[ROLLUPS_METADATA] = ','.join(str(period) for period in rollups)
+    return metadata
+
+
+def read_header(s3, bucket, key, size):
+    """Read the CSV header line, growing the ranged read until it holds a newline"""
+    readSize = HEADER_READ_SIZE
+    while True:
+        data = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{readSize - 1}")['Body'].read()
+        if b'\n' in data:
+            return data.split(b'\n', 1)[0].decode('utf-8')
+        if readSize >= size:
+            return data.decode('utf-8')
+        readSize *= 4
+
+
+def read_last_timestamp(s3, bucket, key):
+    """Timestamp of the last row, or None when the object only holds a header"""
+    data = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes=-{TAIL_READ_SIZE}")['Body'].read()
+    lines = data.rstrip(b'\n').split(b'\n')
+    if len(lines) < 2:
+        return None
+    try:
+        return parse_time(lines[-1].split(b',', 1)[0].decode('utf-8'))
+    except ValueError:
+        return None
+
+
+def archived_state(s3, bucket, key):
+    """
+    Describe what is already archived at key: its header, size and ETag, and the
+    time it is archived through. Returns None when there is no object yet.
+
+    Objects written before the archived-through metadata existed fall back to the
+    timestamp of their last row.
+    """
+    try:
+        head = s3.head_object(Bucket=bucket, Key=key)
+    except Exception as e:
+        if error_code(e) in ('NoSuchKey', '404', 'NotFound'):
+            return None
+        raise
+
+    size = head['ContentLength']
+    state = {
+        'size': size,
+        'etag': head['ETag'],
+        'header': read_header(s3, bucket, key, size),
+        'archivedThrough': None,
+        'periods': head.get('Metadata', {}).get(PERIODS_METADATA),
+        'rollups': head.get('Metadata', {}).get(ROLLUPS_METADATA)
+    }
+
+    archivedThrough = head.get('Metadata', {}).get(ARCHIVED_THROUGH_METADATA)
+    if archivedThrough is not None:
+        state['archivedThrough'] = parse_time(archivedThrough)
+    else:
+        lastTimestamp = read_last_timestamp(s3, bucket, key)
+        if lastTimestamp is not None:
+            state['archivedThrough'] = lastTimestamp + datetime.timedelta(seconds=1)
+    return state
+
+
+def carry_over(s3, writer, bucket, key, existing):
+    """
+    Start writer with the first existing['size'] bytes of the object at key, all of
+    it for an archive described by archived_state. Objects big enough to be a
+    multipart part are copied server side; smaller ones are read and re-uploaded.
+    """
+    if existing['size'] >= MIN_PART_SIZE:
+        writer.copy_object(key, existing['size'], existing['etag'])
+        return
+    if existing['size'] <= 0:
+        return
+    body = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{existing['size'] - 1}", IfMatch=existing['etag'])['Body'].read()
+    if body and not body.endswith(b'\n'):
+        body += b'\n'
+    writer.write_bytes(body)
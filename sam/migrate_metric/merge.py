@@ -0,0 +1,97 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import heapq
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from itertools import repeat
+from operator import itemgetter
+
+import stage_metrics
+
+
+class Series:
+    """
+    One (metric, stat) series held as parallel arrays of epoch seconds and
+    float values, sorted by timestamp.
+    """
+    __slots__ = ('timestamps', 'values')
+
+    def __init__(self):
+        self.timestamps = array('q')
+        self.values = array('d')
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def extend(self, timestamps, values):
+        """Append datapoints as returned by GetMetricData (datetimes and floats)"""
+        self.timestamps.extend([int(timestamp.timestamp()) for timestamp in timestamps])
+        self.values.extend(values)
+
+    def window(self, startEpoch, endEpoch):
+        """Slice of the series with startEpoch <= timestamp < endEpoch"""
+        lo = bisect_left(self.timestamps, startEpoch)
+        hi = bisect_left(self.timestamps, endEpoch, lo)
+        return self.timestamps[lo:hi], self.values[lo:hi]
+
+
+def merge_series(seriesList, startEpoch, endEpoch):
+    """
+    Outer-join sorted series on timestamp over [startEpoch, endEpoch).
+
+    Yields (timestamp, values) with one entry per series in seriesList order,
+    None where a series has no datapoint at that timestamp.
+    """
+    windows = [series.window(startEpoch, endEpoch) for series in seriesList]
+    if not windows:
+        return
+
+    # Common case: every stat of every metric reported at the same timestamps,
+    # so the columns can be zipped without a merge
+    firstTimestamps = windows[0][0]
+    if all(timestamps == firstTimestamps for timestamps, _ in windows[1:]):
+        for timestamp, *values in zip(firstTimestamps, *[values for _, values in windows]):
+            yield timestamp, values
+        return
+
+    merged = heapq.merge(
+        *[zip(timestamps, values, repeat(column)) for column, (timestamps, values) in enumerate(windows)],
+        key=itemgetter(0)
+    )
+    width = len(windows)
+    currentTimestamp = None
+    row = None
+    for timestamp, value, column in merged:
+        if timestamp != currentTimestamp:
+            if row is not None:
+                yield currentTimestamp, row
+            currentTimestamp = timestamp
+            row = [None] * width
+        row[column] = value
+    if row is not None:
+        yield currentTimestamp, row
+
+
+def format_timestamp(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat()
+
+
+def format_rows(seriesList, startEpoch, endEpoch, onRow=None):
+    """
+    Render the merged rows for [startEpoch, endEpoch) as CSV text, leaving gaps as
+    empty cells. onRow, when given, is also called with each (timestamp, values).
+    """
+    with stage_metrics.stage('Merge'):
+        rows = list(merge_series(seriesList, startEpoch, endEpoch))
+    if onRow is not None:
+        for timestamp, values in rows:
+            onRow(timestamp, values)
+    with stage_metrics.stage('CsvWrite'):
+        text = ''.join([
+            format_timestamp(timestamp) + ',' + ','.join(['' if value is None else str(value) for value in values]) + '\n'
+            for timestamp, values in rows
+        ])
+    stage_metrics.count('Rows', len(rows))
+    return text
@@ -0,0 +1,145 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import datetime
+import json
+import logging
+
+from incremental import format_time, parse_time
+from lazy_client import error_code
+from merge import format_rows
+
+logger = logging.getLogger()
+
+# Partitioned archives keep one CSV per day or hour under the destination key, plus an
+# index listing every partition so readers only fetch the ones their window overlaps:
+#   <destinationKey>/_index.json
+#   <destinationKey>/2024-01-01.csv (day) or <destinationKey>/2024-01-01T05.csv (hour)
+PARTITION_SECONDS = {'day': 86400, 'hour': 3600}
+PARTITION_NAME_FORMATS = {'day': '%Y-%m-%d', 'hour': '%Y-%m-%dT%H'}
+INDEX_NAME = '_index.json'
+INDEX_VERSION = 1
+
+
+def partition_prefix(destinationKey):
+    return destinationKey.rstrip('/') + '/'
+
+
+def index_key(destinationKey):
+    return partition_prefix(destinationKey) + INDEX_NAME
+
+
+def partition_key(destinationKey, partitionStartEpoch, partitionBy):
+    partitionStart = datetime.datetime.fromtimestamp(partitionStartEpoch, tz=datetime.timezone.utc)
+    return partition_prefix(destinationKey) + partitionStart.strftime(PARTITION_NAME_FORMATS[partitionBy]) + '.csv'
+
+
+def partition_start(epoch, partitionBy):
+    seconds = PARTITION_SECONDS[partitionBy]
+    return (epoch // seconds) * seconds
+
+
+def partitioned_state(s3, bucket, destinationKey):
+    """
+    Describe the partitioned archive at destinationKey from its index, in the shape
+    of incremental.archived_state. Returns None when there is no index yet.
+    """
+    try:
+        response = s3.get_object(Bucket=bucket, Key=index_key(destinationKey))
+    except Exception as e:
+        if error_code(e) in ('NoSuchKey', '404'):
+            return None
+        raise
+    index = json.loads(response['Body'].read())
+    return {
+        'header': index['header'],
+        'partitionBy': index['partitionBy'],
+        'archivedThrough': parse_time(index['archivedThrough']) if index.get('archivedThrough') else None,
+        'periods': index.get('periods'),
+        'partitions': index['partitions']
+    }
+
+
+class PartitionWriter:
+    """
+    Route merged rows into time partitions and upload each partition once all of
+    its rows are in. Chunks arrive in time order, so only one partition is held in
+    memory at a time. close() writes the index.
+
+    existing (see partitioned_state) keeps the partitions already archived; the one
+    holding existing['archivedThrough'] is reopened so new rows are appended to it.
+    """
+
+    def __init__(self, s3, bucket, destinationKey, partitionBy, header, existing=None):
+        self.s3 = s3
+        self.bucket = bucket
+        self.destinationKey = destinationKey
+        self.partitionBy = partitionBy
+        self.header = header
+        self.partitions = {}
+        self.bytesWritten = 0
+        self.currentStart = None
+        self.currentRows = []
+
+        if existing is not None:
+            self.partitions = {int(parse_time(entry['start']).timestamp()): entry for entry in existing['partitions']}
+            if existing['archivedThrough'] is not None:
+                self._reopen(partition_start(int(existing['archivedThrough'].timestamp()), partitionBy))
+
+    def _reopen(self, startEpoch):
+        entry = self.partitions.pop(startEpoch, None)
+        if entry is None:
+            return
+        body = self.s3.get_object(Bucket=self.bucket, Key=entry['key'])['Body'].read().decode('utf-8')
+        rows = body.split('\n', 1)[1] if '\n' in body else ''
+        self.currentStart = startEpoch
+        self.currentRows = [rows] if rows else []
+
+    def write_rows(self, seriesList, startEpoch, endEpoch):
+        """Render the rows for [startEpoch, endEpoch) into the partitions that range covers"""
+        seconds = PARTITION_SECONDS[self.partitionBy]
+        rangeStart = startEpoch
+        while rangeStart < endEpoch:
+            partitionStartEpoch = partition_start(rangeStart, self.partitionBy)
+            rangeEnd = min(endEpoch, partitionStartEpoch + seconds)
+            if partitionStartEpoch != self.currentStart:
+                self._flush()
+                self.currentStart = partitionStartEpoch
+            rows = format_rows(seriesList, rangeStart, rangeEnd)
+            if rows:
+                self.currentRows.append(rows)
+            rangeStart = rangeEnd
+
+    def _flush(self):
+        if self.currentStart is None or not self.currentRows:
+            self.currentStart, self.currentRows = None, []
+            return
+        rows = ''.join(self.currentRows)
+        body = (self.header + '\n' + rows).encode('utf-8')
+        key = partition_key(self.destinationKey, self.currentStart, self.partitionBy)
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType='text/csv')
+        self.partitions[self.currentStart] = {
+            'key': key,
+            'start': format_time(datetime.datetime.fromtimestamp(self.currentStart, tz=datetime.timezone.utc)),
+            'end': format_time(datetime.datetime.fromtimestamp(self.currentStart + PARTITION_SECONDS[self.partitionBy], tz=datetime.timezone.utc)),
+            'rows': rows.count('\n'),
+            'bytes': len(body)
+        }
+        self.bytesWritten += len(body)
+        self.currentStart, self.currentRows = None, []
+
+    def close(self, windowEndTime, periods=None):
+        """Upload the last partition and the index; returns the index"""
+        self._flush()
+        index = {
+            'version': INDEX_VERSION,
+            'partitionBy': self.partitionBy,
+            'header': self.header,
+            'archivedThrough': format_time(windowEndTime),
+            'periods': periods,
+            'partitions': [self.partitions[start] for start in sorted(self.partitions)]
+        }
+        self.s3.put_object(Bucket=self.bucket, Key=index_key(self.destinationKey), Body=json.dumps(index).encode('utf-8'),
+                           ContentType='application/json')
+        logger.info(f"Wrote the index of {len(index['partitions'])} partitions to s3://{self.bucket}/{index_key(self.destinationKey)}")
+        return index
@@ -0,0 +1,69 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import datetime
+
+from job_rules import AUTO_PERIOD
+
+# CloudWatch retention: how long data stays available at each period, finest first
+RETENTION_TIERS = [
+    (datetime.timedelta(days=15), 60),
+    (datetime.timedelta(days=63), 300),
+    (datetime.timedelta(days=455), 3600),
+]
+# Tier cutoffs are moved this much towards the present so data that ages out
+# while a job runs is still fetched at a period CloudWatch holds
+TIER_MARGIN = datetime.timedelta(hours=1)
+
+
+def plan_periods(startTime, endTime, period, now=None):
+    """
+    Split [startTime, endTime) into (segmentStart, segmentEnd, period) segments,
+    oldest first. A fixed period gives a single segment. In auto mode each part of
+    the window gets the finest period CloudWatch still retains for data of that age.
+    """
+    if period != AUTO_PERIOD:
+        return [(startTime, endTime, period)]
+
+    if now is None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+
+    # Walk from the coarsest tier to the finest; each tier's data starts where the
+    # next finer tier's retention ends, aligned up to the coarser period
+    segments = []
+    segmentStart = startTime
+    tiers = list(reversed(RETENTION_TIERS))
+    for index, (_, tierPeriod) in enumerate(tiers):
+        if index + 1 < len(tiers):
+            finerRetention = tiers[index + 1][0]
+            cutoffEpoch = (now - finerRetention + TIER_MARGIN).timestamp()
+            cutoffEpoch = -(-int(cutoffEpoch) // tierPeriod) * tierPeriod
+            segmentEnd = min(endTime, datetime.datetime.fromtimestamp(cutoffEpoch, tz=startTime.tzinfo))
+        else:
+            segmentEnd = endTime
+        if segmentEnd > segmentStart:
+            segments.append((segmentStart, segmentEnd, tierPeriod))
+            segmentStart = segmentEnd
+    if not segments:
+        segments.append((startTime, endTime, RETENTION_TIERS[0][1]))
+    return segments
+
+
+def format_periods(segments):
+    """Describe the periods used as '<segment start>=<period>' entries separated by ';'"""
+    return merge_periods(';'.join(
+        f"{segmentStart.astimezone(datetime.timezone.utc).isoformat().replace('+00:00', 'Z')}={period}"
+        for segmentStart, _, period in segments
+    ))
+
+
+def merge_periods(*descriptions):
+    """Join period descriptions of consecutive windows, dropping entries that repeat the previous period"""
+    entries = []
+    for description in descriptions:
+        for entry in filter(None, (description or '').split(';')):
+            start, _, period = entry.partition('=')
+            if entries and entries[-1][1] == period:
+                continue
+            entries.append((start, period))
+    return ';'.join(f"{start}={period}" for start, period in entries)
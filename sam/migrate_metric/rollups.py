@@ -0,0 +1,313 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import datetime
+import logging
+
+from binary_writer import BinaryArchiveWriter
+from incremental import ROLLUPS_METADATA, TAIL_READ_SIZE, carry_over
+from lazy_client import error_code
+from merge import format_timestamp
+from s3_writer import MultipartUploadWriter
+
+logger = logging.getLogger()
+
+# Rollups hold the archive's columns at coarser periods, next to the archive:
+#   <destinationKey>.rollups/300, <destinationKey>.rollups/3600, ...
+# in the same format as the archive. The archive lists them in its user metadata (see
+# incremental.ROLLUPS_METADATA) so that the timeshift connector can pick the coarsest
+# one a query can use.
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def rollup_key(key, period):
+    return f"{key}.rollups/{period}"
+
+
+def column_stat(column):
+    """Columns are named <destinationMetricName>-<Stat>"""
+    return column.rsplit('-', 1)[-1]
+
+
+def average_weights(columns):
+    """
+    {index of each Average column: index of the SampleCount column weighting it}.
+    An archive holds one group of stat columns per metric, each in the same order,
+    and the names repeat from group to group, so an Average is weighted by the
+    SampleCount in its own group: the run of columns before a name comes up again.
+    """
+    weights = {}
+    group = {}
+    averages = []
+
+    def close_group():
+        for index, prefix in averages:
+            if prefix + 'SampleCount' not in group:
+                raise ValueError(f"No {prefix}SampleCount column to weight {columns[index]}")
+            weights[index] = group[prefix + 'SampleCount']
+
+    for index, column in enumerate(columns):
+        if column in group:
+            close_group()
+            group, averages = {}, []
+        group[column] = index
+        stat = column_stat(column)
+        if stat == 'Average':
+            averages.append((index, column[:-len(stat)]))
+    close_group()
+    return weights
+
+
+class RollupLevel:
+    """The bucket of one rollup period being filled, combining each column by its stat"""
+
+    def __init__(self, period, stats, weights):
+        self.period = period
+        self.stats = stats
+        # Column holding the SampleCount that weights each Average column
+        self.weights = weights
+        self.bucket = None
+        self.totals = None
+
+    def add(self, timestamp, values):
+        """Add a row that falls in the current bucket, or starts one when there is none"""
+        if self.bucket is None:
+            self.bucket = timestamp - timestamp % self.period
+            self.totals = [None] * len(values)
+        totals = self.totals
+        for column, value in enumerate(values):
+            if value is None:
+                continue
+            stat = self.stats[column]
+            current = totals[column]
+            if stat == 'Average':
+                weight = values[self.weights[column]]
+                if weight:
+                    totals[column] = (value * weight, weight) if current is None else (current[0] + value * weight, current[1] + weight)
+            elif current is None:
+                totals[column] = value
+            elif stat == 'Minimum':
+                totals[column] = min(current, value)
+            elif stat == 'Maximum':
+                totals[column] = max(current, value)
+            else:
+                totals[column] = current + value
+
+    def flush(self):
+        """(bucket start, combined row) of the current bucket, which is then closed"""
+        row = [total[0] / total[1] if isinstance(total, tuple) else total for total in self.totals]
+        bucket = self.bucket
+        self.bucket, self.totals = None, None
+        return bucket, row
+
+
+class RollupWriter:
+    """
+    Build the rollups of an archive from its rows, which must arrive in time order,
+    and stream each level to its own object. Coarser levels are built from the rows
+    of the next finer level rather than from the archive rows.
+
+    Use as a context manager: every rollup is completed on a clean exit and
+    aborted if the block raises.
+
+    carryOver, one {'size', 'etag'} per period, starts each CSV rollup with the first
+    size bytes of the rollup already at its key instead of a header (see extend_rollups).
+    """
+
+    def __init__(self, s3, bucket, key, columns, periods, binary=False, carryOver=None):
+        self.columns = columns
+        self.periods = periods
+        self.binary = binary
+        stats = [column_stat(column) for column in columns]
+        weights = average_weights(columns)
+        self.writers = [
+            MultipartUploadWriter(s3, bucket, rollup_key(key, period), contentType='application/octet-stream' if binary else 'text/csv')
+            for period in periods
+        ]
+        self.encoders = [BinaryArchiveWriter(writer, columns) if binary else None for writer in self.writers]
+        self.levels = [RollupLevel(period, stats, weights) for period in periods]
+        if carryOver is not None:
+            for writer, period, existing in zip(self.writers, periods, carryOver):
+                carry_over(s3, writer, bucket, rollup_key(key, period), existing)
+        elif not binary:
+            header = ','.join(['timestamp'] + columns) + '\n'
+            for writer in self.writers:
+                writer.write(header)
+        self.rows = [0] * len(periods)
+
+    def add_row(self, timestamp, values):
+        self._add(0, timestamp, values)
+
+    def _add(self, depth, timestamp, values):
+        level = self.levels[depth]
+        if level.bucket is not None and timestamp - timestamp % level.period != level.bucket:
+            self._emit(depth, *level.flush())
+        level.add(timestamp, values)
+
+    def _emit(self, depth, timestamp, row):
+        self.rows[depth] += 1
+        if self.binary:
+            self.encoders[depth].append(timestamp, row)
+        else:
+            self.writers[depth].write(format_timestamp(timestamp) + ',' + ','.join(['' if value is None else str(value) for value in row]) + '\n')
+        if depth + 1 < len(self.levels):
+            self._add(depth + 1, timestamp, row)
+
+    def close(self):
+        # Finer levels first, so that their last rows reach the coarser ones before those close
+        for depth, level in enumerate(self.levels):
+            if level.bucket is not None:
+                self._emit(depth, *level.flush())
+        for encoder, writer in zip(self.encoders, self.writers):
+            if encoder is not None:
+                encoder.close()
+            writer.close()
+        logger.info(f"Wrote {self.rows} rollup rows at periods {self.periods}")
+
+    def abort(self):
+        for writer in self.writers:
+            writer.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is not None:
+            self.abort()
+            return False
+        try:
+            self.close()
+        except Exception:
+            self.abort()
+            raise
+        return False
+
+
+def parse_row(line):
+    """(epoch seconds, values) of a CSV archive row"""
+    fields = line.decode('utf-8').rstrip('\r').split(',')
+    return int(datetime.datetime.fromisoformat(fields[0]).timestamp()), [float(field) if field else None for field in fields[1:]]
+
+
+def read_rows_since(s3, bucket, key, size, etag, sinceEpoch):
+    """
+    The rows of the CSV object at key stamped sinceEpoch or later, found by reading
+    ever larger tails of it until they reach an earlier row or the header. Returns
+    (offset, rows): the byte offset of the first of those rows, or size when there
+    are none, and the rows as (timestamp, values).
+    """
+    readSize = TAIL_READ_SIZE
+    while True:
+        first = max(0, size - readSize)
+        data = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={first}-{size - 1}", IfMatch=etag)['Body'].read()
+        newline = data.find(b'\n')
+        if newline < 0:
+            if first == 0:
+                return size, []
+            readSize *= 4
+            continue
+        # Skip the header, or the line the range starts in the middle of
+        position = first + newline + 1
+        reachedEarlier = first == 0
+        offset = None
+        rows = []
+        for line in data[position - first:].split(b'\n'):
+            lineStart = position
+            position += len(line) + 1
+            if not line.strip():
+                continue
+            timestamp, values = parse_row(line)
+            if timestamp < sinceEpoch:
+                reachedEarlier = True
+                continue
+            if offset is None:
+                offset = lineStart
+            rows.append((timestamp, values))
+        if reachedEarlier:
+            return (offset if offset is not None else size), rows
+        readSize *= 4
+
+
+def extend_rollups(s3, bucket, key, columns, periods, existing):
+    """
+    A RollupWriter carrying on the CSV rollups of the archive described by existing
+    (see incremental.archived_state) for rows appended after its archived-through
+    time, without reading the whole archive again. Each rollup keeps its rows up to
+    the last bucket of the coarsest period that the archive ends in; the archive's
+    own rows from that bucket on are fed to the writer again before it is returned.
+
+    Returns None when the archive has no rollups at these periods to extend.
+    """
+    if existing.get('rollups') != ','.join(str(period) for period in periods) or existing.get('archivedThrough') is None:
+        return None
+    archivedThrough = int(existing['archivedThrough'].timestamp())
+    resumeFrom = archivedThrough - archivedThrough % periods[-1]
+
+    carryOver = []
+    for period in periods:
+        try:
+            head = s3.head_object(Bucket=bucket, Key=rollup_key(key, period))
+        except Exception as e:
+            if error_code(e) in ('NoSuchKey', '404', 'NotFound'):
+                return None
+            raise
+        offset, _ = read_rows_since(s3, bucket, rollup_key(key, period), head['ContentLength'], head['ETag'], resumeFrom)
+        carryOver.append({'size': offset, 'etag': head['ETag']})
+    _, rows = read_rows_since(s3, bucket, key, existing['size'], existing['etag'], resumeFrom)
+
+    writer = RollupWriter(s3, bucket, key, columns, periods, carryOver=carryOver)
+    try:
+        for timestamp, values in rows:
+            writer.add_row(timestamp, values)
+    except Exception:
+        writer.abort()
+        raise
+    logger.info(f"Extending the rollups of s3://{bucket}/{key} from {format_timestamp(resumeFrom)}")
+    return writer
+
+
+def build_rollups(s3, bucket, key, periods):
+    """
+    Rebuild the rollups of the CSV archive at key by streaming it once. Used when
+    the archive was not written in one pass that could feed a RollupWriter: once
+    slices are assembled, or when a migration resumed from a checkpoint.
+    """
+    body = s3.get_object(Bucket=bucket, Key=key)['Body']
+    try:
+        lines = body.iter_lines(chunk_size=READ_CHUNK_SIZE)
+        header = next(lines, b'').decode('utf-8').split(',')
+        with RollupWriter(s3, bucket, key, header[1:], periods) as writer:
+            for line in lines:
+                if not line:
+                    continue
+                writer.add_row(*parse_row(line))
+    finally:
+        body.close()
+
+
+def rebuild_missing_rollups(s3, bucket, key):
+    """
+    Build the rollups listed in the metadata of the archive at key again when any
+    of them is missing. Once slices are assembled, or after a migration resumed,
+    the archive lists its rollups before they are built; a redelivered message that
+    finds the archive complete finishes the job when the first attempt failed in between.
+    """
+    try:
+        head = s3.head_object(Bucket=bucket, Key=key)
+    except Exception as e:
+        if error_code(e) in ('NoSuchKey', '404', 'NotFound'):
+            return
+        raise
+    listed = head.get('Metadata', {}).get(ROLLUPS_METADATA)
+    if not listed:
+        return
+    periods = [int(period) for period in listed.split(',')]
+    for period in periods:
+        try:
+            s3.head_object(Bucket=bucket, Key=rollup_key(key, period))
+        except Exception as e:
+            if error_code(e) not in ('NoSuchKey', '404', 'NotFound'):
+                raise
+            logger.info(f"Rollup {rollup_key(key, period)} of s3://{bucket}/{key} is missing, building the rollups again")
+            build_rollups(s3, bucket, key, periods)
+            return
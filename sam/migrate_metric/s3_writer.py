@@ -0,0 +1,243 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import stage_metrics
+
+logger = logging.getLogger()
+
+# S3 requires every part except the last to be at least 5 MiB
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+MAX_PENDING_PARTS = 2
+# UploadPartCopy copies at most 5 GiB per part
+MAX_COPY_PART_SIZE = 5 * 1024 * 1024 * 1024
+
+
+class MultipartUploadWriter:
+    """
+    Streams text to an S3 object. Once a part's worth of data is buffered it is
+    shipped with UploadPart from a background thread while the caller keeps
+    producing rows, so memory stays bounded by a few parts regardless of the
+    object size. Objects smaller than one part are written with a single PutObject.
+
+    Use as a context manager: the upload is completed on a clean exit and aborted
+    if the block raises.
+
+    For resumable writes, pass a position with each write (any JSON value marking
+    how far the data written so far goes) and an onCheckpoint callback. Parts are
+    only cut between writes, and once every part up to and including a position
+    is uploaded the callback receives a state dict that can be handed back as
+    resume= to carry on with the same multipart upload later. With
+    abortOnError=False a failure leaves the upload open for that later attempt.
+
+    metadata, if given, is stored as the object's user metadata.
+    """
+
+    def __init__(self, client, bucket, key, partSize=DEFAULT_PART_SIZE, contentType='text/csv',
+                 resume=None, onCheckpoint=None, abortOnError=True, metadata=None):
+        if partSize < MIN_PART_SIZE:
+            raise ValueError(f"partSize must be at least {MIN_PART_SIZE} bytes")
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.partSize = partSize
+        self.contentType = contentType
+        self.onCheckpoint = onCheckpoint
+        self.abortOnError = abortOnError
+        self.metadata = metadata
+        self.bytesWritten = 0
+        self.uploadId = None
+        self.parts = []
+        self._uploadedBytes = 0
+        self._position = None
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._executor = None
+        if resume is not None:
+            self.uploadId = resume['uploadId']
+            self.parts = [dict(part) for part in resume['parts']]
+            self.bytesWritten = self._uploadedBytes = resume['bytesWritten']
+            logger.info(f"Resuming multipart upload to s3://{self.bucket}/{self.key} after {len(self.parts)} parts")
+
+    def write(self, text, position=None):
+        self.write_bytes(text.encode('utf-8'), position)
+
+    def write_bytes(self, data, position=None):
+        self._buffer += data
+        self.bytesWritten += len(data)
+        self._position = position
+        # Record parts that have finished in the background so checkpoints keep up
+        while self._pending and self._pending[0][0].done():
+            self._collect(self._pending.popleft())
+        if len(self._buffer) >= self.partSize:
+            self._ship_part()
+
+    @property
+    def bufferedBytes(self):
+        """Bytes written but not yet shipped in a part"""
+        return len(self._buffer)
+
+    def copy_object(self, sourceKey, size, sourceETag=None):
+        """
+        Start the object with the contents of another object in the same bucket,
+        copied server side with UploadPartCopy instead of being downloaded. Must
+        come before any other data, and the source must be at least MIN_PART_SIZE.
+        """
+        if self.bytesWritten or self.parts:
+            raise ValueError("copy_object must be called before anything else is written")
+        self.copy_range(sourceKey, 0, size, sourceETag)
+
+    def copy_range(self, sourceKey, start, end, sourceETag=None):
+        """
+        Append bytes [start, end) of another object in the same bucket, copied server
+        side with UploadPartCopy. Data buffered so far is shipped first as a part of
+        its own, so it must be empty or at least MIN_PART_SIZE, as must the range.
+        """
+        size = end - start
+        if size < MIN_PART_SIZE:
+            raise ValueError(f"Only ranges of at least {MIN_PART_SIZE} bytes can be copied as parts")
+        if 0 < len(self._buffer) < MIN_PART_SIZE:
+            raise ValueError(f"Only {len(self._buffer)} bytes are buffered; a part needs at least {MIN_PART_SIZE}")
+        self._start_upload()
+        if self._buffer:
+            self._ship_part()
+        # Copied parts are numbered after every part already shipped
+        while self._pending:
+            self._collect(self._pending.popleft())
+
+        # Split evenly so that no copied part falls under the minimum part size
+        partCount = -(-size // MAX_COPY_PART_SIZE)
+        copyPartSize = -(-size // partCount)
+        condition = {'CopySourceIfMatch': sourceETag} if sourceETag is not None else {}
+        for offset in range(start, end, copyPartSize):
+            partNumber = len(self.parts) + 1
+            response = self.client.upload_part_copy(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.uploadId,
+                PartNumber=partNumber,
+                CopySource={'Bucket': self.bucket, 'Key': sourceKey},
+                CopySourceRange=f"bytes={offset}-{min(end, offset + copyPartSize) - 1}",
+                **condition
+            )
+            self.parts.append({'PartNumber': partNumber, 'ETag': response['CopyPartResult']['ETag']})
+        self.bytesWritten += size
+        self._uploadedBytes += size
+
+    def _start_upload(self):
+        if self.uploadId is not None:
+            return
+        response = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key, ContentType=self.contentType,
+                                                       **self._metadata_args())
+        self.uploadId = response['UploadId']
+        logger.info(f"Started multipart upload to s3://{self.bucket}/{self.key}")
+
+    def _metadata_args(self):
+        return {'Metadata': self.metadata} if self.metadata is not None else {}
+
+    def _ship_part(self):
+        self._start_upload()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=MAX_PENDING_PARTS, thread_name_prefix='s3-upload')
+
+        # Bound the number of parts held in memory while they upload
+        while len(self._pending) >= MAX_PENDING_PARTS:
+            self._collect(self._pending.popleft())
+
+        partNumber = len(self.parts) + len(self._pending) + 1
+        body = bytes(self._buffer)
+        self._buffer.clear()
+        future = self._executor.submit(self._upload_part, partNumber, body)
+        self._pending.append((future, len(body), self._position))
+
+    def _upload_part(self, partNumber, body):
+        with stage_metrics.stage('S3Upload'):
+            response = self.client.upload_part(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.uploadId,
+                PartNumber=partNumber,
+                Body=body
+            )
+        stage_metrics.count('S3UploadBytes', len(body))
+        return {'PartNumber': partNumber, 'ETag': response['ETag']}
+
+    def _collect(self, pending):
+        future, size, position = pending
+        self.parts.append(future.result())
+        self._uploadedBytes += size
+        if position is not None and self.onCheckpoint is not None:
+            self.onCheckpoint({
+                'uploadId': self.uploadId,
+                'parts': list(self.parts),
+                'bytesWritten': self._uploadedBytes,
+                'position': position
+            })
+
+    def close(self):
+        if self.uploadId is None:
+            with stage_metrics.stage('S3Upload'):
+                self.client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer), ContentType=self.contentType,
+                                       **self._metadata_args())
+            stage_metrics.count('S3UploadBytes', len(self._buffer))
+            self._buffer.clear()
+            return
+
+        if self._buffer:
+            self._ship_part()
+        while self._pending:
+            self._collect(self._pending.popleft())
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.uploadId,
+            MultipartUpload={'Parts': sorted(self.parts, key=lambda part: part['PartNumber'])}
+        )
+        logger.info(f"Completed multipart upload of {len(self.parts)} parts to s3://{self.bucket}/{self.key}")
+
+    def suspend(self):
+        """Wait for parts already in flight and leave the upload open so it can be resumed"""
+        try:
+            while self._pending:
+                self._collect(self._pending.popleft())
+        except Exception as e:
+            logger.warning(f"Part upload to s3://{self.bucket}/{self.key} failed while suspending: {str(e)}")
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+        if self.uploadId is not None:
+            logger.info(f"Left multipart upload to s3://{self.bucket}/{self.key} open after {len(self.parts)} parts")
+
+    def abort(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        if self.uploadId is not None:
+            logger.warning(f"Aborting multipart upload to s3://{self.bucket}/{self.key}")
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.uploadId)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is not None:
+            self._fail()
+            return False
+        try:
+            self.close()
+        except Exception:
+            self._fail()
+            raise
+        return False
+
+    def _fail(self):
+        if self.abortOnError:
+            self.abort()
+        else:
+            self.suspend()
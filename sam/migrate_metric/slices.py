@@ -0,0 +1,222 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import datetime
+import json
+import logging
+
+from incremental import archive_metadata, parse_time
+from lazy_client import error_code
+from periods import merge_periods
+from s3_writer import MIN_PART_SIZE, MultipartUploadWriter
+
+logger = logging.getLogger()
+
+MAX_MANIFEST_UPDATE_ATTEMPTS = 20
+CONDITIONAL_WRITE_ERROR_CODES = {'PreconditionFailed', 'ConditionalRequestConflict'}
+DELETE_OBJECTS_BATCH_SIZE = 1000
+ASSEMBLY_CHUNK_SIZE = 1024 * 1024
+# Read with each slice's header, which holds the column names of every archived series
+HEADER_READ_SIZE = 64 * 1024
+# The worker's Timeout in template.yaml: an assembly claimed longer ago than this
+# belongs to an invocation that is no longer running, and can be taken over
+ASSEMBLY_CLAIM_SECONDS = 300
+
+# Sliced jobs keep their intermediate objects next to the destination key:
+#   <destinationKey>.slices/<jobId>/manifest.json
+#   <destinationKey>.slices/<jobId>/00000.csv, 00001.csv, ...
+
+
+def slice_prefix(destinationKey, jobId):
+    return f"{destinationKey}.slices/{jobId}/"
+
+
+def slice_key(destinationKey, jobId, index):
+    return f"{slice_prefix(destinationKey, jobId)}{index:05d}.csv"
+
+
+def manifest_key(destinationKey, jobId):
+    return f"{slice_prefix(destinationKey, jobId)}manifest.json"
+
+
+def load_manifest(s3, bucket, destinationKey, jobId):
+    """Return (manifest, etag), or (None, None) when no slice has been recorded yet"""
+    try:
+        response = s3.get_object(Bucket=bucket, Key=manifest_key(destinationKey, jobId))
+    except Exception as e:
+        if error_code(e) in ('NoSuchKey', '404'):
+            return None, None
+        raise
+    return json.loads(response['Body'].read()), response['ETag']
+
+
+def record_slice(s3, bucket, destinationKey, sliceInfo, entry):
+    """
+    Add a finished slice to the job manifest and return the updated manifest.
+
+    Slices of one job finish concurrently in separate invocations, so the manifest
+    is updated with S3 conditional writes and the read-modify-write is retried
+    whenever another slice got there first.
+    """
+    jobId = sliceInfo['jobId']
+    key = manifest_key(destinationKey, jobId)
+    for attempt in range(MAX_MANIFEST_UPDATE_ATTEMPTS):
+        manifest, etag = load_manifest(s3, bucket, destinationKey, jobId)
+        if manifest is None:
+            manifest = {
+                'jobId': jobId,
+                'destinationKey': destinationKey,
+                'sliceCount': sliceInfo['count'],
+                'slices': {},
+                'assembled': False
+            }
+        manifest['slices'][str(sliceInfo['index'])] = entry
+
+        condition = {'IfMatch': etag} if etag is not None else {'IfNoneMatch': '*'}
+        try:
+            s3.put_object(
+                Bucket=bucket,
+                Key=key,
+                Body=json.dumps(manifest).encode('utf-8'),
+                ContentType='application/json',
+                **condition
+            )
+            return manifest
+        except Exception as e:
+            if error_code(e) not in CONDITIONAL_WRITE_ERROR_CODES:
+                raise
+            logger.info(f"Manifest for job {jobId} changed underneath us, retrying (attempt {attempt + 1})")
+
+    raise RuntimeError(f"Could not update manifest for job {jobId} after {MAX_MANIFEST_UPDATE_ATTEMPTS} attempts")
+
+
+def is_complete(manifest):
+    return manifest is not None and len(manifest['slices']) == manifest['sliceCount']
+
+
+def claim_assembly(s3, bucket, destinationKey, jobId):
+    """
+    Mark a complete job's manifest as being assembled, with a conditional write on
+    the ETag it was read with, so that only one of several invocations finishing or
+    redelivering the last slice assembles it. Returns (manifest, etag) of the claimed
+    manifest, or (None, None) when the job is already assembled. Raises when another
+    invocation is assembling it, so that the message is retried after that one is done.
+    """
+    manifest, etag = load_manifest(s3, bucket, destinationKey, jobId)
+    if manifest is None or manifest.get('assembled'):
+        return None, None
+    now = datetime.datetime.now(datetime.timezone.utc)
+    claimedAt = manifest.get('assemblyClaimedAt')
+    if claimedAt is not None and (now - parse_time(claimedAt)).total_seconds() < ASSEMBLY_CLAIM_SECONDS:
+        raise RuntimeError(f"Job {jobId} is being assembled by another invocation since {claimedAt}")
+
+    manifest['assemblyClaimedAt'] = now.isoformat()
+    try:
+        response = s3.put_object(
+            Bucket=bucket,
+            Key=manifest_key(destinationKey, jobId),
+            Body=json.dumps(manifest).encode('utf-8'),
+            ContentType='application/json',
+            IfMatch=etag
+        )
+    except Exception as e:
+        if error_code(e) not in CONDITIONAL_WRITE_ERROR_CODES:
+            raise
+        raise RuntimeError(f"Job {jobId} was claimed for assembly by another invocation") from e
+    return manifest, response['ETag']
+
+
+def object_size(response):
+    """Size of the whole object a ranged GetObject response was cut from"""
+    contentRange = response.get('ContentRange')
+    if contentRange and '/' in contentRange:
+        return int(contentRange.rsplit('/', 1)[1])
+    return response['ContentLength']
+
+
+def write_slice_range(s3, bucket, key, etag, head, start, end, writer):
+    """Stream bytes [start, end) of a slice to writer, from head when they were read with the header"""
+    if start >= end:
+        return
+    if end <= len(head):
+        writer.write_bytes(head[start:end])
+        return
+    body = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end - 1}", IfMatch=etag)['Body']
+    for chunk in body.iter_chunks(chunk_size=ASSEMBLY_CHUNK_SIZE):
+        writer.write_bytes(chunk)
+
+
+def assemble(s3, bucket, manifest, rollups=None):
+    """
+    Concatenate the slices of a complete job, in time order, into its destination key.
+    Every slice carries the CSV header; only the first one is kept. The rows of a
+    slice of at least MIN_PART_SIZE are copied server side with UploadPartCopy, so a
+    long job is not sent through the function; only small slices are streamed.
+    rollups lists the rollup periods to record in the object's metadata.
+
+    The assembly is claimed first (see claim_assembly), and the slices are only
+    deleted once the manifest records it as done under that claim. Returns whether
+    this call assembled the job: False when it already was.
+    """
+    destinationKey = manifest['destinationKey']
+    jobId = manifest['jobId']
+    manifest, etag = claim_assembly(s3, bucket, destinationKey, jobId)
+    if manifest is None:
+        logger.info(f"Job {jobId} is already assembled")
+        return False
+    header = None
+
+    entries = [manifest['slices'][str(index)] for index in range(manifest['sliceCount'])]
+    metadata = None
+    if 'endTime' in entries[-1]:
+        metadata = archive_metadata(parse_time(entries[-1]['endTime']), merge_periods(*[entry.get('periods') for entry in entries]),
+                                    rollups)
+
+    with MultipartUploadWriter(s3, bucket, destinationKey, metadata=metadata) as writer:
+        for index, entry in enumerate(entries):
+            response = s3.get_object(Bucket=bucket, Key=entry['key'], Range=f"bytes=0-{HEADER_READ_SIZE - 1}")
+            head, sliceETag = response['Body'].read(), response['ETag']
+            size = object_size(response)
+            sliceHeader, newline, _ = head.partition(b'\n')
+            if not newline and len(head) < size:
+                raise RuntimeError(f"Slice {index} of job {jobId} has a header longer than {HEADER_READ_SIZE} bytes")
+            if header is None:
+                header = sliceHeader
+                writer.write_bytes(header + b'\n')
+            elif sliceHeader != header:
+                raise RuntimeError(f"Slice {index} of job {jobId} has a different header than slice 0")
+
+            start = min(size, len(sliceHeader) + 1)
+            if size - start >= MIN_PART_SIZE:
+                # Top up what is buffered to a whole part, so the rest of the slice can be copied
+                if writer.bufferedBytes:
+                    topUp = max(0, MIN_PART_SIZE - writer.bufferedBytes)
+                    write_slice_range(s3, bucket, entry['key'], sliceETag, head, start, start + topUp, writer)
+                    start += topUp
+                if size - start >= MIN_PART_SIZE:
+                    writer.copy_range(entry['key'], start, size, sliceETag)
+                    continue
+            write_slice_range(s3, bucket, entry['key'], sliceETag, head, start, size, writer)
+
+    logger.info(f"Assembled {manifest['sliceCount']} slices of job {jobId} into s3://{bucket}/{destinationKey}")
+
+    manifest['assembled'] = True
+    manifest['assembledAt'] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    try:
+        s3.put_object(
+            Bucket=bucket,
+            Key=manifest_key(destinationKey, jobId),
+            Body=json.dumps(manifest).encode('utf-8'),
+            ContentType='application/json',
+            IfMatch=etag
+        )
+    except Exception as e:
+        if error_code(e) not in CONDITIONAL_WRITE_ERROR_CODES:
+            raise
+        # Our claim expired and was taken over; the slices belong to that assembly now
+        raise RuntimeError(f"Lost the assembly claim on job {jobId}; leaving its slices in place") from e
+
+    sliceKeys = [{'Key': entry['key']} for entry in entries]
+    for i in range(0, len(sliceKeys), DELETE_OBJECTS_BATCH_SIZE):
+        s3.delete_objects(Bucket=bucket, Delete={'Objects': sliceKeys[i:i + DELETE_OBJECTS_BATCH_SIZE], 'Quiet': True})
+    return True
@@ -0,0 +1,67 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+# The rules a migration request must meet, checked by the trigger before a job is queued
+# and by the worker again when the message arrives. Each *_error function returns why a
+# value is not allowed, or None when it is.
+
+CLOUDWATCH_STATISTICS = ["Average", "Minimum", "Maximum", "Sum", "SampleCount", "IQM", "p99", "tm99", "tc99", "ts99"]
+
+# Per-job limits of the worker's CloudWatch fetch pool
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_MAX_TPS = 10
+MAX_CONCURRENCY_LIMIT = 32
+MAX_TPS_LIMIT = 50
+
+# Periods CloudWatch accepts: high-resolution periods below a minute or whole minutes,
+# or "auto" to let the worker pick the finest period retained for each part of the window
+DEFAULT_PERIOD = 60
+AUTO_PERIOD = 'auto'
+HIGH_RESOLUTION_PERIODS = {1, 5, 10, 30}
+
+# Rollups are coarser copies of the archive. Only these stats can be combined exactly
+# from finer periods, and Average only alongside the SampleCount that weights it
+MAX_ROLLUPS = 4
+ROLLUP_STATS = {'Sum', 'SampleCount', 'Minimum', 'Maximum', 'Average'}
+
+
+def max_concurrency_error(maxConcurrency):
+    if isinstance(maxConcurrency, bool) or not isinstance(maxConcurrency, int) or not (1 <= maxConcurrency <= MAX_CONCURRENCY_LIMIT):
+        return f"maxConcurrency must be an integer between 1 and {MAX_CONCURRENCY_LIMIT}"
+    return None
+
+
+def max_tps_error(maxTps):
+    if isinstance(maxTps, bool) or not isinstance(maxTps, (int, float)) or not (0 < maxTps <= MAX_TPS_LIMIT):
+        return f"maxTps must be a number greater than 0 and at most {MAX_TPS_LIMIT}"
+    return None
+
+
+def is_valid_period(period):
+    if period == AUTO_PERIOD:
+        return True
+    if isinstance(period, bool) or not isinstance(period, int):
+        return False
+    return period in HIGH_RESOLUTION_PERIODS or (period > 0 and period % 60 == 0)
+
+
+def period_error(period):
+    return None if is_valid_period(period) else f"period must be 1, 5, 10, 30, a multiple of 60, or \"{AUTO_PERIOD}\""
+
+
+def rollup_error(periods, stats, basePeriod=None):
+    """Why periods cannot be rolled up for these stats, or None when they can"""
+    if not isinstance(periods, list) or not periods or len(periods) > MAX_ROLLUPS:
+        return f"rollups must be a list of 1 to {MAX_ROLLUPS} periods"
+    if any(isinstance(period, bool) or not isinstance(period, int) or period <= 0 or period % 60 != 0 for period in periods):
+        return "rollups must be multiples of 60 seconds"
+    if any(coarser <= finer or coarser % finer != 0 for finer, coarser in zip(periods, periods[1:])):
+        return "each rollup period must be a larger multiple of the one before it"
+    if isinstance(basePeriod, int) and (periods[0] <= basePeriod or periods[0] % basePeriod != 0):
+        return "rollup periods must be larger multiples of period"
+    unsupported = sorted(set(stats) - ROLLUP_STATS)
+    if unsupported:
+        return f"{unsupported} cannot be rolled up; only {sorted(ROLLUP_STATS)} can"
+    if 'Average' in stats and 'SampleCount' not in stats:
+        return "rolling up Average needs SampleCount in cloudwatchStats to weight it"
+    return None
@@ -0,0 +1,38 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import threading
+
+
+class LazyClient:
+    """
+    Stands in for a boto3 client and builds it, importing boto3, the first time one of
+    its methods is looked up. Cold starts then never pay for boto3, and requests that
+    are rejected or answered without AWS calls never build a client at all. config is
+    passed to botocore's Config. Safe to share between threads.
+    """
+
+    def __init__(self, serviceName, **config):
+        self._serviceName = serviceName
+        self._config = config
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import boto3
+                    from botocore.config import Config
+                    self._client = boto3.client(self._serviceName, config=Config(**self._config) if self._config else None)
+        return getattr(self._client, name)
+
+
+def error_code(error):
+    """
+    The AWS error code of a botocore ClientError, or None for any other exception.
+    botocore is only imported once an exception is being handled, so that modules
+    telling S3 errors apart do not pay for it at import time either.
+    """
+    from botocore.exceptions import ClientError
+    return error.response.get('Error', {}).get('Code') if isinstance(error, ClientError) else None
@@ -0,0 +1,107 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+# Stage timings and counters of one invocation, written as a single CloudWatch Embedded
+# Metric Format record when the invocation ends:
+#
+#   with stage_metrics.stage('Merge'):     adds the block's duration to MergeTime
+#   stage_metrics.count('Datapoints', n)   adds n to Datapoints
+#
+# Durations are summed across threads, so a stage run on a pool can add up to more than
+# the invocation's wall time. Counters ending in Bytes are published in bytes, the rest
+# as counts. While no invocation is being recorded, or with STAGE_METRICS_ENABLED unset,
+# stage() hands back a shared no-op context manager and count() returns at once.
+ENABLED = os.environ.get('STAGE_METRICS_ENABLED', 'false').lower() == 'true'
+NAMESPACE = os.environ.get('STAGE_METRICS_NAMESPACE', 'MetricTimeshift')
+DIMENSION = 'Function'
+
+_NO_STAGE = nullcontext()
+_current = None
+
+
+class Invocation:
+    """Totals of one invocation, shared by every thread it runs"""
+
+    def __init__(self, function):
+        self.function = function
+        self.totals = {}
+        self.units = {}
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+
+    def add(self, name, value, unit):
+        with self.lock:
+            self.totals[name] = self.totals.get(name, 0) + value
+            self.units[name] = unit
+
+    def record(self, timestamp=None):
+        """The EMF record of the totals so far, with the invocation's duration"""
+        with self.lock:
+            totals = dict(self.totals)
+            units = dict(self.units)
+        totals['InvocationTime'] = round((time.perf_counter() - self.started) * 1000, 3)
+        units['InvocationTime'] = 'Milliseconds'
+        return dict({
+            '_aws': {
+                'Timestamp': int((time.time() if timestamp is None else timestamp) * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [[DIMENSION]],
+                    'Metrics': [{'Name': name, 'Unit': units[name]} for name in sorted(totals)]
+                }]
+            },
+            DIMENSION: self.function
+        }, **totals)
+
+
+class Stage:
+    __slots__ = ('invocation', 'name', 'start')
+
+    def __init__(self, invocation, name):
+        self.invocation = invocation
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.invocation.add(self.name + 'Time', (time.perf_counter() - self.start) * 1000, 'Milliseconds')
+        return False
+
+
+def begin(function, enabled=None):
+    """Start recording an invocation of function; a no-op unless enabled (ENABLED by default)"""
+    global _current
+    _current = Invocation(function) if (ENABLED if enabled is None else enabled) else None
+
+
+def stage(name):
+    """Context manager timing one run of a stage"""
+    invocation = _current
+    return Stage(invocation, name) if invocation is not None else _NO_STAGE
+
+
+def count(name, value=1):
+    invocation = _current
+    if invocation is not None:
+        invocation.add(name, value, 'Bytes' if name.endswith('Bytes') else 'Count')
+
+
+def emit():
+    """Write the invocation's record to stdout, where Lambda sends it to CloudWatch Logs, and stop recording"""
+    global _current
+    invocation, _current = _current, None
+    if invocation is None:
+        return None
+    record = invocation.record()
+    sys.stdout.write(json.dumps(record) + '\n')
+    sys.stdout.flush()
+    return record
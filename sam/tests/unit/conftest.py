@@ -0,0 +1,237 @@
+import hashlib
+import io
+import json
+import os
+import sys
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from botocore.exceptions import ClientError
+
+# Each Lambda is packaged from its own CodeUri directory, so modules inside a
+# function import their siblings, and the modules of the shared layer, as
+# top-level modules. Mirror that here.
+SAM_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+for functionDir in ['metric_migrate_trigger', 'migrate_metric', 'timeshift', 'shared']:
+    path = os.path.join(SAM_DIR, functionDir)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from result_cache import ResultCache
+
+
+class FakeStreamingBody:
+    def __init__(self, data):
+        self._stream = io.BytesIO(data)
+
+    def read(self, amt=None):
+        return self._stream.read(amt)
+
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            chunk = self._stream.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def iter_lines(self, chunk_size=1024, keepends=False):
+        for line in self._stream:
+            yield line if keepends else line.rstrip(b'\r\n')
+
+    def close(self):
+        self._stream.close()
+
+
+class FakeS3:
+    """In-memory stand-in for the parts of the S3 client the Lambdas use"""
+
+    def __init__(self):
+        self.objects = {}
+        self.metadata = {}
+        self.uploads = {}
+        self.calls = []
+
+    @staticmethod
+    def _error(code, operation):
+        return ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+    def _etag(self, key):
+        return '"' + hashlib.md5(self.objects[key], usedforsecurity=False).hexdigest() + '"'
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, Metadata=None, **kwargs):
+        self.calls.append(('put_object', Key))
+        if IfNoneMatch == '*' and Key in self.objects:
+            raise self._error('PreconditionFailed', 'PutObject')
+        if IfMatch is not None and (Key not in self.objects or self._etag(Key) != IfMatch):
+            raise self._error('PreconditionFailed', 'PutObject')
+        self.objects[Key] = bytes(Body)
+        self.metadata[Key] = dict(Metadata or {})
+        return {'ETag': self._etag(Key)}
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None, **kwargs):
+        self.calls.append(('get_object', Key))
+        if Key not in self.objects:
+            raise self._error('NoSuchKey', 'GetObject')
+        if IfMatch is not None and self._etag(Key) != IfMatch:
+            raise self._error('PreconditionFailed', 'GetObject')
+        data = self.objects[Key]
+        size = len(data)
+        response = {'ETag': self._etag(Key), 'Metadata': self.metadata.get(Key, {})}
+        if Range is not None:
+            start, _, end = Range.replace('bytes=', '').partition('-')
+            if start == '':
+                first = max(0, size - int(end))
+            else:
+                first = int(start)
+            data = data[first:int(end) + 1 if start != '' and end else None]
+            response['ContentRange'] = f"bytes {first}-{first + len(data) - 1}/{size}"
+        response['Body'] = FakeStreamingBody(data)
+        response['ContentLength'] = len(data)
+        return response
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self.calls.append(('head_object', Key))
+        if Key not in self.objects:
+            raise self._error('404', 'HeadObject')
+        return {'ETag': self._etag(Key), 'ContentLength': len(self.objects[Key]), 'Metadata': self.metadata.get(Key, {})}
+
+    def delete_objects(self, Bucket, Delete):
+        for entry in Delete['Objects']:
+            self.objects.pop(entry['Key'], None)
+        return {}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', **kwargs):
+        keys = sorted(key for key in self.objects if key.startswith(Prefix))
+        return {'Contents': [{'Key': key, 'Size': len(self.objects[key])} for key in keys], 'KeyCount': len(keys)}
+
+    def create_multipart_upload(self, Bucket, Key, Metadata=None, **kwargs):
+        uploadId = f"upload-{len(self.uploads) + 1}"
+        self.uploads[uploadId] = {'Key': Key, 'Parts': {}, 'Metadata': dict(Metadata or {})}
+        return {'UploadId': uploadId}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if UploadId not in self.uploads:
+            raise self._error('NoSuchUpload', 'UploadPart')
+        self.uploads[UploadId]['Parts'][PartNumber] = bytes(Body)
+        return {'ETag': f'"{UploadId}-{PartNumber}"'}
+
+    def upload_part_copy(self, Bucket, Key, UploadId, PartNumber, CopySource, CopySourceRange=None, CopySourceIfMatch=None):
+        if UploadId not in self.uploads:
+            raise self._error('NoSuchUpload', 'UploadPartCopy')
+        if CopySource['Key'] not in self.objects:
+            raise self._error('NoSuchKey', 'UploadPartCopy')
+        if CopySourceIfMatch is not None and self._etag(CopySource['Key']) != CopySourceIfMatch:
+            raise self._error('PreconditionFailed', 'UploadPartCopy')
+        data = self.objects[CopySource['Key']]
+        if CopySourceRange is not None:
+            start, _, end = CopySourceRange.replace('bytes=', '').partition('-')
+            data = data[int(start):int(end) + 1]
+        self.uploads[UploadId]['Parts'][PartNumber] = data
+        return {'CopyPartResult': {'ETag': f'"{UploadId}-{PartNumber}"'}}
+
+    def list_parts(self, Bucket, Key, UploadId, **kwargs):
+        if UploadId not in self.uploads:
+            raise self._error('NoSuchUpload', 'ListParts')
+        parts = self.uploads[UploadId]['Parts']
+        return {'Parts': [{'PartNumber': number, 'ETag': f'"{UploadId}-{number}"', 'Size': len(parts[number])} for number in sorted(parts)]}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        upload = self.uploads.pop(UploadId)
+        self.objects[Key] = b''.join(upload['Parts'][part['PartNumber']] for part in MultipartUpload['Parts'])
+        self.metadata[Key] = upload['Metadata']
+        return {'ETag': self._etag(Key)}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+        return {}
+
+
+@pytest.fixture
+def fake_s3():
+    return FakeS3()
+
+
+@pytest.fixture
+def no_result_cache():
+    """
+    Answer every timeshift query from its source rather than from what earlier tests
+    left cached. Modules reading archives through the timeshift Lambda use it with
+    pytestmark = pytest.mark.usefixtures('no_result_cache').
+    """
+    with patch('timeshift.app.result_cache', ResultCache(0)), \
+         patch('timeshift.app.page_sessions', ResultCache(4)):
+        yield
+
+
+@pytest.fixture
+def metric_step():
+    """Spacing of the datapoints the cloudwatch fixture returns; override or parametrize it"""
+    return timedelta(minutes=1)
+
+
+@pytest.fixture
+def metric_value():
+    """Value the cloudwatch fixture returns for a query at a timestamp; override or parametrize it"""
+    return lambda query, timestamp: 1.0
+
+
+@pytest.fixture
+def cloudwatch(metric_step, metric_value):
+    """CloudWatch client listing one metric and returning a datapoint every metric_step for each query"""
+    client = MagicMock()
+    client.list_metrics.return_value = {
+        'Metrics': [{'Namespace': 'AWS/Lambda', 'MetricName': 'Invocations', 'Dimensions': []}]
+    }
+
+    def get_metric_data(**kwargs):
+        timestamps = []
+        current = kwargs['StartTime']
+        while current < kwargs['EndTime']:
+            timestamps.append(current)
+            current += metric_step
+        return {'MetricDataResults': [
+            {'Id': query['Id'], 'Timestamps': timestamps, 'Values': [metric_value(query, t) for t in timestamps]}
+            for query in kwargs['MetricDataQueries']
+        ]}
+
+    client.get_metric_data.side_effect = get_metric_data
+    return client
+
+
+@pytest.fixture
+def migration_body():
+    """Request the migrate fixture sends, before its keyword arguments are applied; override it"""
+    return {
+        'namespace': 'AWS/Lambda',
+        'metricName': 'Invocations',
+        'dimensions': [],
+        'startTime': '2024-01-01T00:00:00Z',
+        'endTime': '2024-01-01T01:00:00Z',
+        'destinationMetricName': 'm',
+        'destinationKey': 'archive.csv',
+        'cloudwatchStats': ['Sum']
+    }
+
+
+@pytest.fixture
+def migrate(cloudwatch, fake_s3, migration_body):
+    """
+    Run the migrate worker on one message, migration_body updated with the keyword
+    arguments, against the cloudwatch and fake_s3 fixtures. Returns the failed message Ids.
+    """
+    import migrate_metric.app as app
+
+    def run(**fields):
+        event = {'Records': [{'messageId': 'm1', 'body': json.dumps(dict(migration_body, **fields))}]}
+        with patch('migrate_metric.app.metrics', cloudwatch), \
+             patch('migrate_metric.app.s3_client', fake_s3), \
+             patch.dict(os.environ, {'ARCHIVED_METRICS_BUCKET_NAME': 'bucket'}):
+            response = app.lambda_handler(event, {})
+        return [failure['itemIdentifier'] for failure in response['batchItemFailures']]
+
+    return run
@@ -0,0 +1,140 @@
+"""
+Unit tests for reading archive CSVs directly from S3 in the timeshift Lambda.
+"""
+import os
+import sys
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+os.environ.setdefault('S3_CSV_LOADING_LAMBDA_ARN', 'arn:aws:lambda:us-east-1:123456789012:function:s3-csv')
+import timeshift.app as timeshift
+import archive_reader
+from archive_reader import ArchiveFormatError, read_window
+
+START = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+
+
+pytestmark = pytest.mark.usefixtures('no_result_cache')
+
+
+def make_archive(rows, columns=('Sum', 'Maximum')):
+    """One row per minute from START; every seventh row has no Maximum"""
+    lines = ['timestamp,' + ','.join(columns) + '\n']
+    for n in range(rows):
+        timestamp = datetime.fromtimestamp(START + 60 * n, tz=timezone.utc).isoformat()
+        maximum = '' if n % 7 == 0 else str(float(n * 2))
+        lines.append(f"{timestamp},{float(n)},{maximum}\n")
+    return ''.join(lines).encode('utf-8')
+
+
+def test_reads_only_the_window(fake_s3):
+    fake_s3.objects['archive.csv'] = make_archive(100)
+
+    results = read_window(fake_s3, 'bucket', 'archive.csv', START + 60 * 10, START + 60 * 20)
+
+    assert [result['Label'] for result in results] == ['Sum', 'Maximum']
+    assert results[0]['Timestamps'] == [START + 60 * n for n in range(10, 20)]
+    assert results[0]['Values'] == [float(n) for n in range(10, 20)]
+    # Row 14 has an empty Maximum cell, which is a gap rather than a point
+    assert START + 60 * 14 not in results[1]['Timestamps']
+    assert len(results[1]['Values']) == 9
+
+
+def test_selected_columns_only(fake_s3):
+    fake_s3.objects['archive.csv'] = make_archive(10)
+
+    results = read_window(fake_s3, 'bucket', 'archive.csv', START, START + 600, ['Maximum'])
+
+    assert [result['Label'] for result in results] == ['Maximum']
+    with pytest.raises(ValueError):
+        read_window(fake_s3, 'bucket', 'archive.csv', START, START + 600, ['Average'])
+
+
+def test_large_archive_is_searched_with_few_requests(fake_s3):
+    # About 6 MiB of rows; a window near the end must not stream the whole object
+    fake_s3.objects['archive.csv'] = make_archive(150000)
+    size = len(fake_s3.objects['archive.csv'])
+    reads = []
+    getObject = fake_s3.get_object
+
+    def get_object(**kwargs):
+        response = getObject(**kwargs)
+        reads.append(response['ContentLength'])
+        return response
+
+    with patch.object(fake_s3, 'get_object', side_effect=get_object):
+        results = read_window(fake_s3, 'bucket', 'archive.csv', START + 60 * 140000, START + 60 * 140010)
+
+    assert results[0]['Timestamps'] == [START + 60 * n for n in range(140000, 140010)]
+    assert len(reads) <= 6
+    # The final streaming read starts close to the window rather than at the top of the file
+    assert reads[-1] < size / 10
+
+
+def test_window_outside_the_archive(fake_s3):
+    fake_s3.objects['archive.csv'] = make_archive(10)
+
+    before = read_window(fake_s3, 'bucket', 'archive.csv', START - 3600, START)
+    after = read_window(fake_s3, 'bucket', 'archive.csv', START + 3600, START + 7200)
+
+    assert before[0]['Timestamps'] == [] and after[0]['Timestamps'] == []
+
+
+def test_other_csvs_are_rejected(fake_s3):
+    fake_s3.objects['other.csv'] = b'time,value\n2024-01-01T00:00:00Z,1\n'
+
+    with pytest.raises(ArchiveFormatError):
+        read_window(fake_s3, 'bucket', 'other.csv', START, START + 60)
+
+
+def native_event(key, duration='P1D', columns=None):
+    arguments = ['bucket', key, duration] + ([columns] if columns is not None else [])
+    return {
+        'EventType': 'GetMetricData',
+        'GetMetricDataRequest': {
+            'Arguments': arguments,
+            'StartTime': START + 86400,
+            'EndTime': START + 86400 + 600
+        }
+    }
+
+
+def test_native_mode_reads_and_shifts_without_invoking(fake_s3):
+    fake_s3.objects['archive.csv'] = make_archive(100)
+    client = MagicMock()
+
+    with patch('timeshift.app.READER_MODE', 'native'), \
+         patch('timeshift.app.s3_client', fake_s3), \
+         patch('timeshift.app.lambda_client', client):
+        response = timeshift.lambda_handler(native_event('archive.csv', columns='Sum'), {})
+
+    client.invoke.assert_not_called()
+    assert [result['Label'] for result in response['MetricDataResults']] == ['Sum']
+    assert response['MetricDataResults'][0]['Timestamps'] == [START + 86400 + 60 * n for n in range(10)]
+
+
+def test_native_mode_falls_back_to_the_source_lambda(fake_s3):
+    fake_s3.objects['other.csv'] = b'time,value\n'
+    client = MagicMock()
+    client.invoke.return_value = {'StatusCode': 200, 'Payload': MagicMock(read=lambda: b'{"MetricDataResults": []}')}
+
+    with patch('timeshift.app.READER_MODE', 'native'), \
+         patch('timeshift.app.s3_client', fake_s3), \
+         patch('timeshift.app.lambda_client', client):
+        response = timeshift.lambda_handler(native_event('other.csv'), {})
+
+    client.invoke.assert_called_once()
+    assert response == {'MetricDataResults': []}
+
+
+def test_header_longer_than_the_first_read(fake_s3):
+    columns = [f"c{n}" for n in range(2)]
+    fake_s3.objects['wide.csv'] = make_archive(3, columns=columns)
+    with patch.object(archive_reader, 'HEADER_READ_SIZE', 4):
+        results = read_window(fake_s3, 'bucket', 'wide.csv', START, START + 180)
+
+    assert [result['Label'] for result in results] == columns
+    assert results[0]['Values'] == [0.0, 1.0, 2.0]
@@ -0,0 +1,75 @@
+"""
+Unit tests for processing SQS batches with partial failures in migrate_metric.
+"""
+import json
+import os
+import sys
+import threading
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+import migrate_metric.app as app
+from job_rules import MAX_CONCURRENCY_LIMIT
+
+
+@pytest.fixture
+def migrate_batch(cloudwatch, fake_s3, migration_body):
+    """
+    Run the migrate worker on one message per messageId in records, migration_body
+    archived to <messageId>.csv and updated with that message's fields, against the
+    cloudwatch and fake_s3 fixtures. Returns the handler's response.
+    """
+    def run(records):
+        event = {'Records': [
+            {'messageId': messageId, 'body': json.dumps(dict(migration_body, destinationKey=f"{messageId}.csv", **fields))}
+            for messageId, fields in records.items()
+        ]}
+        with patch('migrate_metric.app.metrics', cloudwatch), \
+             patch('migrate_metric.app.s3_client', fake_s3), \
+             patch.dict(os.environ, {'ARCHIVED_METRICS_BUCKET_NAME': 'bucket'}):
+            return app.lambda_handler(event, {})
+
+    return run
+
+
+def test_only_failed_records_are_reported(fake_s3, migrate_batch):
+    response = migrate_batch({'ok-1': {}, 'bad': {'destinationMetricName': ''}, 'ok-2': {}})
+
+    assert response['batchItemFailures'] == [{'itemIdentifier': 'bad'}]
+    assert 'ok-1.csv' in fake_s3.objects
+    assert 'ok-2.csv' in fake_s3.objects
+
+
+def test_records_of_a_batch_run_concurrently(fake_s3, cloudwatch, migrate_batch):
+    # Each record waits in list_metrics until every record of the batch got there
+    barrier = threading.Barrier(3, timeout=10)
+    listMetrics = cloudwatch.list_metrics.return_value
+
+    def list_metrics(**kwargs):
+        barrier.wait()
+        return listMetrics
+
+    cloudwatch.list_metrics.side_effect = list_metrics
+
+    response = migrate_batch({f"m{n}": {} for n in range(3)})
+
+    assert response['batchItemFailures'] == []
+    assert all(f"m{n}.csv" in fake_s3.objects for n in range(3))
+
+
+def test_records_of_a_batch_split_the_fetch_budget(migrate_batch):
+    limits = []
+    realFetchPool = app.FetchPool
+
+    def fetch_pool(maxConcurrency, maxTps):
+        limits.append((maxConcurrency, maxTps))
+        return realFetchPool(maxConcurrency, maxTps)
+
+    with patch('migrate_metric.app.FetchPool', side_effect=fetch_pool):
+        response = migrate_batch({f"m{n}": {'maxConcurrency': 32, 'maxTps': 50} for n in range(4)})
+
+    assert response['batchItemFailures'] == []
+    assert limits == [(8, 12.5)] * 4
+    assert sum(concurrency for concurrency, _ in limits) <= MAX_CONCURRENCY_LIMIT
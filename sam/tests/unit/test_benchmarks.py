@@ -0,0 +1,113 @@
+"""
+Unit tests for the offline benchmark fakes and series generators.
+"""
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import pytest
+from botocore.exceptions import ClientError
+
+SAM_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+sys.path.insert(0, os.path.join(SAM_DIR, 'benchmarks'))
+import cold_start
+import fetcher
+from fakes import MAX_DATAPOINTS_PER_PAGE, CsvLoaderLambda, FakeCloudWatch, FileSystemS3
+from fetch_pool import FetchPool
+from series import START, SeriesSet
+
+
+def test_series_are_generated_the_same_on_every_call():
+    seriesSet = SeriesSet(3, 2, 100, gapPercent=10)
+
+    assert seriesSet.timestamps(1, START, START + 6000) == seriesSet.timestamps(1, START, START + 6000)
+    assert 80 < len(seriesSet.timestamps(1, START, START + 6000)) < 100
+    assert seriesSet.value(2, 'Maximum', START + 60) == seriesSet.value(2, 'Maximum', START + 60)
+    assert seriesSet.metric_index(seriesSet.metric(2)) == 2
+    assert SeriesSet(1, 1, 100).timestamps(0, START + 30, START + 180) == [START + 60, START + 120]
+
+
+def test_get_metric_data_pages_like_cloudwatch():
+    seriesSet = SeriesSet(4, 2, 60000)
+    cloudwatch = FakeCloudWatch(seriesSet)
+    queries = fetcher.build_metric_data_queries(seriesSet.metrics(), seriesSet.stats)
+
+    results = fetcher.fetch_batch(cloudwatch, queries, datetime.fromtimestamp(START, tz=timezone.utc),
+                                  datetime.fromtimestamp(seriesSet.end, tz=timezone.utc))
+
+    assert cloudwatch.calls['GetMetricData'] == -(-seriesSet.totalPoints // MAX_DATAPOINTS_PER_PAGE)
+    for metricIndex in range(4):
+        series = results[queries[metricIndex * 2 + 1]['Id']]
+        assert list(series.timestamps) == list(range(START, seriesSet.end, 60))
+        assert series.values[5] == seriesSet.value(metricIndex, seriesSet.stats[1], START + 300)
+
+
+def test_a_share_of_calls_is_throttled_and_retried():
+    seriesSet = SeriesSet(2, 1, 10)
+    cloudwatch = FakeCloudWatch(seriesSet, throttleRate=0.5)
+
+    with FetchPool(2, 50) as pool:
+        queries = fetcher.list_job_queries(cloudwatch, pool, seriesSet.metric(0)['Namespace'], seriesSet.metric(0)['MetricName'],
+                                           [{'Name': 'Host'}], ['Average'])
+
+    assert len(queries) == 2
+    assert cloudwatch.throttles == 1 and pool.limiter.throttles == 1
+    with pytest.raises(ClientError):
+        cloudwatch.list_metrics(Namespace=seriesSet.metric(0)['Namespace'])
+
+
+def test_file_system_s3_multipart_and_ranges(tmp_path):
+    s3 = FileSystemS3(str(tmp_path))
+    upload = s3.create_multipart_upload(Bucket='bucket', Key='a/b.csv', Metadata={'archived-through': '1'})['UploadId']
+    parts = [s3.upload_part(Bucket='bucket', Key='a/b.csv', UploadId=upload, PartNumber=n, Body=f"part{n}\n".encode()) for n in (1, 2)]
+    s3.complete_multipart_upload(Bucket='bucket', Key='a/b.csv', UploadId=upload,
+                                 MultipartUpload={'Parts': [{'PartNumber': n, 'ETag': part['ETag']} for n, part in zip((1, 2), parts)]})
+
+    assert s3.get_object(Bucket='bucket', Key='a/b.csv')['Body'].read() == b'part1\npart2\n'
+    tail = s3.get_object(Bucket='bucket', Key='a/b.csv', Range='bytes=-6')
+    assert tail['Body'].read() == b'part2\n' and tail['ContentRange'] == 'bytes 6-11/12'
+    head = s3.head_object(Bucket='bucket', Key='a/b.csv')
+    assert head['Metadata'] == {'archived-through': '1'}
+    with pytest.raises(ClientError):
+        s3.put_object(Bucket='bucket', Key='a/b.csv', Body=b'x', IfNoneMatch='*')
+    with pytest.raises(ClientError):
+        s3.get_object(Bucket='bucket', Key='a/b.csv', IfMatch='"stale"')
+    s3.put_object(Bucket='bucket', Key='a/c.csv', Body=b'c')
+    assert [entry['Key'] for entry in s3.list_objects_v2(Bucket='bucket', Prefix='a/')['Contents']] == ['a/b.csv', 'a/c.csv']
+    second = s3.list_objects_v2(Bucket='bucket', Prefix='a/', MaxKeys=1)
+    assert second['IsTruncated'] and s3.list_objects_v2(Bucket='bucket', ContinuationToken=second['NextContinuationToken'])['KeyCount'] == 1
+
+
+def test_csv_loader_answers_like_the_data_source(tmp_path):
+    seriesSet = SeriesSet(2, 2, 30)
+    s3 = FileSystemS3(str(tmp_path))
+    s3.put_chunks(Bucket='bucket', Key='archive.csv', chunks=seriesSet.csv_chunks(rowsPerChunk=7))
+    request = {'Arguments': ['bucket', 'archive.csv'], 'StartTime': START + 600, 'EndTime': START + 1200}
+
+    payload = json.loads(CsvLoaderLambda(s3).invoke(FunctionName='loader', Payload=json.dumps({'GetMetricDataRequest': request}))['Payload'].read())
+    paged = CsvLoaderLambda(s3, pagePoints=15).invoke(FunctionName='loader', Payload=json.dumps({'GetMetricDataRequest': request}))
+
+    assert [result['Label'] for result in payload['MetricDataResults']] == seriesSet.columns()
+    assert payload['MetricDataResults'][0]['Timestamps'] == list(range(START + 600, START + 1200, 60))
+    assert payload['MetricDataResults'][3]['Values'][0] == seriesSet.value(1, seriesSet.stats[1], START + 600)
+    assert json.loads(paged['Payload'].read())['NextToken'] == '15'
+
+
+@pytest.mark.parametrize('scenario', ['migrate-csv', 'timeshift-native'])
+def test_suite_runs_a_scenario_offline(scenario):
+    completed = subprocess.run([sys.executable, os.path.join(SAM_DIR, 'benchmarks', 'suite.py'), '--scenario', scenario, '--runs', '1',
+                                '--metrics', '2', '--stats', '2', '--points', '300'],
+                               capture_output=True, text=True, timeout=120)
+
+    assert completed.returncode == 0, completed.stderr
+    assert f"{scenario}: 1200 points" in completed.stdout
+
+
+@pytest.mark.parametrize('functionDir', cold_start.FUNCTIONS)
+def test_handlers_import_neither_botocore_nor_numpy(functionDir):
+    _, importTimes = cold_start.run_init(functionDir, importTime=True)
+
+    imported = {line.rsplit('|', 1)[-1].strip() for line in importTimes.splitlines() if line.startswith('import time:')}
+    assert not {'boto3', 'botocore', 'numpy'} & imported
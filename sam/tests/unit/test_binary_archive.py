@@ -0,0 +1,147 @@
+"""
+Unit tests for the binary archive layout: encoding in migrate_metric and
+decoding in the timeshift Lambda.
+"""
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+import migrate_metric.app as app
+import archive_reader
+import binary_reader
+import binary_writer
+from archive_reader import read_window
+from binary_writer import BinaryArchiveWriter
+from merge import Series, format_rows, merge_series
+
+START = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+
+
+class Sink:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write_bytes(self, data):
+        self.data += data
+
+
+def make_series(count, step=60, value=lambda n: float(n % 50), gaps=()):
+    series = Series()
+    points = [n for n in range(count) if n not in gaps]
+    series.extend([datetime.fromtimestamp(START + step * n, tz=timezone.utc) for n in points], [value(n) for n in points])
+    return series
+
+
+def encode(seriesList, columns, endEpoch):
+    sink = Sink()
+    writer = BinaryArchiveWriter(sink, columns)
+    for timestamp, values in merge_series(seriesList, START, endEpoch):
+        writer.append(timestamp, values)
+    writer.close()
+    return bytes(sink.data)
+
+
+def test_round_trip_keeps_gaps_and_exact_values(fake_s3):
+    values = [0.1 * n - 3.3 for n in range(3000)]
+    sums = make_series(3000, value=lambda n: values[n])
+    maxima = make_series(3000, value=lambda n: float(n), gaps={0, 7, 1500, 2999})
+    fake_s3.objects['archive.bin'] = encode([sums, maxima], ['Sum', 'Maximum'], START + 60 * 3000)
+
+    results = read_window(fake_s3, 'bucket', 'archive.bin', START, START + 60 * 3000)
+
+    assert [result['Label'] for result in results] == ['Sum', 'Maximum']
+    assert results[0]['Timestamps'] == [START + 60 * n for n in range(3000)]
+    assert results[0]['Values'] == values
+    assert START + 60 * 1500 not in results[1]['Timestamps']
+    assert len(results[1]['Values']) == 2996
+
+
+def test_reads_only_the_blocks_in_the_window(fake_s3):
+    rows = 20 * binary_writer.BLOCK_ROWS
+    fake_s3.objects['archive.bin'] = encode([make_series(rows)], ['Sum'], START + 60 * rows)
+    fake_s3.calls.clear()
+
+    startEpoch, endEpoch = START + 60 * 5000, START + 60 * 5100
+    # Small reads so that the archive does not fit in the first one
+    with patch.object(archive_reader, 'HEADER_READ_SIZE', 64), patch.object(binary_reader, 'TAIL_READ_SIZE', 64):
+        results = read_window(fake_s3, 'bucket', 'archive.bin', startEpoch, endEpoch, ['Sum'])
+
+    assert results[0]['Timestamps'] == list(range(startEpoch, endEpoch, 60))
+    assert results[0]['Values'] == [float(n % 50) for n in range(5000, 5100)]
+    # The first bytes, the tail, the rest of the footer and the blocks holding the window
+    assert len(fake_s3.calls) == 4
+
+
+def test_irregular_timestamps(fake_s3):
+    series = Series()
+    timestamps = [START, START + 1, START + 60, START + 61, START + 3600, START + 86400 * 400]
+    series.extend([datetime.fromtimestamp(t, tz=timezone.utc) for t in timestamps], [1.0, -2.5, 1e300, 0.0, -0.0, 5e-324])
+    fake_s3.objects['archive.bin'] = encode([series], ['Sum'], START + 86400 * 401)
+
+    results = read_window(fake_s3, 'bucket', 'archive.bin', START, START + 86400 * 401)
+
+    assert results[0]['Timestamps'] == timestamps
+    assert results[0]['Values'] == [1.0, -2.5, 1e300, 0.0, -0.0, 5e-324]
+
+
+def test_much_smaller_than_csv():
+    rows = 30 * 1440
+    seriesList = [make_series(rows, value=lambda n: float(100 + n % 7)), make_series(rows, value=lambda n: float(n % 3))]
+
+    binary = encode(seriesList, ['Sum', 'Maximum'], START + 60 * rows)
+    csv = ('timestamp,Sum,Maximum\n' + format_rows(seriesList, START, START + 60 * rows)).encode('utf-8')
+
+    assert len(binary) * 10 < len(csv)
+
+
+def test_corrupt_trailer_is_rejected(fake_s3):
+    fake_s3.objects['archive.bin'] = encode([make_series(10)], ['Sum'], START + 600)[:-1]
+
+    with pytest.raises(binary_reader.BinaryFormatError):
+        read_window(fake_s3, 'bucket', 'archive.bin', START, START + 600)
+
+
+def test_migration_writes_a_binary_archive(fake_s3):
+    cloudwatch = MagicMock()
+    cloudwatch.list_metrics.return_value = {'Metrics': [{'Namespace': 'AWS/Lambda', 'MetricName': 'Invocations', 'Dimensions': []}]}
+
+    def get_metric_data(**kwargs):
+        timestamps = []
+        current = kwargs['StartTime']
+        while current < kwargs['EndTime']:
+            timestamps.append(current)
+            current += timedelta(hours=1)
+        return {'MetricDataResults': [
+            {'Id': query['Id'], 'Timestamps': timestamps, 'Values': [2.0] * len(timestamps)} for query in kwargs['MetricDataQueries']
+        ]}
+
+    cloudwatch.get_metric_data.side_effect = get_metric_data
+    event = {'Records': [{'messageId': 'm1', 'body': json.dumps({
+        'namespace': 'AWS/Lambda',
+        'metricName': 'Invocations',
+        'dimensions': [],
+        'startTime': '2024-01-01T00:00:00Z',
+        'endTime': '2024-01-03T00:00:00Z',
+        'destinationMetricName': 'm',
+        'destinationKey': 'archive.bin',
+        'cloudwatchStats': ['Sum', 'Maximum'],
+        'period': 3600,
+        'format': 'binary'
+    })}]}
+    with patch('migrate_metric.app.metrics', cloudwatch), \
+         patch('migrate_metric.app.s3_client', fake_s3), \
+         patch.dict(os.environ, {'ARCHIVED_METRICS_BUCKET_NAME': 'bucket'}):
+        response = app.lambda_handler(event, {})
+
+    assert response['batchItemFailures'] == []
+    assert fake_s3.objects['archive.bin'].startswith(binary_writer.MAGIC)
+    assert fake_s3.metadata['archive.bin']['archived-through'] == '2024-01-03T00:00:00Z'
+    results = read_window(fake_s3, 'bucket', 'archive.bin', START, START + 2 * 86400)
+    assert [result['Label'] for result in results] == ['m-Sum', 'm-Maximum']
+    assert results[1]['Timestamps'] == list(range(START, START + 2 * 86400, 3600))
+    assert results[1]['Values'] == [2.0] * 48
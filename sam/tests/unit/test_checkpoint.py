@@ -0,0 +1,114 @@
+"""
+Unit tests for resumable, checkpointed archive uploads in migrate_metric.
+"""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+import migrate_metric.app as app
+import checkpoint
+from fetch_pool import FetchPool
+from s3_writer import MIN_PART_SIZE, MultipartUploadWriter
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+QUERIES = [{'Id': 'q0', 'MetricStat': {'Metric': {'Namespace': 'ns', 'MetricName': 'm', 'Dimensions': []}, 'Period': 60, 'Stat': 'Sum'}, 'ReturnData': True}]
+
+
+def minute_rows(startEpoch, endEpoch):
+    return ''.join(
+        datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat() + ',1.0\n'
+        for epoch in range(startEpoch, endEpoch, 60)
+    )
+
+
+def test_writer_resumes_an_interrupted_upload(fake_s3):
+    row = 'x' * 1023 + '\n'
+    saved = []
+
+    with pytest.raises(RuntimeError):
+        with MultipartUploadWriter(fake_s3, 'bucket', 'key.csv', partSize=MIN_PART_SIZE,
+                                   onCheckpoint=saved.append, abortOnError=False) as writer:
+            for position in range(8):
+                writer.write(row * 1024, position=position)
+            raise RuntimeError("timed out")
+
+    # The upload is left open and the checkpoint only covers whole writes that reached S3
+    state = saved[-1]
+    assert state['uploadId'] in fake_s3.uploads
+    assert state['position'] == 4
+    assert state['bytesWritten'] == 5 * 1024 * 1024
+
+    with MultipartUploadWriter(fake_s3, 'bucket', 'key.csv', partSize=MIN_PART_SIZE, resume=state) as writer:
+        for position in range(state['position'] + 1, 12):
+            writer.write(row * 1024, position=position)
+
+    assert fake_s3.objects['key.csv'] == (row * 12 * 1024).encode('utf-8')
+    assert writer.bytesWritten == 12 * 1024 * 1024
+
+
+def test_archive_window_resumes_from_checkpoint(fake_s3, cloudwatch):
+    endTime = START + timedelta(hours=3)
+    resumeEpoch = int((START + timedelta(hours=1)).timestamp())
+    fingerprint = checkpoint.job_fingerprint({'destinationKey': 'archive.csv'})
+
+    # A previous attempt uploaded the first hour before it died
+    uploadId = fake_s3.create_multipart_upload(Bucket='bucket', Key='archive.csv')['UploadId']
+    firstPart = ('timestamp,m-Sum\n' + minute_rows(int(START.timestamp()), resumeEpoch)).encode('utf-8')
+    etag = fake_s3.upload_part(Bucket='bucket', Key='archive.csv', UploadId=uploadId, PartNumber=1, Body=firstPart)['ETag']
+    checkpoint.save_checkpoint(fake_s3, 'bucket', 'archive.csv', {
+        'fingerprint': fingerprint,
+        'header': 'timestamp,m-Sum',
+        'uploadId': uploadId,
+        'parts': [{'PartNumber': 1, 'ETag': etag}],
+        'bytesWritten': len(firstPart),
+        'position': resumeEpoch
+    })
+
+    with patch('migrate_metric.app.metrics', cloudwatch), \
+         patch('migrate_metric.app.s3_client', fake_s3), \
+         patch('fetcher.DATAPOINTS_PER_CHUNK', 60):
+        with FetchPool(2, 10) as pool:
+            app.archive_window(pool, QUERIES, ['m-Sum'], START, endTime, 'bucket', 'archive.csv', fingerprint=fingerprint)
+
+    fetchedFrom = min(call.kwargs['StartTime'] for call in cloudwatch.get_metric_data.call_args_list)
+    assert fetchedFrom.timestamp() == resumeEpoch
+    assert fake_s3.objects['archive.csv'].decode('utf-8') == (
+        'timestamp,m-Sum\n' + minute_rows(int(START.timestamp()), int(endTime.timestamp()))
+    )
+    assert checkpoint.checkpoint_key('archive.csv') not in fake_s3.objects
+
+
+def test_checkpoint_from_a_different_request_is_ignored(fake_s3):
+    uploadId = fake_s3.create_multipart_upload(Bucket='bucket', Key='archive.csv')['UploadId']
+    checkpoint.save_checkpoint(fake_s3, 'bucket', 'archive.csv', {
+        'fingerprint': checkpoint.job_fingerprint({'startTime': '2024-01-01T00:00:00Z'}),
+        'uploadId': uploadId,
+        'parts': [],
+        'bytesWritten': 0,
+        'position': 0
+    })
+
+    other = checkpoint.job_fingerprint({'startTime': '2024-02-01T00:00:00Z'})
+    assert checkpoint.load_checkpoint(fake_s3, 'bucket', 'archive.csv', other) is None
+
+
+def test_checkpoint_for_an_aborted_upload_is_ignored(fake_s3):
+    fingerprint = checkpoint.job_fingerprint({'destinationKey': 'archive.csv'})
+    checkpoint.save_checkpoint(fake_s3, 'bucket', 'archive.csv', {
+        'fingerprint': fingerprint,
+        'uploadId': 'gone',
+        'parts': [{'PartNumber': 1, 'ETag': '"x"'}],
+        'bytesWritten': 1,
+        'position': 0
+    })
+
+    assert checkpoint.load_checkpoint(fake_s3, 'bucket', 'archive.csv', fingerprint) is None
+
+
+def test_tuning_fields_do_not_change_the_fingerprint():
+    body = {'metricName': 'Invocations', 'startTime': '2024-01-01T00:00:00Z'}
+    assert checkpoint.job_fingerprint(body) == checkpoint.job_fingerprint(dict(body, maxConcurrency=4, maxTps=2))
@@ -0,0 +1,136 @@
+"""
+Unit tests for the concurrent CloudWatch fetch pool and its adaptive rate limiter.
+"""
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+from botocore.exceptions import ClientError
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../migrate_metric'))
+import fetch_pool
+import fetcher
+
+
+def throttling_error(code='Throttling'):
+    return ClientError({'Error': {'Code': code, 'Message': 'Rate exceeded'}}, 'GetMetricData')
+
+
+@pytest.fixture(autouse=True)
+def no_sleep():
+    with patch('fetch_pool.time.sleep'):
+        yield
+
+
+def test_throttle_halves_limits_and_success_restores_them():
+    limiter = fetch_pool.AdaptiveRateLimiter(maxConcurrency=8, maxTps=20)
+
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.concurrency == 4
+    assert limiter.tps == 10
+    assert limiter.throttles == 1
+
+    for _ in range(200):
+        limiter.acquire()
+        limiter.release(throttled=False)
+    assert limiter.concurrency == 8
+    assert limiter.tps == 20
+
+
+def test_call_retries_throttling_and_limit_exceeded():
+    limiter = fetch_pool.AdaptiveRateLimiter(maxConcurrency=2, maxTps=50)
+    fn = MagicMock(side_effect=[throttling_error(), throttling_error('LimitExceeded'), 'ok'])
+
+    assert limiter.call(fn, Namespace='AWS/Lambda') == 'ok'
+    assert fn.call_count == 3
+    assert limiter.throttles == 2
+
+
+def test_call_does_not_retry_other_client_errors():
+    limiter = fetch_pool.AdaptiveRateLimiter(maxConcurrency=2, maxTps=50)
+    error = ClientError({'Error': {'Code': 'InvalidParameterValue', 'Message': 'bad'}}, 'GetMetricData')
+    fn = MagicMock(side_effect=error)
+
+    with pytest.raises(ClientError):
+        limiter.call(fn)
+    assert fn.call_count == 1
+    assert limiter.concurrency == 2
+
+
+def test_call_retries_server_errors_without_backing_off():
+    limiter = fetch_pool.AdaptiveRateLimiter(maxConcurrency=2, maxTps=50)
+    unavailable = ClientError({'Error': {'Code': 'ServiceUnavailable', 'Message': 'try again'}}, 'GetMetricData')
+    badGateway = ClientError({'Error': {'Code': 'Unknown', 'Message': ''}, 'ResponseMetadata': {'HTTPStatusCode': 502}}, 'GetMetricData')
+    fn = MagicMock(side_effect=[unavailable, badGateway, 'ok'])
+
+    assert limiter.call(fn) == 'ok'
+    assert fn.call_count == 3
+    assert limiter.throttles == 0 and limiter.concurrency == 2
+
+
+def test_records_fetching_together_share_the_function_limits():
+    assert fetch_pool.budget_share(8, 10, 1) == (8, 10)
+    assert fetch_pool.budget_share(32, 50, 10) == (3, 5.0)
+    assert fetch_pool.budget_share(2, 1, 10) == (2, 1)
+    assert fetch_pool.budget_share(32, 50, 64) == (1, pytest.approx(50 / 64))
+
+
+def test_concurrency_never_exceeds_configured_maximum():
+    inFlight = []
+    peak = []
+    lock = threading.Lock()
+    release = threading.Event()
+
+    def slow_call(**kwargs):
+        with lock:
+            inFlight.append(1)
+            peak.append(len(inFlight))
+        release.wait(0.05)
+        with lock:
+            inFlight.pop()
+        return kwargs
+
+    with fetch_pool.FetchPool(maxConcurrency=3, maxTps=50) as pool:
+        futures = [pool.submit(pool.call, slow_call, n=i) for i in range(12)]
+        results = [future.result() for future in futures]
+
+    assert max(peak) <= 3
+    assert results[5] == {'n': 5}
+
+
+def test_job_queries_cover_all_list_pages_and_chunks_are_fetched_through_the_pool():
+    client = MagicMock()
+    metric = {'Namespace': 'AWS/Lambda', 'MetricName': 'Invocations', 'Dimensions': [{'Name': 'FunctionName', 'Value': 'a'}]}
+    extraDimensions = dict(metric, Dimensions=metric['Dimensions'] + [{'Name': 'Resource', 'Value': 'a:1'}])
+    client.list_metrics.side_effect = [
+        {'Metrics': [metric] * 300, 'NextToken': 'page-2'},
+        {'Metrics': [metric] * 100 + [extraDimensions]}
+    ]
+    client.get_metric_data.side_effect = lambda **kwargs: {
+        'MetricDataResults': [
+            {'Id': q['Id'], 'Timestamps': [kwargs['StartTime']], 'Values': [1.0]}
+            for q in kwargs['MetricDataQueries']
+        ]
+    }
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    end = datetime(2024, 1, 2, tzinfo=timezone.utc)
+
+    with fetch_pool.FetchPool(maxConcurrency=4, maxTps=50) as pool:
+        queries = fetcher.list_job_queries(
+            client, pool, 'AWS/Lambda', 'Invocations', [{'Name': 'FunctionName', 'Value': 'a'}], ['Sum', 'Average']
+        )
+        chunks = fetcher.plan_chunks(start, end, len(queries))
+        fetched = list(fetcher.fetch_chunks(client, pool, queries, chunks))
+
+    assert len(queries) == 800
+    assert client.list_metrics.call_args_list[1].kwargs['NextToken'] == 'page-2'
+    assert [(chunkStart, chunkEnd) for chunkStart, chunkEnd, _ in fetched] == chunks
+    assert client.get_metric_data.call_count == 2 * len(chunks)
+    for chunkStart, _, results in fetched:
+        assert len(results) == 800
+        assert list(results['q799'].timestamps) == [int(chunkStart.timestamp())]
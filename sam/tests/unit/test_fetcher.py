@@ -0,0 +1,100 @@
+"""
+Unit tests for the batched GetMetricData fetch engine in migrate_metric.
+"""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../migrate_metric'))
+import fetcher
+
+
+def make_metrics(count):
+    return [
+        {
+            'Namespace': 'AWS/Lambda',
+            'MetricName': 'Invocations',
+            'Dimensions': [{'Name': 'FunctionName', 'Value': f"fn-{i}"}]
+        }
+        for i in range(count)
+    ]
+
+
+def paginating_client(pages=2):
+    """Client that splits every batch into `pages` pages and echoes each query Id back"""
+    client = MagicMock()
+
+    def get_metric_data(**kwargs):
+        page = int(kwargs.get('NextToken', '0'))
+        response = {
+            'MetricDataResults': [
+                {
+                    'Id': query['Id'],
+                    'Timestamps': [datetime(2024, 1, 1, 0, page, tzinfo=timezone.utc)],
+                    'Values': [float(page)],
+                    'StatusCode': 'Complete' if page == pages - 1 else 'PartialData'
+                }
+                for query in kwargs['MetricDataQueries']
+            ]
+        }
+        if page < pages - 1:
+            response['NextToken'] = str(page + 1)
+        return response
+
+    client.get_metric_data.side_effect = get_metric_data
+    return client
+
+
+def test_queries_have_unique_ids_per_metric_and_stat():
+    queries = fetcher.build_metric_data_queries(make_metrics(3), ['Sum', 'Average'])
+
+    assert len(queries) == 6
+    assert len({q['Id'] for q in queries}) == 6
+    assert [q['MetricStat']['Stat'] for q in queries[:2]] == ['Sum', 'Average']
+
+
+def test_queries_are_packed_into_batches_of_500():
+    client = paginating_client(pages=1)
+    queries = fetcher.build_metric_data_queries(make_metrics(200), ['Sum', 'Average', 'Maximum'])
+
+    results = fetcher.fetch_metric_data(client, queries, datetime(2024, 1, 1), datetime(2024, 1, 2))
+
+    batchSizes = [len(call.kwargs['MetricDataQueries']) for call in client.get_metric_data.call_args_list]
+    assert batchSizes == [500, 100]
+    assert set(results.keys()) == {q['Id'] for q in queries}
+
+
+def test_next_token_is_followed_and_pages_are_concatenated():
+    client = paginating_client(pages=3)
+    queries = fetcher.build_metric_data_queries(make_metrics(2), ['Sum'])
+
+    results = fetcher.fetch_metric_data(client, queries, datetime(2024, 1, 1), datetime(2024, 1, 2))
+
+    assert client.get_metric_data.call_count == 3
+    assert 'NextToken' not in client.get_metric_data.call_args_list[0].kwargs
+    assert client.get_metric_data.call_args_list[2].kwargs['NextToken'] == '2'
+    for query in queries:
+        assert list(results[query['Id']].values) == [0.0, 1.0, 2.0]
+
+
+def test_chunks_cover_window_on_period_boundaries():
+    start = datetime(2024, 1, 1, 0, 0, 30, tzinfo=timezone.utc)
+    end = datetime(2024, 1, 31, tzinfo=timezone.utc)
+
+    chunks = fetcher.plan_chunks(start, end, queryCount=1000)
+
+    assert chunks[0][0] == start
+    assert chunks[-1][1] == end
+    for (_, previousEnd), (nextStart, _) in zip(chunks, chunks[1:]):
+        assert previousEnd == nextStart
+        assert int(nextStart.timestamp()) % 60 == 0
+    assert all(chunkEnd - chunkStart <= timedelta(seconds=60 * 302) for chunkStart, chunkEnd in chunks)
+
+
+def test_small_jobs_fetch_the_window_in_one_chunk():
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    end = datetime(2024, 1, 31, tzinfo=timezone.utc)
+
+    assert fetcher.plan_chunks(start, end, queryCount=2) == [(start, end)]
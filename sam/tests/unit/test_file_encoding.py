@@ -8,7 +8,7 @@ import sys
 import tempfile
 import pytest
 from unittest.mock import patch, MagicMock, mock_open
-from datetime import datetime
+from datetime import datetime, timezone
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
@@ -33,22 +33,26 @@ def mock_cloudwatch_client():
         ]
     }
     
-    # Mock get_metric_data response
-    mock_client.get_metric_data.return_value = {
-        'MetricDataResults': [
-            {
-                'Id': 'r1',
-                'Label': 'Invocations',
-                'Timestamps': [
-                    datetime(2024, 12, 17, 0, 0, 0),
-                    datetime(2024, 12, 17, 0, 1, 0),
-                    datetime(2024, 12, 17, 0, 2, 0)
-                ],
-                'Values': [10.0, 15.0, 20.0],
-                'StatusCode': 'Complete'
-            }
-        ]
-    }
+    # Mock get_metric_data response, echoing back one series per requested query Id
+    def get_metric_data(**kwargs):
+        return {
+            'MetricDataResults': [
+                {
+                    'Id': query['Id'],
+                    'Label': 'Invocations',
+                    'Timestamps': [
+                        datetime(2024, 12, 17, 0, 0, 0, tzinfo=timezone.utc),
+                        datetime(2024, 12, 17, 0, 1, 0, tzinfo=timezone.utc),
+                        datetime(2024, 12, 17, 0, 2, 0, tzinfo=timezone.utc)
+                    ],
+                    'Values': [10.0, 15.0, 20.0],
+                    'StatusCode': 'Complete'
+                }
+                for query in kwargs['MetricDataQueries']
+            ]
+        }
+
+    mock_client.get_metric_data.side_effect = get_metric_data
     
     return mock_client
 
@@ -57,7 +61,7 @@ def mock_cloudwatch_client():
 def mock_s3_client():
     """Mock S3 client."""
     mock_client = MagicMock()
-    mock_client.upload_file.return_value = None
+    mock_client.put_object.return_value = {}
     return mock_client
 
 
@@ -86,38 +90,32 @@ def valid_sqs_event():
 
 
 def test_csv_file_creation_with_ascii_data(mock_cloudwatch_client, mock_s3_client, valid_sqs_event):
-    """Test that CSV file is created correctly with ASCII data."""
+    """Test that the CSV is streamed straight to S3 without a temp file."""
     with patch('migrate_metric.app.metrics', mock_cloudwatch_client), \
          patch('migrate_metric.app.s3_client', mock_s3_client), \
          patch.dict(os.environ, {'ARCHIVED_METRICS_BUCKET_NAME': 'test-bucket'}):
         
         response = app.lambda_handler(valid_sqs_event, {})
         
-        # Verify S3 upload was called
-        assert mock_s3_client.upload_file.called
-        call_args = mock_s3_client.upload_file.call_args
+        # Small archives are written with a single PutObject
+        assert mock_s3_client.put_object.called
+        assert not mock_s3_client.upload_file.called
+        call_kwargs = mock_s3_client.put_object.call_args.kwargs
         
-        # Verify the file path and bucket
-        temp_file_path = call_args[0][0]
-        bucket_name = call_args[0][1]
-        s3_key = call_args[0][2]
-        
-        assert bucket_name == 'test-bucket'
-        assert s3_key == 'test-output.csv'
-        assert temp_file_path.startswith('/tmp/')  # nosec B108
-        assert temp_file_path.endswith('.csv')
+        assert call_kwargs['Bucket'] == 'test-bucket'
+        assert call_kwargs['Key'] == 'test-output.csv'
+        assert call_kwargs['Body'].decode('utf-8').startswith('timestamp,')
 
 
 def test_csv_file_content_structure(mock_cloudwatch_client, mock_s3_client, valid_sqs_event):
     """Test that CSV file has correct header and data structure."""
     captured_file_content = []
     
-    def capture_upload(file_path, bucket, key):
+    def capture_upload(**kwargs):
         """Capture file content during upload."""
-        with open(file_path, 'r') as f:
-            captured_file_content.append(f.read())
+        captured_file_content.append(kwargs['Body'].decode('utf-8'))
     
-    mock_s3_client.upload_file.side_effect = capture_upload
+    mock_s3_client.put_object.side_effect = capture_upload
     
     with patch('migrate_metric.app.metrics', mock_cloudwatch_client), \
          patch('migrate_metric.app.s3_client', mock_s3_client), \
@@ -173,59 +171,48 @@ def test_csv_file_with_special_characters():
             os.unlink(temp_path)
 
 
-def test_tempfile_cleanup_on_success(mock_cloudwatch_client, mock_s3_client, valid_sqs_event):
-    """Test that temporary file is cleaned up after successful upload."""
-    captured_file_path = []
-    
-    def capture_path(file_path, bucket, key):
-        captured_file_path.append(file_path)
-    
-    mock_s3_client.upload_file.side_effect = capture_path
+def test_csv_rows_are_time_ordered_with_one_column_per_stat(mock_cloudwatch_client, mock_s3_client, valid_sqs_event):
+    """Test that rows come out in ascending time order with a value for every stat."""
+    captured_file_content = []
+    mock_s3_client.put_object.side_effect = lambda **kwargs: captured_file_content.append(kwargs['Body'].decode('utf-8'))
     
     with patch('migrate_metric.app.metrics', mock_cloudwatch_client), \
          patch('migrate_metric.app.s3_client', mock_s3_client), \
          patch.dict(os.environ, {'ARCHIVED_METRICS_BUCKET_NAME': 'test-bucket'}):
         
-        response = app.lambda_handler(valid_sqs_event, {})
-        
-        # Verify file was cleaned up
-        assert len(captured_file_path) == 1
-        temp_file = captured_file_path[0]
-        assert not os.path.exists(temp_file), "Temporary file should be cleaned up"
+        app.lambda_handler(valid_sqs_event, {})
+    
+    lines = captured_file_content[0].strip().split('\n')
+    assert lines[0] == 'timestamp,TestInvocations-Sum,TestInvocations-Average'
+    assert lines[1:] == [
+        '2024-12-17T00:00:00+00:00,10.0,10.0',
+        '2024-12-17T00:01:00+00:00,15.0,15.0',
+        '2024-12-17T00:02:00+00:00,20.0,20.0'
+    ]
 
 
-def test_tempfile_cleanup_on_error(mock_cloudwatch_client, mock_s3_client, valid_sqs_event):
-    """Test that temporary file is cleaned up even when upload fails."""
-    captured_file_path = []
-    
-    def capture_and_fail(file_path, bucket, key):
-        captured_file_path.append(file_path)
-        raise Exception("S3 upload failed")
-    
-    mock_s3_client.upload_file.side_effect = capture_and_fail
+def test_upload_error_propagates(mock_cloudwatch_client, mock_s3_client, valid_sqs_event):
+    """Test that a failed upload fails the migration and reports the message for redelivery."""
+    mock_s3_client.put_object.side_effect = Exception("S3 upload failed")
     
     with patch('migrate_metric.app.metrics', mock_cloudwatch_client), \
          patch('migrate_metric.app.s3_client', mock_s3_client), \
          patch.dict(os.environ, {'ARCHIVED_METRICS_BUCKET_NAME': 'test-bucket'}):
         
-        with pytest.raises(Exception):
-            app.lambda_handler(valid_sqs_event, {})
+        response = app.lambda_handler(valid_sqs_event, {})
         
-        # Verify file was cleaned up even after error
-        assert len(captured_file_path) == 1
-        temp_file = captured_file_path[0]
-        assert not os.path.exists(temp_file), "Temporary file should be cleaned up even on error"
+        assert response['batchItemFailures'] == [{'itemIdentifier': 'test-message-id'}]
+        assert mock_s3_client.put_object.call_count == 1
 
 
 def test_multiple_stats_in_csv_header(mock_cloudwatch_client, mock_s3_client, valid_sqs_event):
     """Test that CSV header includes all requested CloudWatch stats."""
     captured_file_content = []
     
-    def capture_upload(file_path, bucket, key):
-        with open(file_path, 'r') as f:
-            captured_file_content.append(f.read())
+    def capture_upload(**kwargs):
+        captured_file_content.append(kwargs['Body'].decode('utf-8'))
     
-    mock_s3_client.upload_file.side_effect = capture_upload
+    mock_s3_client.put_object.side_effect = capture_upload
     
     with patch('migrate_metric.app.metrics', mock_cloudwatch_client), \
          patch('migrate_metric.app.s3_client', mock_s3_client), \
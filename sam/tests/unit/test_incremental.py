@@ -0,0 +1,82 @@
+"""
+Unit tests for incremental (append) migrations in migrate_metric.
+"""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+import incremental
+from s3_writer import MIN_PART_SIZE, MultipartUploadWriter
+
+
+@pytest.fixture
+def metric_step():
+    return timedelta(hours=1)
+
+
+@pytest.fixture
+def migration_body(migration_body):
+    return dict(migration_body, incremental=True)
+
+
+def test_incremental_run_only_fetches_and_appends_newer_data(fake_s3, cloudwatch, migrate):
+    migrate(startTime='2024-01-01T00:00:00Z', endTime='2024-01-01T02:00:00Z')
+    assert fake_s3.metadata['archive.csv']['archived-through'] == '2024-01-01T02:00:00Z'
+
+    cloudwatch.get_metric_data.reset_mock()
+    migrate(startTime='2024-01-01T00:00:00Z', endTime='2024-01-01T03:00:00Z')
+
+    fetchedFrom = min(call.kwargs['StartTime'] for call in cloudwatch.get_metric_data.call_args_list)
+    assert fetchedFrom == datetime(2024, 1, 1, 2, tzinfo=timezone.utc)
+    assert fake_s3.objects['archive.csv'].decode('utf-8') == (
+        'timestamp,m-Sum\n'
+        '2024-01-01T00:00:00+00:00,1.0\n'
+        '2024-01-01T01:00:00+00:00,1.0\n'
+        '2024-01-01T02:00:00+00:00,1.0\n'
+    )
+    assert fake_s3.metadata['archive.csv']['archived-through'] == '2024-01-01T03:00:00Z'
+
+
+def test_incremental_run_with_nothing_new_does_not_fetch(cloudwatch, migrate):
+    migrate(startTime='2024-01-01T00:00:00Z', endTime='2024-01-01T02:00:00Z')
+    cloudwatch.get_metric_data.reset_mock()
+    cloudwatch.list_metrics.reset_mock()
+
+    migrate(startTime='2024-01-01T00:00:00Z', endTime='2024-01-01T02:00:00Z')
+
+    assert not cloudwatch.list_metrics.called
+    assert not cloudwatch.get_metric_data.called
+
+
+def test_objects_without_metadata_resume_after_their_last_row(fake_s3):
+    fake_s3.put_object(Bucket='bucket', Key='archive.csv', Body=b'timestamp,m-Sum\n2024-01-01T05:00:00+00:00,1.0\n')
+
+    state = incremental.archived_state(fake_s3, 'bucket', 'archive.csv')
+
+    assert state['header'] == 'timestamp,m-Sum'
+    assert state['archivedThrough'] == datetime(2024, 1, 1, 5, 0, 1, tzinfo=timezone.utc)
+
+
+def test_appending_with_different_columns_fails(fake_s3, migrate):
+    fake_s3.put_object(Bucket='bucket', Key='archive.csv', Body=b'timestamp,other-Sum\n2024-01-01T00:00:00+00:00,1.0\n')
+
+    assert migrate(startTime='2024-01-01T00:00:00Z', endTime='2024-01-01T03:00:00Z') == ['m1']
+
+    assert fake_s3.objects['archive.csv'] == b'timestamp,other-Sum\n2024-01-01T00:00:00+00:00,1.0\n'
+
+
+def test_large_archives_are_copied_server_side(fake_s3):
+    existing = b'timestamp,m-Sum\n' + b'x' * MIN_PART_SIZE + b'\n'
+    fake_s3.put_object(Bucket='bucket', Key='archive.csv', Body=existing)
+    state = incremental.archived_state(fake_s3, 'bucket', 'archive.csv')
+    fake_s3.get_object = MagicMock(side_effect=AssertionError("large archives must not be downloaded"))
+
+    with MultipartUploadWriter(fake_s3, 'bucket', 'archive.csv') as writer:
+        incremental.carry_over(fake_s3, writer, 'bucket', 'archive.csv', state)
+        writer.write('2024-01-02T00:00:00+00:00,1.0\n')
+
+    assert fake_s3.objects['archive.csv'] == existing + b'2024-01-02T00:00:00+00:00,1.0\n'
@@ -0,0 +1,186 @@
+"""
+Unit tests for key patterns that read several archives in one timeshift query.
+"""
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+os.environ.setdefault('S3_CSV_LOADING_LAMBDA_ARN', 'arn:aws:lambda:us-east-1:123456789012:function:s3-csv')
+import timeshift.app as timeshift
+from key_match import is_key_pattern, list_matching_keys, literal_prefix
+
+START = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+
+
+pytestmark = pytest.mark.usefixtures('no_result_cache')
+
+
+def make_archive(value, rows=10):
+    lines = ['timestamp,Sum\n']
+    for n in range(rows):
+        lines.append(f"{datetime.fromtimestamp(START + 60 * n, tz=timezone.utc).isoformat()},{float(value)}\n")
+    return ''.join(lines).encode('utf-8')
+
+
+def pattern_event(key, duration='P1D'):
+    return {
+        'EventType': 'GetMetricData',
+        'GetMetricDataRequest': {
+            'Arguments': ['bucket', key, duration],
+            'StartTime': START + 86400,
+            'EndTime': START + 86400 + 600
+        }
+    }
+
+
+@pytest.mark.parametrize('key, expected', [
+    ('hosts/a.csv', False),
+    ('hosts/*.csv', True),
+    ('hosts/host-?.csv', True),
+    ('hosts/[ab].csv', True),
+    ('hosts/', True)
+])
+def test_is_key_pattern(key, expected):
+    assert is_key_pattern(key) is expected
+
+
+def test_literal_prefix_stops_at_the_first_wildcard():
+    assert literal_prefix('hosts/web-*/cpu?.csv') == 'hosts/web-'
+    assert literal_prefix('hosts/a.csv') == 'hosts/a.csv'
+
+
+def test_auxiliary_objects_are_not_archives(fake_s3):
+    keys = [
+        'hosts/a.csv',
+        'hosts/a.csv.rollups/300',
+        'hosts/a.csv.slices/job/00000.csv',
+        'hosts/a.csv.checkpoint.json',
+        'hosts/b/_index.json',
+        'hosts/b/2024-01-01.csv'
+    ]
+    for key in keys:
+        fake_s3.objects[key] = b''
+
+    assert list_matching_keys(fake_s3, 'bucket', 'hosts/', 10) == ['hosts/a.csv', 'hosts/b']
+
+
+def test_matching_keys_are_listed_under_the_literal_prefix(fake_s3):
+    for key in ['hosts/web-1.csv', 'hosts/web-2.csv', 'hosts/db-1.csv', 'other/web-3.csv']:
+        fake_s3.objects[key] = make_archive(1)
+    fake_s3.list_objects_v2 = MagicMock(wraps=fake_s3.list_objects_v2)
+
+    assert list_matching_keys(fake_s3, 'bucket', 'hosts/web-*', 10) == ['hosts/web-1.csv', 'hosts/web-2.csv']
+    assert fake_s3.list_objects_v2.call_args.kwargs['Prefix'] == 'hosts/web-'
+    assert list_matching_keys(fake_s3, 'bucket', 'hosts/', 10) == ['hosts/db-1.csv', 'hosts/web-1.csv', 'hosts/web-2.csv']
+
+
+def test_listing_follows_continuation_tokens():
+    client = MagicMock()
+    client.list_objects_v2.side_effect = [
+        {'Contents': [{'Key': 'hosts/a.csv'}], 'IsTruncated': True, 'NextContinuationToken': 'next'},
+        {'Contents': [{'Key': 'hosts/b.csv'}], 'IsTruncated': False}
+    ]
+
+    assert list_matching_keys(client, 'bucket', 'hosts/*', 10) == ['hosts/a.csv', 'hosts/b.csv']
+    assert client.list_objects_v2.call_args.kwargs['ContinuationToken'] == 'next'
+
+
+def test_too_many_matches_are_refused(fake_s3):
+    for n in range(3):
+        fake_s3.objects[f"hosts/{n}.csv"] = make_archive(n)
+
+    with pytest.raises(ValueError):
+        list_matching_keys(fake_s3, 'bucket', 'hosts/*', 2)
+
+
+def test_listing_stops_once_too_many_archives_match():
+    client = MagicMock()
+    client.list_objects_v2.side_effect = [
+        {'Contents': [{'Key': 'hosts/a/2024-01-01.csv'}, {'Key': 'hosts/a/2024-01-02.csv'}, {'Key': 'hosts/a/_index.json'}],
+         'IsTruncated': True, 'NextContinuationToken': 'p2'},
+        {'Contents': [{'Key': 'hosts/b.csv'}, {'Key': 'hosts/c/2024-01-01.csv'}, {'Key': 'hosts/c/2024-01-02.csv'}],
+         'IsTruncated': True, 'NextContinuationToken': 'p3'},
+        {'Contents': [{'Key': 'hosts/c/_index.json'}, {'Key': 'hosts/d.csv'}], 'IsTruncated': True, 'NextContinuationToken': 'p4'},
+        {'Contents': [{'Key': 'hosts/e.csv'}], 'IsTruncated': False}
+    ]
+
+    # Partitions of hosts/c only count as one archive once its index is listed
+    with pytest.raises(ValueError, match='More than 2 archives'):
+        list_matching_keys(client, 'bucket', 'hosts/', 2)
+    assert client.list_objects_v2.call_count == 3
+
+
+def test_patterns_starting_with_a_wildcard_are_refused_without_listing():
+    client = MagicMock()
+
+    with pytest.raises(ValueError, match='starts with a wildcard'):
+        list_matching_keys(client, 'bucket', '*/cpu.csv', 10)
+    client.list_objects_v2.assert_not_called()
+
+
+def test_pattern_query_returns_one_shifted_result_per_key(fake_s3):
+    for n in range(3):
+        fake_s3.objects[f"hosts/web-{n}.csv"] = make_archive(n)
+    client = MagicMock()
+
+    with patch('timeshift.app.READER_MODE', 'native'), \
+         patch('timeshift.app.s3_client', fake_s3), \
+         patch('timeshift.app.lambda_client', client):
+        response = timeshift.lambda_handler(pattern_event('hosts/web-*.csv'), {})
+
+    client.invoke.assert_not_called()
+    results = response['MetricDataResults']
+    assert [result['Label'] for result in results] == ['Sum hosts/web-0.csv', 'Sum hosts/web-1.csv', 'Sum hosts/web-2.csv']
+    assert [result['Values'][0] for result in results] == [0.0, 1.0, 2.0]
+    assert all(result['Timestamps'] == [START + 86400 + 60 * n for n in range(10)] for result in results)
+
+
+def test_pattern_query_through_the_source_lambda_sends_one_key_per_invocation(fake_s3):
+    for n in range(2):
+        fake_s3.objects[f"hosts/{n}.csv"] = make_archive(n)
+    client = MagicMock()
+    payload = json.dumps({'MetricDataResults': [{'Id': 'm', 'Label': 'Sum', 'Timestamps': [START], 'Values': [1.0]}]}).encode('utf-8')
+    client.invoke.side_effect = lambda **kwargs: {'StatusCode': 200, 'Payload': MagicMock(read=lambda: payload)}
+
+    with patch('timeshift.app.s3_client', fake_s3), \
+         patch('timeshift.app.lambda_client', client):
+        response = timeshift.lambda_handler(pattern_event('hosts/*', 'PT0S'), {})
+
+    forwarded = sorted(json.loads(call.kwargs['Payload'])['GetMetricDataRequest']['Arguments'][1] for call in client.invoke.call_args_list)
+    assert forwarded == ['hosts/0.csv', 'hosts/1.csv']
+    assert [(result['Id'], result['Label']) for result in response['MetricDataResults']] == [
+        ('m_0', 'Sum hosts/0.csv'),
+        ('m_1', 'Sum hosts/1.csv')
+    ]
+
+
+def test_a_key_that_fails_does_not_fail_the_others(fake_s3):
+    fake_s3.objects['hosts/good.csv'] = make_archive(1)
+    fake_s3.objects['hosts/bad.csv'] = b'not,an,archive\n'
+
+    with patch('timeshift.app.READER_MODE', 'native'), \
+         patch('timeshift.app.target_lambda', None), \
+         patch('timeshift.app.s3_client', fake_s3):
+        response = timeshift.lambda_handler(pattern_event('hosts/*'), {})
+
+    statuses = {result['Label']: result['StatusCode'] for result in response['MetricDataResults']}
+    assert statuses == {'Error hosts/bad.csv': 'InternalError', 'Sum hosts/good.csv': 'Complete'}
+
+
+def test_keys_share_the_point_budget_of_the_query(fake_s3):
+    for n in range(3):
+        fake_s3.objects[f"hosts/{n}.csv"] = make_archive(n)
+
+    with patch('timeshift.app.READER_MODE', 'native'), \
+         patch('timeshift.app.MAX_QUERY_POINTS', 25), \
+         patch('timeshift.app.s3_client', fake_s3):
+        response = timeshift.lambda_handler(pattern_event('hosts/*'), {})
+
+    # Three archives of ten points each: the query fails as a whole, not key by key
+    assert response['statusCode'] == 500
+    assert 'more than 25 points' in response['body']
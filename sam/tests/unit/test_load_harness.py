@@ -0,0 +1,76 @@
+"""
+Unit tests for the local end-to-end load harness.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+SAM_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+sys.path.insert(0, os.path.join(SAM_DIR, 'benchmarks'))
+import load
+from fakes import FakeSqs
+
+
+def test_constant_rate_is_spread_evenly():
+    offsets = list(load.arrival_offsets([(10, 5)], startRate=5))
+
+    assert len(offsets) == 50
+    assert offsets[:3] == pytest.approx([0.0, 0.2, 0.4])
+
+
+def test_ramps_start_as_many_iterations_as_their_integral():
+    # 0 -> 20/s over 10 s, then 20 -> 0/s over 10 s: 100 iterations each
+    offsets = list(load.arrival_offsets([(10, 20), (10, 0)], startRate=0))
+
+    assert len([offset for offset in offsets if offset <= 10]) == pytest.approx(100, abs=1)
+    assert len(offsets) == pytest.approx(200, abs=1)
+    assert offsets == sorted(offsets)
+    assert len(list(load.arrival_offsets([(10, 20), (10, 0)], startRate=0, timeScale=0.5, rateScale=0.5))) == pytest.approx(50, abs=1)
+
+
+def test_the_k6_script_profile_is_replayed():
+    startRate, stages = load.k6_profile(load.K6_SCRIPT)
+
+    assert startRate == 10
+    assert stages[:3] == [(60, 1), (120, 20), (180, 40)]
+    assert max(target for _, target in stages) == 120
+    assert load.parse_stages('30s:10,1m30s:40') == [(30, 10), (90, 40)]
+    with pytest.raises(ValueError):
+        load.parse_duration('5 minutes')
+
+
+def test_failed_messages_are_redelivered_then_dead_lettered():
+    sqs = FakeSqs(maxReceiveCount=2)
+    sqs.send_message_batch(QueueUrl='queue', Entries=[{'Id': str(n), 'MessageBody': f"m{n}"} for n in range(3)])
+
+    first = sqs.receive(batchSize=2, waitSeconds=0)
+    for message in first:
+        sqs.release(message['messageId'])
+    sqs.delete(sqs.receive(batchSize=1, waitSeconds=0)[0]['messageId'])
+    again = sqs.receive(batchSize=10, waitSeconds=0)
+    for message in again:
+        sqs.release(message['messageId'])
+
+    assert [message['body'] for message in first] == ['m0', 'm1']
+    assert [message['body'] for message in again] == ['m0', 'm1']
+    assert [message['body'] for message in sqs.deadLetters] == ['m0', 'm1']
+    assert sqs.depth() == 0 and sqs.sent == 3
+
+
+@pytest.mark.parametrize('transport', [[], ['--http']])
+def test_a_short_profile_runs_through_the_whole_pipeline(tmp_path, transport):
+    results = tmp_path / 'results.json'
+    completed = subprocess.run([sys.executable, os.path.join(SAM_DIR, 'benchmarks', 'load.py'), '--stages', '2s:10', '--start-rate', '10',
+                                '--points', '120', '--json', str(results)] + transport,
+                               capture_output=True, text=True, timeout=120)
+
+    assert completed.returncode == 0, completed.stderr
+    summary = json.loads(results.read_text())
+    assert summary['requests'] == 20 and summary['dropped'] == 0 and summary['deadLetters'] == 0
+    for stage in load.STAGE_NAMES:
+        assert summary['stages'][stage]['count'] == (summary['stages']['migrate']['count'] if stage == 'migrate' else 20)
+        assert summary['stages'][stage]['errors'] == 0
+    assert 'end-to-end' in completed.stdout
@@ -0,0 +1,59 @@
+"""
+Unit tests for the array-backed k-way merge that builds archive CSV rows.
+"""
+import os
+import sys
+from datetime import datetime, timezone
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../migrate_metric'))
+from merge import Series, format_rows, merge_series
+
+T0 = 1704067200  # 2024-01-01T00:00:00Z
+
+
+def make_series(points):
+    series = Series()
+    series.extend(
+        [datetime.fromtimestamp(timestamp, tz=timezone.utc) for timestamp, _ in points],
+        [value for _, value in points]
+    )
+    return series
+
+
+def test_aligned_series_are_zipped_into_rows():
+    sums = make_series([(T0, 1.0), (T0 + 60, 2.0)])
+    averages = make_series([(T0, 0.5), (T0 + 60, 0.25)])
+
+    assert format_rows([sums, averages], T0, T0 + 3600) == (
+        '2024-01-01T00:00:00+00:00,1.0,0.5\n'
+        '2024-01-01T00:01:00+00:00,2.0,0.25\n'
+    )
+
+
+def test_gaps_are_outer_joined_as_empty_cells():
+    sums = make_series([(T0, 1.0), (T0 + 120, 3.0)])
+    maximums = make_series([(T0 + 60, 7.0), (T0 + 120, 9.0)])
+
+    assert list(merge_series([sums, maximums], T0, T0 + 3600)) == [
+        (T0, [1.0, None]),
+        (T0 + 60, [None, 7.0]),
+        (T0 + 120, [3.0, 9.0])
+    ]
+    assert format_rows([sums, maximums], T0, T0 + 3600).splitlines()[1] == '2024-01-01T00:01:00+00:00,,7.0'
+
+
+def test_rows_are_limited_to_the_window():
+    sums = make_series([(T0 + 60 * i, float(i)) for i in range(10)])
+
+    rows = format_rows([sums], T0 + 120, T0 + 300).splitlines()
+
+    assert [row.split(',')[1] for row in rows] == ['2.0', '3.0', '4.0']
+
+
+def test_series_store_points_in_compact_arrays():
+    series = make_series([(T0, 1.5)])
+
+    assert series.timestamps.typecode == 'q'
+    assert series.values.typecode == 'd'
+    assert len(series) == 1
@@ -0,0 +1,175 @@
+"""
+Unit tests for paging timeshift responses and following source pages.
+"""
+import io
+import json
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+os.environ.setdefault('S3_CSV_LOADING_LAMBDA_ARN', 'arn:aws:lambda:us-east-1:123456789012:function:s3-csv')
+import timeshift.app as timeshift
+from pages import decode_token, encode_token, page_results, request_fingerprint
+from result_cache import ResultCache
+
+START = 1704067200
+
+
+pytestmark = pytest.mark.usefixtures('no_result_cache')
+
+
+def series(label, count):
+    return {'Id': label.lower(), 'Label': label, 'StatusCode': 'Complete',
+            'Timestamps': [START + 60 * n for n in range(count)], 'Values': [float(n) for n in range(count)]}
+
+
+def make_event(nextToken=None):
+    request = {'Arguments': ['bucket', 'key.csv', 'PT0S'], 'StartTime': START, 'EndTime': START + 86400}
+    if nextToken is not None:
+        request['NextToken'] = nextToken
+    return {'EventType': 'GetMetricData', 'GetMetricDataRequest': request}
+
+
+def source_client(*payloads):
+    client = MagicMock()
+    client.invoke.side_effect = [
+        {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(payload).encode('utf-8'))} for payload in payloads
+    ]
+    return client
+
+
+def test_results_that_fit_are_returned_whole():
+    results = [series('A', 3), series('B', 2)]
+
+    page, nextPosition = page_results(results, 10)
+
+    assert page == results and nextPosition is None
+
+
+def test_a_result_is_split_across_pages():
+    results = [series('A', 3), series('B', 5)]
+
+    first, position = page_results(results, 5)
+    second, position2 = page_results(results, 5, *position)
+
+    assert [(result['Label'], len(result['Timestamps']), result['StatusCode']) for result in first] == [('A', 3, 'Complete'), ('B', 2, 'PartialData')]
+    assert position == (1, 2) and position2 is None
+    assert second[0]['Values'] == [2.0, 3.0, 4.0] and second[0]['StatusCode'] == 'Complete'
+    assert len(results[1]['Timestamps']) == 5
+
+
+def test_tokens_only_resume_the_query_they_were_issued_for():
+    fingerprint = request_fingerprint(['bucket', 'key', 'P1D'], START, START + 60, 60)
+    token = encode_token(fingerprint, 2, 7, 'session')
+
+    assert decode_token(token, fingerprint) == (2, 7, 'session')
+    with pytest.raises(ValueError):
+        decode_token(token, request_fingerprint(['bucket', 'key', 'P2D'], START, START + 60, 60))
+    with pytest.raises(ValueError):
+        decode_token('not a token', fingerprint)
+
+
+def test_large_responses_are_paged_with_next_token():
+    payload = {'MetricDataResults': [series('A', 6), series('B', 6)]}
+    pages = []
+    nextToken = None
+    with patch('timeshift.app.RESPONSE_PAGE_POINTS', 5):
+        while True:
+            with patch('timeshift.app.lambda_client', source_client(payload)):
+                response = timeshift.lambda_handler(make_event(nextToken), {})
+            pages.append(response['MetricDataResults'])
+            nextToken = response.get('NextToken')
+            if nextToken is None:
+                break
+
+    assert [[len(result['Timestamps']) for result in page] for page in pages] == [[5], [1, 4], [2]]
+    values = {}
+    for page in pages:
+        for result in page:
+            values.setdefault(result['Label'], []).extend(result['Values'])
+    assert values == {'A': [float(n) for n in range(6)], 'B': [float(n) for n in range(6)]}
+
+
+def test_later_pages_are_cut_from_the_results_of_the_first():
+    # Partial results are never put in the result cache, so without the paging session
+    # every page would invoke the source and shift and resample all of it again
+    payload = {'MetricDataResults': [dict(series('A', 6), StatusCode='PartialData'), series('B', 6)]}
+    client = source_client(payload)
+    pages = []
+    nextToken = None
+    with patch('timeshift.app.RESPONSE_PAGE_POINTS', 5), patch('timeshift.app.lambda_client', client):
+        while True:
+            response = timeshift.lambda_handler(make_event(nextToken), {})
+            pages.append(response['MetricDataResults'])
+            nextToken = response.get('NextToken')
+            if nextToken is None:
+                break
+
+    assert client.invoke.call_count == 1
+    assert [[len(result['Timestamps']) for result in page] for page in pages] == [[5], [1, 4], [2]]
+
+
+def test_a_container_without_the_session_answers_the_query_again():
+    payload = {'MetricDataResults': [series('A', 6), series('B', 6)]}
+    with patch('timeshift.app.RESPONSE_PAGE_POINTS', 5):
+        with patch('timeshift.app.lambda_client', source_client(payload)):
+            nextToken = timeshift.lambda_handler(make_event(), {})['NextToken']
+        with patch('timeshift.app.page_sessions', ResultCache(4)), \
+             patch('timeshift.app.lambda_client', source_client(payload)) as client:
+            response = timeshift.lambda_handler(make_event(nextToken), {})
+
+    client.invoke.assert_called_once()
+    assert [len(result['Timestamps']) for result in response['MetricDataResults']] == [1, 4]
+    # The rebuilt results are kept under the same session for the pages after this one
+    fingerprint = request_fingerprint(['bucket', 'key.csv', 'PT0S'], START, START + 86400, None)
+    assert decode_token(response['NextToken'], fingerprint)[2] == decode_token(nextToken, fingerprint)[2]
+
+
+def test_a_foreign_next_token_is_rejected():
+    with patch('timeshift.app.lambda_client', source_client({'MetricDataResults': []})) as client:
+        response = timeshift.lambda_handler(make_event('bogus'), {})
+
+    assert response['statusCode'] == 500
+    client.invoke.assert_not_called()
+
+
+def test_source_pages_are_followed_and_merged():
+    first = {'MetricDataResults': [dict(series('A', 2), StatusCode='PartialData')], 'NextToken': 'source-2'}
+    second = {'MetricDataResults': [{'Id': 'a', 'Label': 'A', 'StatusCode': 'Complete', 'Timestamps': [START + 120], 'Values': [2.0]}]}
+    client = source_client(first, second)
+
+    with patch('timeshift.app.lambda_client', client):
+        response = timeshift.lambda_handler(make_event(), {})
+
+    requests = [json.loads(call.kwargs['Payload'])['GetMetricDataRequest'] for call in client.invoke.call_args_list]
+    assert 'NextToken' not in requests[0] and requests[1]['NextToken'] == 'source-2'
+    assert response['MetricDataResults'] == [series('A', 3)]
+    assert 'NextToken' not in response
+
+
+def test_source_pages_past_the_point_budget_fail_the_query():
+    first = {'MetricDataResults': [dict(series('A', 4), StatusCode='PartialData')], 'NextToken': 'source-2'}
+    second = {'MetricDataResults': [series('A', 4)], 'NextToken': 'source-3'}
+    client = source_client(first, second, {'MetricDataResults': []})
+
+    with patch('timeshift.app.MAX_QUERY_POINTS', 6), patch('timeshift.app.lambda_client', client):
+        response = timeshift.lambda_handler(make_event(), {})
+
+    # The third page is never asked for once the second takes the query past its budget
+    assert client.invoke.call_count == 2
+    assert response['statusCode'] == 500
+    assert 'more than 6 points' in response['body']
+
+
+def test_the_point_budget_is_shared_by_the_durations():
+    event = make_event()
+    event['GetMetricDataRequest']['Arguments'][2] = 'PT0S,PT1M'
+
+    with patch('timeshift.app.MAX_QUERY_POINTS', 10), \
+         patch('timeshift.app.lambda_client', source_client({'MetricDataResults': [series('A', 6)]})):
+        response = timeshift.lambda_handler(event, {})
+
+    assert 'more than 5 points' in response['body']
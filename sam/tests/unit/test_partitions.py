@@ -0,0 +1,113 @@
+"""
+Unit tests for time-partitioned archives: writing them in migrate_metric and
+reading only the overlapping partitions in the timeshift Lambda.
+"""
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+from archive_reader import read_window
+from merge import Series
+from partitions import PartitionWriter, partition_key, partitioned_state
+
+START = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+
+
+@pytest.fixture
+def metric_step():
+    return timedelta(hours=1)
+
+
+@pytest.fixture
+def metric_value():
+    return lambda query, timestamp: float(timestamp.hour)
+
+
+@pytest.fixture
+def migration_body(migration_body):
+    return dict(migration_body, destinationKey='archive', period=3600, partitionBy='day')
+
+
+def test_partition_keys_are_named_after_their_start():
+    assert partition_key('archive/', START, 'day') == 'archive/2024-01-01.csv'
+    assert partition_key('archive', START + 5 * 3600, 'hour') == 'archive/2024-01-01T05.csv'
+
+
+def test_migration_writes_one_object_per_day_and_an_index(fake_s3, migrate):
+    assert migrate(startTime='2024-01-01T00:00:00Z', endTime='2024-01-03T12:00:00Z') == []
+
+    assert 'archive' not in fake_s3.objects
+    index = json.loads(fake_s3.objects['archive/_index.json'])
+    assert index['partitionBy'] == 'day'
+    assert index['header'] == 'timestamp,m-Sum'
+    assert index['archivedThrough'] == '2024-01-03T12:00:00Z'
+    assert [entry['key'] for entry in index['partitions']] == ['archive/2024-01-01.csv', 'archive/2024-01-02.csv', 'archive/2024-01-03.csv']
+    assert [entry['rows'] for entry in index['partitions']] == [24, 24, 12]
+    for entry in index['partitions']:
+        body = fake_s3.objects[entry['key']]
+        assert entry['bytes'] == len(body)
+        assert body.startswith(b'timestamp,m-Sum\n2024-')
+    assert index['partitions'][1]['start'] == '2024-01-02T00:00:00Z'
+    assert index['partitions'][1]['end'] == '2024-01-03T00:00:00Z'
+
+
+def test_incremental_run_appends_to_the_open_partition(fake_s3, cloudwatch, migrate):
+    migrate(startTime='2024-01-01T00:00:00Z', endTime='2024-01-01T12:00:00Z', incremental=True)
+    cloudwatch.get_metric_data.reset_mock()
+
+    assert migrate(startTime='2024-01-01T00:00:00Z', endTime='2024-01-02T06:00:00Z', incremental=True) == []
+
+    fetchedFrom = min(call.kwargs['StartTime'] for call in cloudwatch.get_metric_data.call_args_list)
+    assert fetchedFrom == datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+    state = partitioned_state(fake_s3, 'bucket', 'archive')
+    assert state['archivedThrough'] == datetime(2024, 1, 2, 6, tzinfo=timezone.utc)
+    assert [entry['rows'] for entry in state['partitions']] == [24, 6]
+    assert fake_s3.objects['archive/2024-01-01.csv'].count(b'\n') == 25
+
+
+def test_incremental_run_must_keep_the_partitioning(migrate):
+    migrate(startTime='2024-01-01T00:00:00Z', endTime='2024-01-01T12:00:00Z', incremental=True)
+
+    assert migrate(startTime='2024-01-01T00:00:00Z', endTime='2024-01-02T00:00:00Z', incremental=True, partitionBy='hour') == ['m1']
+
+
+def test_writer_skips_empty_partitions(fake_s3):
+    series = Series()
+    series.extend([datetime.fromtimestamp(START, tz=timezone.utc), datetime.fromtimestamp(START + 2 * 3600 + 60, tz=timezone.utc)], [1.0, 2.0])
+    writer = PartitionWriter(fake_s3, 'bucket', 'archive', 'hour', 'timestamp,a')
+    writer.write_rows([series], START, START + 3 * 3600)
+    index = writer.close(datetime.fromtimestamp(START + 3 * 3600, tz=timezone.utc))
+
+    assert [entry['key'] for entry in index['partitions']] == ['archive/2024-01-01T00.csv', 'archive/2024-01-01T02.csv']
+
+
+def test_reader_fetches_only_overlapping_partitions(fake_s3, migrate):
+    migrate(startTime='2024-01-01T00:00:00Z', endTime='2024-01-11T00:00:00Z')
+    fake_s3.calls.clear()
+
+    # From 18:00 on Jan 4th to 06:00 on Jan 6th: the end of one day, all of the next and the start of a third
+    results = read_window(fake_s3, 'bucket', 'archive', START + (3 * 24 + 18) * 3600, START + (5 * 24 + 6) * 3600)
+
+    assert [result['Label'] for result in results] == ['m-Sum']
+    assert results[0]['Timestamps'] == [START + hour * 3600 for hour in range(3 * 24 + 18, 5 * 24 + 6)]
+    assert results[0]['Values'][:6] == [18.0, 19.0, 20.0, 21.0, 22.0, 23.0]
+    readKeys = {key for _, key in fake_s3.calls}
+    assert readKeys == {'archive', 'archive/_index.json', 'archive/2024-01-04.csv', 'archive/2024-01-05.csv', 'archive/2024-01-06.csv'}
+
+
+def test_reader_selects_columns_of_partitioned_archives(fake_s3, migrate):
+    migrate(startTime='2024-01-01T00:00:00Z', endTime='2024-01-02T00:00:00Z')
+
+    results = read_window(fake_s3, 'bucket', 'archive', START, START + 3600, ['m-Sum'])
+    assert results[0]['Values'] == [0.0]
+    with pytest.raises(ValueError):
+        read_window(fake_s3, 'bucket', 'archive', START, START + 3600, ['m-Maximum'])
+
+
+def test_reader_raises_when_there_is_neither_an_object_nor_an_index(fake_s3):
+    with pytest.raises(Exception, match='NoSuchKey'):
+        read_window(fake_s3, 'bucket', 'missing', START, START + 3600)
@@ -0,0 +1,81 @@
+"""
+Unit tests for retention-tier period selection in migrate_metric.
+"""
+import json
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+import migrate_metric.app as app
+import periods
+
+NOW = datetime(2024, 12, 1, 12, 34, tzinfo=timezone.utc)
+
+
+def test_fixed_period_is_a_single_segment():
+    start, end = NOW - timedelta(days=100), NOW
+    assert periods.plan_periods(start, end, 300, now=NOW) == [(start, end, 300)]
+
+
+def test_auto_period_follows_retention_tiers():
+    start, end = NOW - timedelta(days=100), NOW
+
+    segments = periods.plan_periods(start, end, 'auto', now=NOW)
+
+    assert [period for _, _, period in segments] == [3600, 300, 60]
+    assert segments[0][0] == start and segments[-1][1] == end
+    for (_, previousEnd, previousPeriod), (nextStart, _, _) in zip(segments, segments[1:]):
+        assert previousEnd == nextStart
+        assert int(nextStart.timestamp()) % previousPeriod == 0
+    # Each coarser tier reaches a little past where the finer tier's retention ends
+    assert NOW - timedelta(days=63) < segments[1][0] <= NOW - timedelta(days=63) + timedelta(hours=2)
+    assert NOW - timedelta(days=15) < segments[2][0] <= NOW - timedelta(days=15) + timedelta(hours=2)
+
+
+def test_recent_windows_stay_at_one_minute():
+    start, end = NOW - timedelta(days=1), NOW
+    assert periods.plan_periods(start, end, 'auto', now=NOW) == [(start, end, 60)]
+
+
+def test_period_descriptions_merge_repeated_periods():
+    assert periods.merge_periods('2024-01-01T00:00:00Z=3600;2024-03-01T00:00:00Z=300', '2024-04-01T00:00:00Z=300;2024-05-01T00:00:00Z=60') == (
+        '2024-01-01T00:00:00Z=3600;2024-03-01T00:00:00Z=300;2024-05-01T00:00:00Z=60'
+    )
+    assert periods.merge_periods(None, '2024-01-01T00:00:00Z=60') == '2024-01-01T00:00:00Z=60'
+
+
+def test_auto_period_fetches_old_data_at_coarser_periods(fake_s3):
+    cloudwatch = MagicMock()
+    cloudwatch.list_metrics.return_value = {
+        'Metrics': [{'Namespace': 'AWS/Lambda', 'MetricName': 'Invocations', 'Dimensions': []}]
+    }
+    cloudwatch.get_metric_data.side_effect = lambda **kwargs: {'MetricDataResults': [
+        {'Id': query['Id'], 'Timestamps': [kwargs['StartTime']], 'Values': [float(query['MetricStat']['Period'])]}
+        for query in kwargs['MetricDataQueries']
+    ]}
+    end = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    event = {'Records': [{'messageId': 'm1', 'body': json.dumps({
+        'namespace': 'AWS/Lambda',
+        'metricName': 'Invocations',
+        'dimensions': [],
+        'startTime': (end - timedelta(days=30)).isoformat(),
+        'endTime': end.isoformat(),
+        'destinationMetricName': 'm',
+        'destinationKey': 'archive.csv',
+        'cloudwatchStats': ['Sum'],
+        'period': 'auto'
+    })}]}
+
+    with patch('migrate_metric.app.metrics', cloudwatch), \
+         patch('migrate_metric.app.s3_client', fake_s3), \
+         patch.dict(os.environ, {'ARCHIVED_METRICS_BUCKET_NAME': 'bucket'}):
+        app.lambda_handler(event, {})
+
+    requested = {call.kwargs['MetricDataQueries'][0]['MetricStat']['Period'] for call in cloudwatch.get_metric_data.call_args_list}
+    assert requested == {300, 60}
+    rows = fake_s3.objects['archive.csv'].decode('utf-8').splitlines()[1:]
+    assert [row.split(',')[1] for row in rows] == ['300.0', '60.0']
+    recorded = fake_s3.metadata['archive.csv']['periods'].split(';')
+    assert [entry.split('=')[1] for entry in recorded] == ['300', '60']
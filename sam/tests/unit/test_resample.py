@@ -0,0 +1,141 @@
+"""
+Unit tests for resampling results to the requested period in the timeshift Lambda.
+"""
+import io
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+os.environ.setdefault('S3_CSV_LOADING_LAMBDA_ARN', 'arn:aws:lambda:us-east-1:123456789012:function:s3-csv')
+import timeshift.app as timeshift
+import resample
+import shift
+from resample import resample_results
+
+START = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+MINUTES = list(range(START, START + 600, 60))
+
+
+pytestmark = pytest.mark.usefixtures('no_result_cache')
+
+
+@pytest.mark.parametrize('label, expected', [
+    ('m-Sum', [10.0, 35.0]),
+    ('m-SampleCount', [10.0, 35.0]),
+    ('m-Minimum', [0.0, 5.0]),
+    ('m-Maximum', [4.0, 9.0]),
+    ('m-Average', [2.0, 7.0]),
+])
+def test_each_stat_is_combined_by_its_rule(label, expected):
+    results = [{'Label': label, 'Timestamps': list(MINUTES), 'Values': [float(n) for n in range(10)]}]
+
+    assert resample_results(results, 300, START) == 8
+    assert results[0]['Timestamps'] == [START, START + 300]
+    assert results[0]['Values'] == expected
+
+
+@pytest.mark.parametrize('label', ['m-p99', 'm-tm99', 'm-IQM', 'm-TC(10:90)', 'm-PR(:300)'])
+def test_stats_that_cannot_be_combined_are_left_as_stored(label):
+    results = [{'Label': label, 'Timestamps': list(MINUTES), 'Values': [float(n) for n in range(10)]}]
+
+    assert resample_results(results, 300, START) == 0
+    assert results[0]['Timestamps'] == MINUTES
+    assert results[0]['Values'] == [float(n) for n in range(10)]
+
+
+def test_series_already_at_the_period_are_not_resampled(monkeypatch):
+    combined = []
+    monkeypatch.setattr(resample, 'resample', lambda *args: combined.append(args) or ([], []))
+    results = [
+        {'Label': 'm-Sum', 'Timestamps': list(range(START, START + 3000, 300)), 'Values': [1.0] * 10},
+        {'Label': 'm-Maximum', 'Timestamps': [START + 30, START + 900], 'Values': [1.0, 2.0]}
+    ]
+
+    assert resample_results(results, 300, START) == 0
+    assert combined == []
+    assert results[1]['Timestamps'] == [START + 30, START + 900]
+
+
+def test_average_is_weighted_by_sample_count():
+    results = [
+        {'Label': 'm-Average', 'Timestamps': list(MINUTES), 'Values': [1.0] * 5 + [10.0] * 5},
+        {'Label': 'm-SampleCount', 'Timestamps': list(MINUTES), 'Values': [1.0, 1.0, 1.0, 1.0, 6.0] + [1.0] * 5}
+    ]
+    results[0]['Values'][4] = 6.0
+
+    resample_results(results, 600, START)
+
+    assert results[0]['Values'] == [pytest.approx((4 * 1.0 + 6.0 * 6.0 + 5 * 10.0) / 15)]
+    assert results[1]['Values'] == [15.0]
+
+
+def test_each_average_is_weighted_by_the_sample_count_of_its_own_metric():
+    # Two metrics archived under the same destinationMetricName, one group of columns each
+    averages = [10.0] * 4 + [20.0]
+    results = [
+        {'Label': 'm-Average', 'Timestamps': MINUTES[:5], 'Values': list(averages)},
+        {'Label': 'm-SampleCount', 'Timestamps': MINUTES[:5], 'Values': [1.0] * 4 + [1000.0]},
+        {'Label': 'm-Average', 'Timestamps': MINUTES[:5], 'Values': list(averages)},
+        {'Label': 'm-SampleCount', 'Timestamps': MINUTES[:5], 'Values': [1000.0] + [1.0] * 4}
+    ]
+
+    resample_results(results, 300, START)
+
+    assert results[0]['Values'] == [pytest.approx((4 * 10.0 + 1000 * 20.0) / 1004)]
+    assert results[2]['Values'] == [pytest.approx((1000 * 10.0 + 3 * 10.0 + 20.0) / 1004)]
+
+
+def test_buckets_are_counted_from_the_window_start():
+    results = [{'Label': 'm-Sum', 'Timestamps': [START + 60, START + 120, START + 400], 'Values': [1.0, 2.0, 3.0]}]
+
+    resample_results(results, 300, START + 60)
+
+    assert results[0]['Timestamps'] == [START + 60, START + 360]
+    assert results[0]['Values'] == [3.0, 3.0]
+
+
+def test_unordered_points_are_sorted_first():
+    results = [{'Label': 'm-Maximum', 'Timestamps': [START + 360, START, START + 60], 'Values': [3.0, 1.0, 2.0]}]
+
+    resample_results(results, 300, START)
+
+    assert results[0]['Timestamps'] == [START, START + 300]
+    assert results[0]['Values'] == [2.0, 3.0]
+
+
+def test_numpy_path_matches_the_pure_python_path(monkeypatch):
+    pytest.importorskip('numpy')
+    timestamps = list(range(START, START + 60 * 1000, 60))
+    values = [float(n % 17) for n in range(1000)]
+    weights = [float(1 + n % 3) for n in range(1000)]
+    vectorized = [resample.resample(timestamps, values, 300, START, rule, weights) for rule in ('sum', 'min', 'max', 'mean')]
+    monkeypatch.setattr(shift, 'numpy', None)
+    assert vectorized == [pytest.approx(resample.resample(timestamps, values, 300, START, rule, weights)) for rule in ('sum', 'min', 'max', 'mean')]
+
+
+def test_handler_returns_points_at_the_requested_period():
+    payload = {'MetricDataResults': [
+        {'Id': 'a', 'Label': 'm-Sum', 'Timestamps': [t - 86400 for t in MINUTES], 'Values': [1.0] * 10}
+    ]}
+    event = {
+        'EventType': 'GetMetricData',
+        'GetMetricDataRequest': {
+            'Arguments': ['bucket', 'key.csv', 'P1D'],
+            'StartTime': START,
+            'EndTime': START + 600,
+            'Period': 300
+        }
+    }
+    client = MagicMock()
+    client.invoke.return_value = {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(payload).encode('utf-8'))}
+
+    with patch('timeshift.app.lambda_client', client), patch('timeshift.app.s3_client', MagicMock()):
+        response = timeshift.lambda_handler(event, {})
+
+    assert response['MetricDataResults'][0]['Timestamps'] == [START, START + 300]
+    assert response['MetricDataResults'][0]['Values'] == [5.0, 5.0]
@@ -0,0 +1,156 @@
+"""
+Unit tests for the timeshift Lambda's warm-container result cache.
+"""
+import io
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+os.environ.setdefault('S3_CSV_LOADING_LAMBDA_ARN', 'arn:aws:lambda:us-east-1:123456789012:function:s3-csv')
+import timeshift.app as timeshift
+from result_cache import ResultCache, cache_key
+
+START = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+
+
+def make_event(duration='P1D'):
+    return {
+        'EventType': 'GetMetricData',
+        'GetMetricDataRequest': {
+            'Arguments': ['bucket', 'archive.csv', duration],
+            'StartTime': START + 86400,
+            'EndTime': START + 86400 + 600
+        }
+    }
+
+
+def make_archive(rows):
+    lines = ['timestamp,Sum\n'] + [
+        f"{datetime.fromtimestamp(START + 60 * n, tz=timezone.utc).isoformat()},{float(n)}\n" for n in range(rows)
+    ]
+    return ''.join(lines).encode('utf-8')
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(2)
+    cache.put('a', [1])
+    cache.put('b', [2])
+    cache.get('a')
+    cache.put('c', [3])
+
+    assert cache.get('b') is None
+    assert cache.get('a') == [1] and cache.get('c') == [3]
+    assert cache.stats()['hits'] == 3 and cache.stats()['misses'] == 1
+
+
+def test_evicted_entries_spill_to_disk_within_the_size_limit(tmp_path):
+    cache = ResultCache(1, spillDirectory=str(tmp_path), spillMaxBytes=120)
+    cache.put('a', ['x' * 50])
+    cache.put('b', ['y' * 50])
+    cache.put('c', ['z' * 50])
+
+    # 'a' and 'b' both spilled, but only one fits in 120 bytes
+    assert cache.spilledBytes <= 120
+    assert len(os.listdir(tmp_path)) == 1
+    assert cache.get('b') == ['y' * 50]
+    assert cache.stats()['spillHits'] == 1
+    assert cache.get('a') is None
+
+
+def test_memory_tier_is_bounded_by_points(tmp_path):
+    def results(points):
+        return [{'Label': 'Sum', 'Timestamps': list(range(points)), 'Values': [0.0] * points}]
+
+    cache = ResultCache(8, maxPoints=100, spillDirectory=str(tmp_path), spillMaxBytes=10 ** 6)
+    cache.put('a', results(60))
+    cache.put('b', results(30))
+    cache.put('c', results(30))
+
+    # 'a' made room for 'c'; a result larger than the whole tier goes straight to disk
+    assert list(cache.entries) == ['b', 'c'] and cache.totalPoints == 60
+    cache.put('d', results(500))
+    assert 'd' not in cache.entries and cache.totalPoints == 60
+    assert cache.get('a') == results(60)
+    assert len(cache.get('d')[0]['Timestamps']) == 500
+
+
+def test_etags_are_kept_for_a_bounded_number_of_objects(fake_s3):
+    cache = ResultCache(4)
+    for n in range(5):
+        fake_s3.objects[f"{n}.csv"] = b'timestamp,Sum\n'
+
+    with patch('result_cache.MAX_ETAGS', 3):
+        for n in range(5):
+            cache.object_etag(fake_s3, 'bucket', f"{n}.csv")
+
+    assert list(cache.etags) == [('bucket', '2.csv'), ('bucket', '3.csv'), ('bucket', '4.csv')]
+
+
+def test_etag_lookups_are_reused_within_the_ttl(fake_s3):
+    fake_s3.objects['archive.csv'] = b'timestamp,Sum\n'
+    cache = ResultCache(4, etagTtl=60)
+
+    first = cache.object_etag(fake_s3, 'bucket', 'archive.csv')
+    second = cache.object_etag(fake_s3, 'bucket', 'archive.csv')
+
+    assert first == second
+    assert fake_s3.calls.count(('head_object', 'archive.csv')) == 1
+    assert cache.object_etag(fake_s3, 'bucket', 'missing.csv') is None
+
+
+def test_repeat_native_query_makes_no_s3_calls(fake_s3):
+    fake_s3.objects['archive.csv'] = make_archive(100)
+
+    with patch('timeshift.app.READER_MODE', 'native'), \
+         patch('timeshift.app.s3_client', fake_s3), \
+         patch('timeshift.app.result_cache', ResultCache(4)):
+        first = timeshift.lambda_handler(make_event(), {})
+        callsAfterFirst = len(fake_s3.calls)
+        second = timeshift.lambda_handler(make_event(), {})
+
+    assert second == first
+    assert len(fake_s3.calls) == callsAfterFirst
+    assert first['MetricDataResults'][0]['Timestamps'][0] == START + 86400
+
+
+def test_repeat_lambda_query_skips_the_invoke(fake_s3):
+    fake_s3.objects['archive.csv'] = make_archive(1)
+    payload = {'MetricDataResults': [{'StatusCode': 'Complete', 'Label': 'Sum', 'Timestamps': [START + 60], 'Values': [1.0]}]}
+    client = MagicMock()
+    client.invoke.side_effect = lambda **kwargs: {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(payload).encode('utf-8'))}
+
+    with patch('timeshift.app.s3_client', fake_s3), \
+         patch('timeshift.app.lambda_client', client), \
+         patch('timeshift.app.result_cache', ResultCache(4)):
+        first = timeshift.lambda_handler(make_event(), {})
+        second = timeshift.lambda_handler(make_event(), {})
+
+    assert client.invoke.call_count == 1
+    assert second == first
+    assert first['MetricDataResults'][0]['Timestamps'] == [START + 86400 + 60]
+
+
+def test_rewritten_archive_is_not_served_from_the_cache(fake_s3):
+    fake_s3.objects['archive.csv'] = make_archive(5)
+    cache = ResultCache(4, etagTtl=0)
+
+    with patch('timeshift.app.READER_MODE', 'native'), \
+         patch('timeshift.app.s3_client', fake_s3), \
+         patch('timeshift.app.result_cache', cache):
+        first = timeshift.lambda_handler(make_event(), {})
+        fake_s3.objects['archive.csv'] = make_archive(10)
+        second = timeshift.lambda_handler(make_event(), {})
+
+    assert len(first['MetricDataResults'][0]['Timestamps']) == 5
+    assert len(second['MetricDataResults'][0]['Timestamps']) == 10
+    assert cache.stats()['misses'] == 2
+
+
+def test_key_covers_window_period_and_columns():
+    base = cache_key('b', 'k', '"e"', 0, 60)
+    assert base != cache_key('b', 'k', '"e"', 0, 60, period=300)
+    assert base != cache_key('b', 'k', '"e"', 0, 60, columns=['Sum'])
+    assert base != cache_key('b', 'k', '"f"', 0, 60)
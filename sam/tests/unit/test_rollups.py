@@ -0,0 +1,240 @@
+"""
+Unit tests for rollups: building them at migration time and serving coarse
+periods from them in the timeshift Lambda.
+"""
+import os
+import sys
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+os.environ.setdefault('S3_CSV_LOADING_LAMBDA_ARN', 'arn:aws:lambda:us-east-1:123456789012:function:s3-csv')
+import timeshift.app as timeshift
+from archive_reader import read_window
+from job_rules import rollup_error
+from result_cache import ResultCache
+from rollup_source import choose_rollup
+from rollups import RollupWriter, average_weights, rollup_key
+
+START = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+STATS = ['Sum', 'Minimum', 'Maximum', 'SampleCount', 'Average']
+
+
+def value_for(stat, minute):
+    """Per-minute datapoints of each stat, with a sample count that varies by minute"""
+    samples = 1 + minute % 4
+    return {'Sum': float(minute), 'Minimum': float(minute % 10), 'Maximum': float(minute % 10 + 5),
+            'SampleCount': float(samples), 'Average': float(minute) / samples}[stat]
+
+
+@pytest.fixture
+def metric_value():
+    return lambda query, timestamp: value_for(query['MetricStat']['Stat'], int(timestamp.timestamp() - START) // 60)
+
+
+@pytest.fixture
+def migration_body(migration_body):
+    return dict(migration_body, destinationKey='archive', cloudwatchStats=STATS, rollups=[300, 3600])
+
+
+def expected_bucket(stat, firstMinute, minutes):
+    points = range(firstMinute, firstMinute + minutes)
+    if stat in ('Sum', 'SampleCount'):
+        return sum(value_for(stat, minute) for minute in points)
+    if stat == 'Minimum':
+        return min(value_for(stat, minute) for minute in points)
+    if stat == 'Maximum':
+        return max(value_for(stat, minute) for minute in points)
+    return sum(value_for('Sum', minute) for minute in points) / sum(value_for('SampleCount', minute) for minute in points)
+
+
+def test_each_stat_is_combined_by_its_own_rule(fake_s3):
+    columns = [f"m-{stat}" for stat in STATS]
+    with RollupWriter(fake_s3, 'bucket', 'archive', columns, [300, 3600]) as writer:
+        for minute in range(120):
+            writer.add_row(START + 60 * minute, [value_for(stat, minute) for stat in STATS])
+
+    fiveMinutes = read_window(fake_s3, 'bucket', rollup_key('archive', 300), START, START + 7200)
+    hours = read_window(fake_s3, 'bucket', rollup_key('archive', 3600), START, START + 7200)
+
+    assert fiveMinutes[0]['Timestamps'] == list(range(START, START + 7200, 300))
+    assert hours[0]['Timestamps'] == [START, START + 3600]
+    for index, stat in enumerate(STATS):
+        assert fiveMinutes[index]['Values'] == pytest.approx([expected_bucket(stat, 5 * n, 5) for n in range(24)])
+        assert hours[index]['Values'] == pytest.approx([expected_bucket(stat, 60 * n, 60) for n in range(2)])
+
+
+def test_each_average_is_weighted_by_the_sample_count_of_its_own_metric(fake_s3):
+    # Two dimension sets archived under the same destinationMetricName repeat the column names
+    columns = ['m-Average', 'm-SampleCount'] * 2
+    assert average_weights(columns) == {0: 1, 2: 3}
+
+    with RollupWriter(fake_s3, 'bucket', 'archive', columns, [300]) as writer:
+        for minute in range(5):
+            writer.add_row(START + 60 * minute, [float(minute), 1.0 + minute, 10.0 - minute, 1.0 if minute else 0.0])
+
+    fiveMinutes = read_window(fake_s3, 'bucket', rollup_key('archive', 300), START, START + 300)
+    assert fiveMinutes[0]['Values'] == pytest.approx([sum(m * (1.0 + m) for m in range(5)) / sum(1.0 + m for m in range(5))])
+    assert fiveMinutes[2]['Values'] == pytest.approx([(9.0 + 8.0 + 7.0 + 6.0) / 4])
+
+
+def test_gaps_are_skipped():
+    with patch('rollups.MultipartUploadWriter') as writers:
+        rows = []
+        writers.return_value.write.side_effect = rows.append
+        with RollupWriter(MagicMock(), 'bucket', 'archive', ['m-Sum', 'm-Maximum'], [300]) as writer:
+            writer.add_row(START, [1.0, None])
+            writer.add_row(START + 60, [None, None])
+            writer.add_row(START + 600, [None, 4.0])
+
+    assert rows[1:] == ['2024-01-01T00:00:00+00:00,1.0,\n', '2024-01-01T00:10:00+00:00,,4.0\n']
+
+
+def test_migration_writes_rollups_and_lists_them(fake_s3, migrate):
+    assert migrate(endTime='2024-01-01T03:00:00Z') == []
+
+    assert fake_s3.metadata['archive']['rollups'] == '300,3600'
+    hours = read_window(fake_s3, 'bucket', 'archive.rollups/3600', START, START + 3 * 3600, ['m-Average'])
+    assert hours[0]['Values'] == pytest.approx([expected_bucket('Average', 60 * n, 60) for n in range(3)])
+
+
+def test_sliced_migration_builds_rollups_once_assembled(fake_s3, migrate):
+    for index, (startTime, endTime) in enumerate([('2024-01-01T00:00:00Z', '2024-01-01T01:30:00Z'),
+                                                  ('2024-01-01T01:30:00Z', '2024-01-01T03:00:00Z')]):
+        assert 'archive.rollups/3600' not in fake_s3.objects
+        assert migrate(startTime=startTime, endTime=endTime, slice={'jobId': 'job', 'index': index, 'count': 2}) == []
+
+    # The hour split between the two slices is combined from both
+    hours = read_window(fake_s3, 'bucket', 'archive.rollups/3600', START, START + 3 * 3600, ['m-Sum'])
+    assert hours[0]['Values'] == pytest.approx([expected_bucket('Sum', 60 * n, 60) for n in range(3)])
+
+
+def test_redelivered_messages_build_the_rollups_a_failure_left_out(fake_s3, migrate):
+    sliceWindows = [('2024-01-01T00:00:00Z', '2024-01-01T01:30:00Z'), ('2024-01-01T01:30:00Z', '2024-01-01T03:00:00Z')]
+    assert migrate(startTime=sliceWindows[0][0], endTime=sliceWindows[0][1], slice={'jobId': 'job', 'index': 0, 'count': 2}) == []
+    # The last slice assembles the archive, then fails before its rollups are built
+    with patch('migrate_metric.app.build_rollups', side_effect=RuntimeError('timed out')):
+        assert migrate(startTime=sliceWindows[1][0], endTime=sliceWindows[1][1], slice={'jobId': 'job', 'index': 1, 'count': 2}) == ['m1']
+    assert fake_s3.metadata['archive']['rollups'] == '300,3600'
+    assert 'archive.rollups/3600' not in fake_s3.objects
+
+    assert migrate(startTime=sliceWindows[1][0], endTime=sliceWindows[1][1], slice={'jobId': 'job', 'index': 1, 'count': 2}) == []
+
+    hours = read_window(fake_s3, 'bucket', 'archive.rollups/3600', START, START + 3 * 3600, ['m-Sum'])
+    assert hours[0]['Values'] == pytest.approx([expected_bucket('Sum', 60 * n, 60) for n in range(3)])
+
+    # An incremental run that finds the archive complete does the same
+    del fake_s3.objects['archive.rollups/300']
+    assert migrate(endTime='2024-01-01T03:00:00Z', incremental=True) == []
+    assert 'archive.rollups/300' in fake_s3.objects
+
+
+def test_incremental_runs_extend_the_rollups_from_the_archive_tail(fake_s3, migrate):
+    assert migrate(endTime='2024-01-01T02:30:00Z', incremental=True) == []
+
+    # Small tails make the reads grow until they reach the hour the archive ends in
+    with patch('rollups.TAIL_READ_SIZE', 100), patch('migrate_metric.app.build_rollups') as rebuild:
+        assert migrate(endTime='2024-01-01T05:00:00Z', incremental=True) == []
+
+    rebuild.assert_not_called()
+    hours = read_window(fake_s3, 'bucket', 'archive.rollups/3600', START, START + 5 * 3600, ['m-Sum', 'm-Average'])
+    fiveMinutes = read_window(fake_s3, 'bucket', 'archive.rollups/300', START, START + 5 * 3600, ['m-Maximum'])
+    assert hours[0]['Timestamps'] == list(range(START, START + 5 * 3600, 3600))
+    assert hours[0]['Values'] == pytest.approx([expected_bucket('Sum', 60 * n, 60) for n in range(5)])
+    assert hours[1]['Values'] == pytest.approx([expected_bucket('Average', 60 * n, 60) for n in range(5)])
+    assert fiveMinutes[0]['Values'] == pytest.approx([expected_bucket('Maximum', 5 * n, 5) for n in range(60)])
+
+
+def test_rollups_are_rebuilt_when_there_are_none_to_extend(fake_s3, migrate):
+    assert migrate(endTime='2024-01-01T01:00:00Z', incremental=True, rollups=None) == []
+    assert migrate(endTime='2024-01-01T02:00:00Z', incremental=True) == []
+
+    hours = read_window(fake_s3, 'bucket', 'archive.rollups/3600', START, START + 2 * 3600, ['m-Sum'])
+    assert hours[0]['Values'] == pytest.approx([expected_bucket('Sum', 60 * n, 60) for n in range(2)])
+
+
+def test_binary_archives_get_binary_rollups(fake_s3, migrate):
+    assert migrate(endTime='2024-01-01T02:00:00Z', format='binary') == []
+
+    assert fake_s3.objects['archive.rollups/300'].startswith(b'MAB1')
+    fiveMinutes = read_window(fake_s3, 'bucket', 'archive.rollups/300', START, START + 7200, ['m-Maximum'])
+    assert fiveMinutes[0]['Values'] == pytest.approx([expected_bucket('Maximum', 5 * n, 5) for n in range(24)])
+
+
+@pytest.mark.parametrize('periods, stats, message', [
+    ([600, 900], STATS, 'multiple'),
+    ([90], STATS, '60'),
+    ([], STATS, 'list'),
+    ([300], ['Sum', 'p99'], 'p99'),
+    ([300], ['Average'], 'SampleCount'),
+])
+def test_rollups_that_cannot_be_built_are_rejected(periods, stats, message):
+    assert message in rollup_error(periods, stats)
+
+
+def test_the_coarsest_rollup_meeting_the_period_is_chosen():
+    metadata = {'rollups': '300,3600,86400'}
+    assert choose_rollup('archive', metadata, 60) is None
+    assert choose_rollup('archive', metadata, 900) == 'archive.rollups/300'
+    assert choose_rollup('archive', metadata, 7200) == 'archive.rollups/3600'
+    assert choose_rollup('archive', metadata, 86400 * 7) == 'archive.rollups/86400'
+    assert choose_rollup('archive', {}, 86400) is None
+
+
+def test_rollups_are_only_chosen_when_their_buckets_line_up_with_the_shifted_ones():
+    metadata = {'rollups': '300,3600'}
+    # Shifted back by PT30M, hourly buckets start half way through the hourly rollup's
+    assert choose_rollup('archive', metadata, 3600, [START - 1800]) == 'archive.rollups/300'
+    assert choose_rollup('archive', metadata, 3600, [START - 86400]) == 'archive.rollups/3600'
+    assert choose_rollup('archive', metadata, 3600, [START - 86400, START - 90]) is None
+
+
+def test_timeshift_serves_coarse_periods_from_a_rollup(fake_s3, migrate):
+    migrate(endTime='2024-01-02T00:00:00Z')
+    fake_s3.calls.clear()
+    event = {
+        'EventType': 'GetMetricData',
+        'GetMetricDataRequest': {
+            'Arguments': ['bucket', 'archive', 'P1D', 'm-Sum'],
+            'StartTime': START + 86400,
+            'EndTime': START + 2 * 86400,
+            'Period': 3600
+        }
+    }
+
+    with patch('timeshift.app.READER_MODE', 'native'), \
+         patch('timeshift.app.s3_client', fake_s3), \
+         patch('timeshift.app.result_cache', ResultCache(0)):
+        response = timeshift.lambda_handler(event, {})
+
+    assert {key for operation, key in fake_s3.calls if operation == 'get_object'} == {'archive.rollups/3600'}
+    result = response['MetricDataResults'][0]
+    assert result['Timestamps'] == list(range(START + 86400, START + 2 * 86400, 3600))
+    assert result['Values'] == pytest.approx([expected_bucket('Sum', 60 * n, 60) for n in range(24)])
+
+
+def test_timeshift_reads_the_archive_while_a_listed_rollup_is_missing(fake_s3, migrate):
+    migrate(endTime='2024-01-02T00:00:00Z')
+    del fake_s3.objects['archive.rollups/3600']
+    fake_s3.calls.clear()
+    event = {
+        'EventType': 'GetMetricData',
+        'GetMetricDataRequest': {
+            'Arguments': ['bucket', 'archive', 'P1D', 'm-Sum'],
+            'StartTime': START + 86400,
+            'EndTime': START + 2 * 86400,
+            'Period': 3600
+        }
+    }
+
+    with patch('timeshift.app.READER_MODE', 'native'), \
+         patch('timeshift.app.s3_client', fake_s3), \
+         patch('timeshift.app.result_cache', ResultCache(0)):
+        response = timeshift.lambda_handler(event, {})
+
+    assert {key for operation, key in fake_s3.calls if operation == 'get_object'} == {'archive'}
+    result = response['MetricDataResults'][0]
+    assert result['Timestamps'] == list(range(START + 86400, START + 2 * 86400, 3600))
+    assert result['Values'] == pytest.approx([expected_bucket('Sum', 60 * n, 60) for n in range(24)])
@@ -0,0 +1,58 @@
+"""
+Unit tests for the streaming multipart S3 writer in migrate_metric.
+"""
+import os
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../migrate_metric'))
+from s3_writer import MIN_PART_SIZE, MultipartUploadWriter
+
+
+@pytest.fixture
+def s3():
+    client = MagicMock()
+    client.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+    client.upload_part.side_effect = lambda **kwargs: {'ETag': f"etag-{kwargs['PartNumber']}"}
+    return client
+
+
+def test_small_objects_use_a_single_put(s3):
+    with MultipartUploadWriter(s3, 'bucket', 'key.csv') as writer:
+        writer.write('timestamp,a\n')
+        writer.write('2024-01-01T00:00:00+00:00,1.0\n')
+
+    s3.put_object.assert_called_once()
+    assert s3.put_object.call_args.kwargs['Body'] == b'timestamp,a\n2024-01-01T00:00:00+00:00,1.0\n'
+    assert not s3.create_multipart_upload.called
+
+
+def test_large_objects_are_shipped_in_parts_while_writing(s3):
+    row = 'x' * 1023 + '\n'
+    bodies = []
+    s3.upload_part.side_effect = lambda **kwargs: bodies.append(kwargs['Body']) or {'ETag': f"etag-{kwargs['PartNumber']}"}
+
+    with MultipartUploadWriter(s3, 'bucket', 'key.csv', partSize=MIN_PART_SIZE) as writer:
+        for _ in range(12 * 1024):
+            writer.write(row)
+        # Parts go out before the writer is closed
+        assert s3.upload_part.call_count >= 1
+
+    completed = s3.complete_multipart_upload.call_args.kwargs
+    assert completed['UploadId'] == 'upload-1'
+    assert [part['PartNumber'] for part in completed['MultipartUpload']['Parts']] == [1, 2, 3]
+    assert b''.join(bodies) == row.encode('utf-8') * 12 * 1024
+    assert not s3.put_object.called
+
+
+def test_upload_is_aborted_when_writing_fails(s3):
+    with pytest.raises(RuntimeError):
+        with MultipartUploadWriter(s3, 'bucket', 'key.csv', partSize=MIN_PART_SIZE) as writer:
+            writer.write('x' * MIN_PART_SIZE)
+            raise RuntimeError("fetch failed")
+
+    s3.abort_multipart_upload.assert_called_once_with(Bucket='bucket', Key='key.csv', UploadId='upload-1')
+    assert not s3.complete_multipart_upload.called
@@ -0,0 +1,187 @@
+"""
+Unit tests for sliced migrations: manifest bookkeeping and final assembly.
+"""
+import json
+import os
+import sys
+from datetime import timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../migrate_metric'))
+import migrate_metric.app as app
+import slices
+
+
+def slice_info(index, count=3):
+    return {'jobId': 'job-1', 'index': index, 'count': count}
+
+
+def put_slice(fake_s3, index, rows):
+    key = slices.slice_key('archive.csv', 'job-1', index)
+    fake_s3.put_object(Bucket='bucket', Key=key, Body=('timestamp,m-Sum\n' + rows).encode('utf-8'))
+    return key
+
+
+def test_manifest_completes_once_every_slice_is_recorded(fake_s3):
+    for index in [2, 0]:
+        key = put_slice(fake_s3, index, '')
+        manifest = slices.record_slice(fake_s3, 'bucket', 'archive.csv', slice_info(index), {'key': key})
+        assert not slices.is_complete(manifest)
+
+    key = put_slice(fake_s3, 1, '')
+    manifest = slices.record_slice(fake_s3, 'bucket', 'archive.csv', slice_info(1), {'key': key})
+
+    assert slices.is_complete(manifest)
+    stored, _ = slices.load_manifest(fake_s3, 'bucket', 'archive.csv', 'job-1')
+    assert sorted(stored['slices']) == ['0', '1', '2']
+
+
+def test_manifest_update_retries_when_another_slice_wins_the_race(fake_s3):
+    put_object = fake_s3.put_object
+    raced = []
+
+    def racing_put(**kwargs):
+        if not raced:
+            raced.append(True)
+            # Another invocation records slice 0 between our read and our write
+            slices.record_slice(fake_s3, 'bucket', 'archive.csv', slice_info(0), {'key': 'k0'})
+        return put_object(**kwargs)
+
+    with patch.object(fake_s3, 'put_object', side_effect=racing_put):
+        manifest = slices.record_slice(fake_s3, 'bucket', 'archive.csv', slice_info(1), {'key': 'k1'})
+
+    assert sorted(manifest['slices']) == ['0', '1']
+
+
+def test_assembly_concatenates_slices_in_order_with_one_header(fake_s3):
+    manifest = None
+    for index, rows in [(1, '2024-01-02T00:00:00+00:00,2.0\n'), (0, '2024-01-01T00:00:00+00:00,1.0\n'), (2, '')]:
+        key = put_slice(fake_s3, index, rows)
+        manifest = slices.record_slice(fake_s3, 'bucket', 'archive.csv', slice_info(index), {'key': key})
+
+    slices.assemble(fake_s3, 'bucket', manifest)
+
+    assert fake_s3.objects['archive.csv'].decode('utf-8') == (
+        'timestamp,m-Sum\n'
+        '2024-01-01T00:00:00+00:00,1.0\n'
+        '2024-01-02T00:00:00+00:00,2.0\n'
+    )
+    assert not any(key.endswith('.csv') and '.slices/' in key for key in fake_s3.objects)
+    stored = json.loads(fake_s3.objects[slices.manifest_key('archive.csv', 'job-1')])
+    assert stored['assembled'] is True
+
+
+def test_large_slices_are_copied_server_side(fake_s3):
+    # Rows of about 12 MiB for the large slices, a few rows for the small ones
+    large = ''.join(f"2024-01-01T00:00:00+00:00,{n}.0\n" for n in range(400000))
+    small = '2024-01-03T00:00:00+00:00,1.0\n' * 3
+    manifest = None
+    for index, rows in enumerate([small, large, small, large]):
+        key = put_slice(fake_s3, index, rows)
+        manifest = slices.record_slice(fake_s3, 'bucket', 'archive.csv', slice_info(index, 4), {'key': key})
+    fake_s3.upload_part_copy = MagicMock(wraps=fake_s3.upload_part_copy)
+
+    slices.assemble(fake_s3, 'bucket', manifest)
+
+    assert fake_s3.objects['archive.csv'].decode('utf-8') == 'timestamp,m-Sum\n' + small + large + small + large
+    # Each large slice tops up the small rows before it to a whole part, then copies the rest
+    assert fake_s3.upload_part_copy.call_count == 2
+    assert all(not call.kwargs['CopySourceRange'].startswith('bytes=0-') for call in fake_s3.upload_part_copy.call_args_list)
+
+
+def complete_job(fake_s3):
+    manifest = None
+    for index in range(3):
+        key = put_slice(fake_s3, index, f"2024-01-0{index + 1}T00:00:00+00:00,1.0\n")
+        manifest = slices.record_slice(fake_s3, 'bucket', 'archive.csv', slice_info(index), {'key': key})
+    return manifest
+
+
+def test_a_job_is_only_assembled_once(fake_s3):
+    manifest = complete_job(fake_s3)
+
+    assert slices.assemble(fake_s3, 'bucket', manifest) is True
+    fake_s3.calls.clear()
+    assert slices.assemble(fake_s3, 'bucket', manifest) is False
+    assert ('put_object', 'archive.csv') not in fake_s3.calls
+
+
+def test_assembly_claimed_by_another_invocation_is_left_to_it(fake_s3):
+    manifest = complete_job(fake_s3)
+    slices.claim_assembly(fake_s3, 'bucket', 'archive.csv', 'job-1')
+
+    with pytest.raises(RuntimeError, match='being assembled'):
+        slices.assemble(fake_s3, 'bucket', manifest)
+
+    assert 'archive.csv' not in fake_s3.objects
+    assert slices.slice_key('archive.csv', 'job-1', 0) in fake_s3.objects
+
+
+def test_a_stale_assembly_claim_is_taken_over(fake_s3):
+    manifest = complete_job(fake_s3)
+    slices.claim_assembly(fake_s3, 'bucket', 'archive.csv', 'job-1')
+
+    with patch('slices.ASSEMBLY_CLAIM_SECONDS', 0):
+        assert slices.assemble(fake_s3, 'bucket', manifest) is True
+
+    assert fake_s3.objects['archive.csv'].decode('utf-8').count('\n') == 4
+
+
+def test_slices_are_kept_when_the_claim_is_lost_during_assembly(fake_s3):
+    manifest = complete_job(fake_s3)
+    get_object = fake_s3.get_object
+
+    def taken_over(**kwargs):
+        if kwargs['Key'] == slices.slice_key('archive.csv', 'job-1', 2):
+            # Another invocation takes over the claim while we copy the last slice
+            with patch('slices.ASSEMBLY_CLAIM_SECONDS', 0):
+                slices.claim_assembly(fake_s3, 'bucket', 'archive.csv', 'job-1')
+        return get_object(**kwargs)
+
+    with patch.object(fake_s3, 'get_object', side_effect=taken_over), pytest.raises(RuntimeError, match='Lost the assembly claim'):
+        slices.assemble(fake_s3, 'bucket', manifest)
+
+    assert all(slices.slice_key('archive.csv', 'job-1', index) in fake_s3.objects for index in range(3))
+
+
+def test_worker_assembles_the_job_when_the_last_slice_finishes(fake_s3):
+    cloudwatch = MagicMock()
+    cloudwatch.list_metrics.return_value = {
+        'Metrics': [{'Namespace': 'AWS/Lambda', 'MetricName': 'Invocations', 'Dimensions': []}]
+    }
+    cloudwatch.get_metric_data.side_effect = lambda **kwargs: {
+        'MetricDataResults': [
+            {'Id': q['Id'], 'Timestamps': [kwargs['StartTime'].astimezone(timezone.utc)], 'Values': [1.0]}
+            for q in kwargs['MetricDataQueries']
+        ]
+    }
+
+    def slice_event(index, start, end):
+        return {'Records': [{'messageId': f"m{index}", 'body': json.dumps({
+            'namespace': 'AWS/Lambda',
+            'metricName': 'Invocations',
+            'dimensions': [],
+            'startTime': start,
+            'endTime': end,
+            'destinationMetricName': 'm',
+            'destinationKey': 'archive.csv',
+            'cloudwatchStats': ['Sum'],
+            'slice': slice_info(index, count=2)
+        })}]}
+
+    with patch('migrate_metric.app.metrics', cloudwatch), \
+         patch('migrate_metric.app.s3_client', fake_s3), \
+         patch.dict(os.environ, {'ARCHIVED_METRICS_BUCKET_NAME': 'bucket'}):
+        app.lambda_handler(slice_event(1, '2024-01-02T00:00:00Z', '2024-01-03T00:00:00Z'), {})
+        assert 'archive.csv' not in fake_s3.objects
+        app.lambda_handler(slice_event(0, '2024-01-01T00:00:00Z', '2024-01-02T00:00:00Z'), {})
+
+    assert fake_s3.objects['archive.csv'].decode('utf-8') == (
+        'timestamp,m-Sum\n'
+        '2024-01-01T00:00:00+00:00,1.0\n'
+        '2024-01-02T00:00:00+00:00,1.0\n'
+    )
@@ -0,0 +1,84 @@
+"""
+Unit tests for the Embedded Metric Format stage timings shared by the three functions.
+"""
+import io
+import json
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+os.environ.setdefault('S3_CSV_LOADING_LAMBDA_ARN', 'arn:aws:lambda:us-east-1:123456789012:function:s3-csv')
+import metric_migrate_trigger.app as trigger
+import stage_metrics
+import timeshift.app as timeshift
+from result_cache import ResultCache
+
+
+@pytest.fixture(autouse=True)
+def recording():
+    with patch.object(stage_metrics, 'ENABLED', True), patch('timeshift.app.result_cache', ResultCache(0)):
+        yield
+    stage_metrics._current = None
+
+
+def emitted(capsys):
+    """The EMF records written to stdout"""
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith('{"_aws"')]
+
+
+def test_nothing_is_recorded_when_disabled(capsys):
+    stage_metrics.begin('timeshift', enabled=False)
+
+    assert stage_metrics.stage('Shift') is stage_metrics.stage('Merge')
+    with stage_metrics.stage('Shift'):
+        stage_metrics.count('Points', 10)
+
+    assert stage_metrics.emit() is None
+    assert capsys.readouterr().out == ''
+
+
+def test_one_record_per_invocation(capsys):
+    stage_metrics.begin('migrate')
+    for _ in range(3):
+        with stage_metrics.stage('Merge'):
+            pass
+        stage_metrics.count('Datapoints', 100)
+    stage_metrics.count('S3UploadBytes', 2048)
+
+    record = stage_metrics.emit()
+
+    assert emitted(capsys) == [record]
+    assert record['Function'] == 'migrate'
+    assert record['Datapoints'] == 300 and record['S3UploadBytes'] == 2048
+    assert record['MergeTime'] >= 0 and record['InvocationTime'] >= record['MergeTime']
+    directive = record['_aws']['CloudWatchMetrics'][0]
+    assert directive['Dimensions'] == [['Function']]
+    units = {metric['Name']: metric['Unit'] for metric in directive['Metrics']}
+    assert units == {'Datapoints': 'Count', 'S3UploadBytes': 'Bytes', 'MergeTime': 'Milliseconds', 'InvocationTime': 'Milliseconds'}
+    assert stage_metrics.emit() is None
+
+
+def test_timeshift_records_the_loader_and_the_shift(capsys):
+    payload = json.dumps({'MetricDataResults': [{'Id': 'a', 'Timestamps': [1704067200, 1704067260], 'Values': [1.0, 2.0]}]}).encode('utf-8')
+    client = MagicMock()
+    client.invoke.return_value = {'StatusCode': 200, 'Payload': io.BytesIO(payload)}
+    event = {'EventType': 'GetMetricData', 'GetMetricDataRequest': {'Arguments': ['bucket', 'key.csv', 'P1D'], 'StartTime': 1704153600, 'EndTime': 1704240000}}
+
+    with patch('timeshift.app.lambda_client', client):
+        timeshift.lambda_handler(event, {})
+
+    [record] = emitted(capsys)
+    assert record['Function'] == 'timeshift'
+    assert record['LoaderCalls'] == 1 and record['LoaderPayloadBytes'] == len(payload) and record['Points'] == 2
+    assert {'LoaderInvokeTime', 'LoaderParseTime', 'ShiftTime'} <= set(record)
+
+
+def test_trigger_records_rejected_requests(capsys):
+    with patch.dict(os.environ, {'MIGRATION_QUEUE_URL': 'https://sqs.example/queue'}):
+        trigger.lambda_handler({'body': json.dumps({'namespace': 'AWS/Lambda'})}, {})
+
+    [record] = emitted(capsys)
+    assert record['Function'] == 'trigger' and record['Status4xx'] == 1
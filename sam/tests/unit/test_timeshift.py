@@ -0,0 +1,163 @@
+"""
+Unit tests for timestamp shifting in the timeshift Lambda.
+"""
+import io
+import json
+import os
+import re
+import sys
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+os.environ.setdefault('S3_CSV_LOADING_LAMBDA_ARN', 'arn:aws:lambda:us-east-1:123456789012:function:s3-csv')
+import timeshift.app as timeshift
+import shift
+
+
+pytestmark = pytest.mark.usefixtures('no_result_cache')
+
+
+def epoch(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+
+def make_event(duration, startTime=epoch(2024, 1, 2), endTime=epoch(2024, 1, 3)):
+    return {
+        'EventType': 'GetMetricData',
+        'GetMetricDataRequest': {
+            'Arguments': ['bucket', 'key.csv', duration],
+            'StartTime': startTime,
+            'EndTime': endTime
+        }
+    }
+
+
+def invoke_with_payload(event, payload):
+    client = MagicMock()
+    client.invoke.return_value = {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(payload).encode('utf-8'))}
+    with patch('timeshift.app.lambda_client', client):
+        return timeshift.lambda_handler(event, {}), client
+
+
+@pytest.mark.parametrize('timestamps', [[1704067200, 1704067260], list(range(1704067200, 1704067200 + 60 * 1000, 60))])
+def test_shift_matches_the_per_point_calculation(timestamps):
+    assert shift.shift_timestamps(timestamps, 86400.0) == [int(t + 86400.0) for t in timestamps]
+
+
+def test_pure_python_path_truncates_like_int(monkeypatch):
+    monkeypatch.setattr(shift, 'numpy', None)
+    assert shift.shift_timestamps([10, 20.7, -5], 0.5) == [10, 21, -4]
+
+
+def test_results_are_shifted_by_the_duration():
+    payload = {'MetricDataResults': [
+        {'Id': 'a', 'Timestamps': [1704067200, 1704067260], 'Values': [1.0, 2.0]},
+        {'Id': 'b', 'Values': []}
+    ]}
+
+    response, client = invoke_with_payload(make_event('P1D'), payload)
+
+    assert response['MetricDataResults'][0]['Timestamps'] == [1704153600, 1704153660]
+    assert response['MetricDataResults'][0]['Values'] == [1.0, 2.0]
+    forwarded = json.loads(client.invoke.call_args.kwargs['Payload'])
+    assert forwarded['GetMetricDataRequest']['Arguments'] == ['bucket', 'key.csv']
+
+
+def test_source_window_is_shifted_back_and_results_trimmed():
+    payload = {'MetricDataResults': [{
+        'Id': 'a',
+        'Timestamps': [epoch(2023, 2, 28, 23), epoch(2023, 3, 1), epoch(2023, 3, 1, 12), epoch(2023, 3, 2)],
+        'Values': [1.0, 2.0, 3.0, 4.0]
+    }]}
+
+    response, client = invoke_with_payload(make_event('P1Y', epoch(2024, 3, 1), epoch(2024, 3, 2)), payload)
+
+    # A year back from March 2024 spans the leap day
+    forwarded = json.loads(client.invoke.call_args.kwargs['Payload'])['GetMetricDataRequest']
+    assert (forwarded['StartTime'], forwarded['EndTime']) == (epoch(2023, 3, 1), epoch(2023, 3, 2))
+    result = response['MetricDataResults'][0]
+    assert result['Timestamps'] == [epoch(2024, 3, 1), epoch(2024, 3, 1, 12)]
+    assert result['Values'] == [2.0, 3.0]
+
+
+def test_points_are_not_logged_by_default(caplog):
+    payload = {'MetricDataResults': [{'Id': 'a', 'Timestamps': list(range(0, 6000, 60)), 'Values': [1.0] * 100}]}
+
+    with caplog.at_level('DEBUG'):
+        invoke_with_payload(make_event('PT1H'), payload)
+
+    assert not any('timestamp 0 ->' in record.getMessage() for record in caplog.records)
+
+
+def test_several_durations_share_one_read():
+    payload = {'MetricDataResults': [{
+        'Id': 'a',
+        'Label': 'm-Sum',
+        'Timestamps': [epoch(2023, 12, 19), epoch(2023, 12, 26)],
+        'Values': [1.0, 2.0]
+    }]}
+
+    response, client = invoke_with_payload(make_event('P1W,P2W'), payload)
+
+    client.invoke.assert_called_once()
+    forwarded = json.loads(client.invoke.call_args.kwargs['Payload'])['GetMetricDataRequest']
+    assert (forwarded['StartTime'], forwarded['EndTime']) == (epoch(2023, 12, 19), epoch(2023, 12, 27))
+    results = response['MetricDataResults']
+    assert [(result['Id'], result['Label']) for result in results] == [('a_0', 'm-Sum P1W'), ('a_1', 'm-Sum P2W')]
+    assert results[0]['Timestamps'] == [epoch(2024, 1, 2)]
+    assert results[0]['Values'] == [2.0]
+    assert results[1]['Timestamps'] == [epoch(2024, 1, 2)]
+    assert results[1]['Values'] == [1.0]
+
+
+def test_result_ids_stay_valid_for_any_duration():
+    payload = {'MetricDataResults': [{'Id': 'a', 'Label': 'm-Sum', 'Timestamps': [epoch(2024, 1, 1)], 'Values': [1.0]}]}
+
+    response, _ = invoke_with_payload(make_event('PT1.5H,-P1D'), payload)
+
+    results = response['MetricDataResults']
+    assert [(result['Id'], result['Label']) for result in results] == [('a_0', 'm-Sum PT1.5H'), ('a_1', 'm-Sum -P1D')]
+    assert all(re.fullmatch(r'[a-z][a-zA-Z0-9_]*', result['Id']) for result in results)
+
+
+def test_durations_can_be_given_as_a_list():
+    payload = {'MetricDataResults': [{'Id': 'a', 'Timestamps': [epoch(2024, 1, 1)], 'Values': [1.0]}]}
+
+    response, _ = invoke_with_payload(make_event(['P1D', 'P0D']), payload)
+
+    assert [result['Label'] for result in response['MetricDataResults']] == ['a P1D', 'a P0D']
+    assert response['MetricDataResults'][0]['Timestamps'] == [epoch(2024, 1, 2)]
+    assert response['MetricDataResults'][1]['Timestamps'] == []
+
+
+@pytest.mark.parametrize('text', ['P1Y', 'P1M', 'P13M', '-P1M', 'P2W2D', 'PT1.5H', 'P0,5D', 'P1DT1M', 'PT0S', 'P1Y2M3DT4H5M6.5S'])
+def test_durations_shift_like_the_calendar(text):
+    isodate = pytest.importorskip('isodate')
+    for anchor in (datetime(2024, 3, 31, 12, tzinfo=timezone.utc), datetime(2024, 2, 29, tzinfo=timezone.utc)):
+        assert anchor - shift.parse_duration(text) == anchor - isodate.parse_duration(text)
+
+
+def test_month_shifts_keep_the_day_where_it_exists():
+    assert datetime(2024, 3, 31, tzinfo=timezone.utc) - shift.parse_duration('P1M') == datetime(2024, 2, 29, tzinfo=timezone.utc)
+    assert shift.shift_seconds(shift.parse_duration('P1Y'), epoch(2025, 3, 1)) == 365 * 86400
+
+
+@pytest.mark.parametrize('text', ['', 'P', 'PT', 'P1', '1D', 'P1H', 'PT1D', 'P1DT', 'P1.5Y'])
+def test_invalid_durations_are_rejected(text):
+    with pytest.raises(ValueError):
+        shift.parse_duration(text)
+
+
+def test_clients_are_built_on_first_use():
+    lazy = timeshift.LazyClient('s3')
+    built = MagicMock()
+    with patch('boto3.client', return_value=built) as factory:
+        assert lazy._client is None
+        lazy.head_object(Bucket='bucket', Key='key')
+        lazy.get_object(Bucket='bucket', Key='key')
+
+    factory.assert_called_once_with('s3', config=None)
+    built.head_object.assert_called_once_with(Bucket='bucket', Key='key')
@@ -0,0 +1,195 @@
+"""
+Unit tests for request validation and slicing in the metric migration trigger.
+"""
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+import metric_migrate_trigger.app as trigger
+
+
+def make_body(**overrides):
+    body = {
+        'namespace': 'AWS/Lambda',
+        'metricName': 'Invocations',
+        'dimensions': [{'Name': 'FunctionName', 'Value': 'MyFunction'}],
+        'startTime': '2024-01-01T00:00:00Z',
+        'endTime': '2024-01-01T12:00:00Z',
+        'destinationMetricName': 'ArchivedInvocations',
+        'destinationKey': 'lambda/invocations.csv',
+        'cloudwatchStats': ['Sum']
+    }
+    body.update(overrides)
+    return body
+
+
+def invoke(body, sqs_client):
+    with patch('metric_migrate_trigger.app.sqs_client', sqs_client), \
+         patch.dict(os.environ, {'MIGRATION_QUEUE_URL': 'https://sqs.example/queue'}):
+        return trigger.lambda_handler({'body': json.dumps(body)}, {})
+
+
+def test_slices_are_aligned_to_utc_boundaries():
+    slices = trigger.plan_slices(
+        datetime(2024, 1, 1, 6, tzinfo=timezone.utc),
+        datetime(2024, 1, 3, 18, tzinfo=timezone.utc),
+        24
+    )
+
+    assert [(start.isoformat(), end.isoformat()) for start, end in slices] == [
+        ('2024-01-01T06:00:00+00:00', '2024-01-02T00:00:00+00:00'),
+        ('2024-01-02T00:00:00+00:00', '2024-01-03T00:00:00+00:00'),
+        ('2024-01-03T00:00:00+00:00', '2024-01-03T18:00:00+00:00')
+    ]
+
+
+def test_short_windows_are_sent_as_a_single_message():
+    sqs = MagicMock()
+
+    response = invoke(make_body(), sqs)
+
+    assert response['statusCode'] == 200
+    sqs.send_message.assert_called_once()
+    assert not sqs.send_message_batch.called
+
+
+def test_long_windows_are_sent_as_slices_of_one_job():
+    sqs = MagicMock()
+    sqs.send_message_batch.return_value = {'Successful': []}
+
+    response = invoke(make_body(endTime='2024-01-15T00:00:00Z'), sqs)
+
+    assert response['statusCode'] == 200
+    responseBody = json.loads(response['body'])
+    assert responseBody['slices'] == 14
+    entries = [entry for call in sqs.send_message_batch.call_args_list for entry in call.kwargs['Entries']]
+    # Batches are sent concurrently, so they may arrive in any order
+    assert sorted(len(call.kwargs['Entries']) for call in sqs.send_message_batch.call_args_list) == [4, 10]
+    messages = sorted((json.loads(entry['MessageBody']) for entry in entries), key=lambda message: message['slice']['index'])
+    assert {message['slice']['jobId'] for message in messages} == {responseBody['jobId']}
+    assert [message['slice']['index'] for message in messages] == list(range(14))
+    assert messages[0]['startTime'] == '2024-01-01T00:00:00Z'
+    assert messages[0]['endTime'] == '2024-01-02T00:00:00Z'
+    assert messages[-1]['endTime'] == '2024-01-15T00:00:00Z'
+
+
+def test_slicing_can_be_disabled_per_request():
+    sqs = MagicMock()
+
+    invoke(make_body(endTime='2024-03-01T00:00:00Z', sliceHours=0), sqs)
+
+    sqs.send_message.assert_called_once()
+
+
+def test_default_slices_widen_to_fit_long_windows():
+    sqs = MagicMock()
+    sqs.send_message_batch.return_value = {'Successful': []}
+
+    response = invoke(make_body(startTime='2014-01-01T00:00:00Z', endTime='2024-01-01T00:00:00Z'), sqs)
+
+    assert response['statusCode'] == 200
+    # Ten years of 24 hour slices would be 3652; 96 hour slices take 914
+    assert json.loads(response['body'])['slices'] == 914
+    assert trigger.default_slice_hours(
+        datetime(2024, 1, 1, 6, tzinfo=timezone.utc), datetime(2024, 2, 1, tzinfo=timezone.utc)
+    ) == 24
+
+
+def test_incremental_requests_are_not_sliced():
+    sqs = MagicMock()
+
+    invoke(make_body(endTime='2024-03-01T00:00:00Z', incremental=True), sqs)
+
+    sqs.send_message.assert_called_once()
+    assert json.loads(sqs.send_message.call_args.kwargs['MessageBody'])['incremental'] is True
+
+
+def test_partitioned_requests_are_not_sliced():
+    sqs = MagicMock()
+
+    invoke(make_body(endTime='2024-03-01T00:00:00Z', partitionBy='day'), sqs)
+
+    sqs.send_message.assert_called_once()
+    assert json.loads(sqs.send_message.call_args.kwargs['MessageBody'])['partitionBy'] == 'day'
+
+
+def test_bulk_requests_queue_valid_unique_jobs_in_batches():
+    sqs = MagicMock()
+    sqs.send_message_batch.return_value = {'Successful': []}
+    jobs = [make_body(destinationKey=f"lambda/{n}.csv") for n in range(12)]
+    jobs.append(make_body(cloudwatchStats=['Bogus']))
+    # Same content as the first job with its keys in another order
+    jobs.append(dict(reversed(list(jobs[0].items()))))
+
+    response = invoke(jobs, sqs)
+
+    assert response['statusCode'] == 200
+    responseBody = json.loads(response['body'])
+    assert [job['index'] for job in responseBody['accepted']] == list(range(12))
+    assert [(job['index'], job['error']) for job in responseBody['rejected']] == [(12, 'Validation Error'), (13, 'Duplicate Job')]
+    assert not sqs.send_message.called
+    entries = [entry for call in sqs.send_message_batch.call_args_list for entry in call.kwargs['Entries']]
+    assert sorted(json.loads(entry['MessageBody'])['destinationKey'] for entry in entries) == sorted(f"lambda/{n}.csv" for n in range(12))
+
+
+def test_bulk_jobs_that_fail_to_queue_are_rejected():
+    sqs = MagicMock()
+    sqs.send_message_batch.side_effect = lambda **kwargs: {
+        'Failed': [{'Id': entry['Id']} for entry in kwargs['Entries'] if entry['Id'] == '1']
+    }
+
+    response = invoke([make_body(destinationKey='a.csv'), make_body(destinationKey='b.csv')], sqs)
+
+    responseBody = json.loads(response['body'])
+    assert [job['index'] for job in responseBody['accepted']] == [0]
+    assert [(job['index'], job['error']) for job in responseBody['rejected']] == [(1, 'Enqueue Error')]
+    assert sqs.send_message_batch.call_count == trigger.MAX_SEND_ATTEMPTS
+
+
+def test_bulk_jobs_with_badly_typed_times_are_rejected_on_their_own():
+    sqs = MagicMock()
+    sqs.send_message_batch.return_value = {'Successful': []}
+    jobs = [make_body(destinationKey='a.csv'), make_body(startTime=1704067200), make_body(endTime=None), make_body(destinationKey='b.csv')]
+
+    response = invoke(jobs, sqs)
+
+    assert response['statusCode'] == 200
+    responseBody = json.loads(response['body'])
+    assert [job['index'] for job in responseBody['accepted']] == [0, 3]
+    assert [(job['index'], job['error']) for job in responseBody['rejected']] == [(1, 'Validation Error'), (2, 'Validation Error')]
+
+
+def test_bulk_requests_with_no_valid_jobs_are_rejected():
+    response = invoke([make_body(startTime='yesterday')], MagicMock())
+
+    assert response['statusCode'] == 400
+    assert json.loads(response['body'])['accepted'] == []
+
+
+@pytest.mark.parametrize('overrides, message', [
+    ({'sliceHours': -1}, 'sliceHours'),
+    ({'slice': {'jobId': 'x', 'index': 0, 'count': 1}}, 'slice is reserved'),
+    ({'startTime': '2020-01-01T00:00:00Z', 'endTime': '2024-01-01T00:00:00Z', 'sliceHours': 1}, 'slices'),
+    ({'maxConcurrency': 0}, 'maxConcurrency'),
+    ({'maxTps': 500}, 'maxTps'),
+    ({'incremental': 'yes'}, 'incremental'),
+    ({'period': 90}, 'period'),
+    ({'period': 'hourly'}, 'period'),
+    ({'partitionBy': 'week'}, 'partitionBy'),
+    ({'format': 'parquet'}, 'format'),
+    ({'rollups': [300, 1000]}, 'rollup'),
+    ({'rollups': [3600, 300]}, 'rollup'),
+    ({'rollups': [300], 'cloudwatchStats': ['p99']}, 'rolled up'),
+    ({'rollups': [300], 'cloudwatchStats': ['Average']}, 'SampleCount'),
+    ({'rollups': [300], 'period': 300}, 'larger multiples of period'),
+    ({'format': 'binary', 'incremental': True}, 'binary'),
+])
+def test_invalid_requests_are_rejected(overrides, message):
+    with pytest.raises(ValueError, match=message):
+        trigger.validate_request(make_body(**overrides))
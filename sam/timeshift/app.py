@@ -1,25 +1,58 @@
 # Copyright 2026 Amazon.com and its affiliates; all rights reserved.
 # This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
 
+import datetime
 import json
-import boto3
 import os
 import logging
-import isodate
+from concurrent.futures import ThreadPoolExecutor
+
+from archive_reader import ArchiveFormatError, index_key, read_window
+from key_match import is_key_pattern, list_matching_keys
+from lazy_client import LazyClient
+from pages import PAGE_POINTS, PointBudget, ResponseTooLarge, decode_token, encode_token, new_session, page_results, request_fingerprint, result_points, session_key
+from resample import resample_results
+from result_cache import POINT_BYTES, ResultCache, cache_key
+from rollup_source import choose_rollup
+import stage_metrics
+from shift import parse_duration, sample_shifts, shift_seconds, shift_timestamps, trim_to_window, union_window
 
 # Set up logging FIRST before any other operations
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+logger.setLevel(os.environ.get('LOG_LEVEL', 'INFO'))
+
+# Number of shifted points per result to log at DEBUG level; 0 turns per-point logging off
+DEBUG_SAMPLE_POINTS = int(os.environ.get('TIMESHIFT_DEBUG_SAMPLE_POINTS', '0'))
 
 logger.info("Timeshift Lambda initializing...")
-logger.info(f"Available environment variables: {list(os.environ.keys())}")
 
-lambda_client = boto3.client('lambda')
+# 'lambda' passes queries through to the S3 CSV data source Lambda; 'native' reads the
+# archive straight from S3, falling back to that Lambda for CSVs it does not recognize
+READER_MODE = os.environ.get('TIMESHIFT_READER_MODE', 'lambda')
+if READER_MODE not in ('lambda', 'native'):
+    raise RuntimeError(f"TIMESHIFT_READER_MODE must be 'lambda' or 'native', got '{READER_MODE}'")
+logger.info(f"Reader mode: {READER_MODE}")
+
+# A key argument holding wildcards, or ending with a slash, reads every archive it matches
+MAX_PATTERN_KEYS = int(os.environ.get('TIMESHIFT_MAX_KEYS', '100'))
+MAX_CONCURRENT_KEYS = int(os.environ.get('TIMESHIFT_KEY_CONCURRENCY', '8'))
+
+# Responses over this many points are returned in pages linked by NextToken (see pages.py)
+RESPONSE_PAGE_POINTS = int(os.environ.get('TIMESHIFT_PAGE_POINTS', str(PAGE_POINTS)))
+# Pages requested from a source that pages its own responses before giving up
+MAX_SOURCE_PAGES = 100
+# Points one query may load across its keys, source pages and durations. The whole answer is
+# held while the first page is cut from it, so this has to fit in the function's MemorySize
+MAX_QUERY_POINTS = int(os.environ.get('TIMESHIFT_MAX_POINTS', '1000000'))
+
+# Built on first use: cold starts sit directly in dashboard latency, and a query answered
+# from the result cache or read natively never needs the Lambda client at all
+lambda_client = LazyClient('lambda')
+s3_client = LazyClient('s3')
 
 # Check if the required environment variable exists
-if 'S3_CSV_LOADING_LAMBDA_ARN' not in os.environ:
+if READER_MODE == 'lambda' and not os.environ.get('S3_CSV_LOADING_LAMBDA_ARN'):
     logger.error("CRITICAL: S3_CSV_LOADING_LAMBDA_ARN environment variable is not set!")  # nosemgrep: logging-error-without-handling
-    logger.error(f"Available environment variables: {json.dumps(dict(os.environ), indent=2)}")  # nosemgrep: logging-error-without-handling
     error_msg = """
     S3_CSV_LOADING_LAMBDA_ARN environment variable is required but not set.
     
@@ -36,15 +69,36 @@ if 'S3_CSV_LOADING_LAMBDA_ARN' not in os.environ:
     logger.error(error_msg)  # nosemgrep: logging-error-without-handling
     raise RuntimeError(error_msg)
 
-target_lambda = os.environ['S3_CSV_LOADING_LAMBDA_ARN']
+target_lambda = os.environ.get('S3_CSV_LOADING_LAMBDA_ARN') or None
 logger.info(f"Target Lambda ARN: {target_lambda}")
 
+# Source results are cached across invocations of a warm container, keyed on the object's
+# ETag so a rewritten archive is never served from the cache. TIMESHIFT_CACHE_ENTRIES=0 disables it.
+# The memory tier is bounded by TIMESHIFT_CACHE_MEMORY_MB as well, which has to fit in the function's MemorySize
+result_cache = ResultCache(
+    maxEntries=int(os.environ.get('TIMESHIFT_CACHE_ENTRIES', '64')),
+    maxPoints=int(os.environ.get('TIMESHIFT_CACHE_MEMORY_MB', '64')) * 1024 * 1024 // POINT_BYTES,
+    spillDirectory=os.environ.get('TIMESHIFT_CACHE_DIR', '/tmp/timeshift-cache'),  # nosec B108 - Lambda's only writable directory
+    spillMaxBytes=int(os.environ.get('TIMESHIFT_CACHE_SPILL_MB', '0')) * 1024 * 1024,
+    etagTtl=int(os.environ.get('TIMESHIFT_CACHE_ETAG_TTL', '60'))
+)
+
+# The shifted results of a paged response, kept by the container that cut its first page so
+# the pages after it are cut from them rather than answering the query again. Kept whether or
+# not the source results are cacheable, as the pages of one response must come from one answer
+page_sessions = ResultCache(
+    maxEntries=int(os.environ.get('TIMESHIFT_PAGE_SESSIONS', '4')),
+    maxPoints=int(os.environ.get('TIMESHIFT_PAGE_SESSION_MB', '32')) * 1024 * 1024 // POINT_BYTES
+)
+
 def lambda_handler(event, context):
     logger.info("=== Lambda Handler Invoked ===")
     logger.info(f"Event type: {type(event)}")
-    logger.info(f"Full event: {json.dumps(event, default=str, indent=2)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Full event: {json.dumps(event, default=str, indent=2)}")
     logger.info(f"Context: {context}")
     
+    stage_metrics.begin('timeshift')
     try:
         if 'EventType' not in event:
             logger.error("EventType missing from event")  # nosemgrep: logging-error-without-handling
@@ -65,6 +119,8 @@ def lambda_handler(event, context):
     except Exception as e:
         logger.error(f"Exception in lambda_handler: {str(e)}", exc_info=True)  # nosemgrep: logging-error-without-handling
         raise
+    finally:
+        stage_metrics.emit()
     
 def handleDescribeGetMetricData(event, context):
     description = """
@@ -74,8 +130,9 @@ def handleDescribeGetMetricData(event, context):
 ArgNumber | Type | Description
 ---|---|---
 1 | String | S3 Bucket Name (not ARN or URL - just the name)
-2 | String | S3 Key Name (may include slashes)
-3 | String | an ISO 8601 duration string by which all data should be shifted forward.
+2 | String | S3 Key Name (may include slashes), or the destinationKey of a partitioned archive; a glob (e.g. hosts/*/cpu.csv) or a prefix ending with / reads every archive it matches, each result labeled with its key
+3 | String | an ISO 8601 duration string by which all data should be shifted forward, or a comma-separated list of them (e.g. P1W,P2W,P3W) to overlay several shifts from one read of the archive; each result is then returned once per duration, labeled with it
+4 | String | (optional) comma-separated CSV column names to return; all columns when omitted
 
 ### ISO 8601 example duration strings
 
@@ -98,10 +155,250 @@ P1DT1M | one day + one minute
     }
 
 
+def parseColumns(argument):
+    """Column names from the optional fourth argument, either a list or a comma-separated string"""
+    names = argument if isinstance(argument, list) else str(argument).split(',')
+    columns = [name.strip() for name in names if name and name.strip()]
+    return columns or None
+
+
+def readFromArchive(bucket, key, request, hasWindow, columns):
+    """
+    MetricDataResults read straight from the archive CSV in S3, or None when the
+    query should go to the S3 CSV data source lambda instead.
+    """
+    try:
+        if not hasWindow:
+            raise ArchiveFormatError("the native reader needs a numeric StartTime and EndTime")
+        with stage_metrics.stage('NativeRead'):
+            results = read_window(s3_client, bucket, key, request['StartTime'], request['EndTime'], columns)
+    except ArchiveFormatError as e:
+        if target_lambda is None:
+            raise
+        logger.warning(f"Cannot read s3://{bucket}/{key} natively ({str(e)}); falling back to {target_lambda}")
+        return None
+    return {'MetricDataResults': results}
+
+
+def parseDurations(argument):
+    """ISO 8601 duration strings from the third argument, either a list or a comma-separated string"""
+    names = argument if isinstance(argument, list) else str(argument).split(',')
+    return [str(name).strip() for name in names if name and str(name).strip()]
+
+
+def shiftResults(results, shiftSeconds, hasWindow, windowStart, windowEnd, period):
+    """
+    Shift each result's timestamps forward, trim them to the requested window and
+    resample them to the requested period. The lists in each result are replaced,
+    never modified, so shallow copies of cached results can be passed in.
+    """
+    logSamples = DEBUG_SAMPLE_POINTS > 0 and logger.isEnabledFor(logging.DEBUG)
+    for idx, result in enumerate(results):
+        if 'Timestamps' not in result:
+            logger.warning(f"Result {idx} has no Timestamps field")
+            continue
+
+        origTimestamps = result['Timestamps']
+        with stage_metrics.stage('Shift'):
+            result['Timestamps'] = shift_timestamps(origTimestamps, shiftSeconds)
+            if hasWindow:
+                result['Timestamps'], trimmedValues = trim_to_window(result['Timestamps'], result.get('Values'), windowStart, windowEnd)
+                if trimmedValues is not None:
+                    result['Values'] = trimmedValues
+        logger.info(f"Result {idx} ({result.get('Id', 'unknown')}): shifted {len(origTimestamps)} timestamps by {shiftSeconds}s")
+        if logSamples:
+            for origTime, newTime in sample_shifts(origTimestamps, result['Timestamps'], DEBUG_SAMPLE_POINTS):
+                logger.debug(f"Result {idx} timestamp {origTime} -> {newTime}")
+
+    # Points finer than the requested period are combined here, by the stat of each column,
+    # so that only the series CloudWatch will draw goes back in the response
+    if hasWindow and isinstance(period, int) and not isinstance(period, bool) and period > 1:
+        with stage_metrics.stage('Resample'):
+            dropped = resample_results(results, period, int(windowStart))
+        logger.info(f"Resampled results to {period}s, dropping {dropped} points")
+    return results
+
+
+def isCacheable(response_payload):
+    results = response_payload.get('MetricDataResults') if isinstance(response_payload, dict) else None
+    return isinstance(results, list) and all(result.get('StatusCode', 'Complete') == 'Complete' for result in results)
+
+
+def invokeSource(sourceEvent):
+    """One response of the S3 CSV data source lambda"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Event after removing duration argument: {json.dumps(sourceEvent, default=str, indent=2)}")
+    logger.info(f"Invoking target lambda: {target_lambda}")
+
+    with stage_metrics.stage('LoaderInvoke'):
+        response = lambda_client.invoke(
+            FunctionName=target_lambda,
+            InvocationType='RequestResponse',  # Synchronous invocation
+            Payload=json.dumps(sourceEvent)
+        )
+        payload_bytes = response['Payload'].read()
+    stage_metrics.count('LoaderCalls')
+    stage_metrics.count('LoaderPayloadBytes', len(payload_bytes))
+    logger.info(f"Lambda invoke response status: {response['StatusCode']}")
+    logger.info(f"Response metadata: {json.dumps({k: v for k, v in response.items() if k != 'Payload'}, default=str)}")
+
+    try:
+        # Parsed straight from the bytes, without a decoded copy of the whole payload
+        logger.info(f"Payload size: {len(payload_bytes)} bytes")
+        with stage_metrics.stage('LoaderParse'):
+            response_payload = json.loads(payload_bytes)
+        logger.info(f"Response payload structure: {json.dumps({k: type(v).__name__ for k, v in response_payload.items()})}")
+    except Exception as e:
+        logger.error(f"Failed to parse response payload: {str(e)}", exc_info=True)  # nosemgrep: logging-error-without-handling
+        raise
+    return response_payload
+
+
+def mergeSourcePage(response_payload, page):
+    """Append the points of a later source page to the results of the same Id (or Label) so far"""
+    results = response_payload.setdefault('MetricDataResults', [])
+    byName = {result.get('Id', result.get('Label')): result for result in results}
+    for result in page.get('MetricDataResults', []):
+        existing = byName.get(result.get('Id', result.get('Label')))
+        if existing is None:
+            results.append(result)
+            byName[result.get('Id', result.get('Label'))] = result
+            continue
+        existing.setdefault('Timestamps', []).extend(result.get('Timestamps', []))
+        existing.setdefault('Values', []).extend(result.get('Values', []))
+        if 'StatusCode' in result:
+            existing['StatusCode'] = result['StatusCode']
+    response_payload['NextToken'] = page.get('NextToken')
+    return response_payload
+
+
+def loadSource(event, bucket, key, hasWindow, columns, period, budget, bucketStarts=()):
+    """
+    The source response for one archive over the (already shifted back) window of
+    event: from the result cache, read natively or from the S3 CSV data source lambda.
+    Its MetricDataResults are fresh dicts that can be shifted without touching the cache.
+    bucketStarts are the source times the requested buckets start at, one per shift.
+    Every point loaded is counted against budget, which raises ResponseTooLarge as soon
+    as the query holds more than it allows.
+    """
+    request = event['GetMetricDataRequest']
+    budget.check()
+
+    # Long-range panels ask for coarse periods; serve them from the coarsest rollup of
+    # the archive that still meets the period, and whose buckets line up with the shifted
+    # requested ones, instead of every archived datapoint
+    if isinstance(period, int) and not isinstance(period, bool) and period >= 60:
+        rollupKey = choose_rollup(key, result_cache.object_metadata(s3_client, bucket, key), period, bucketStarts)
+        if rollupKey is not None and result_cache.object_etag(s3_client, bucket, rollupKey) is None:
+            # Rollups are listed before they are built once slices are assembled; until then the archive answers
+            logger.warning(f"Rollup {rollupKey} cannot be read, reading the archive instead")
+            rollupKey = None
+        if rollupKey is not None:
+            logger.info(f"Reading rollup {rollupKey} for period {period}")
+            key = rollupKey
+
+    response_payload = None
+    cacheKey = None
+    if result_cache.enabled and hasWindow:
+        etag = result_cache.object_etag(s3_client, bucket, key)
+        if etag is None and READER_MODE == 'native':
+            # A partitioned archive has no object at its key; its index is rewritten whenever a partition is
+            etag = result_cache.object_etag(s3_client, bucket, index_key(key))
+        if etag is not None:
+            cacheKey = cache_key(bucket, key, etag, request['StartTime'], request['EndTime'], request.get('Period'), columns)
+            cached = result_cache.get(cacheKey)
+            logger.info(f"Result cache {'hit' if cached is not None else 'miss'}: {json.dumps(result_cache.stats())}")
+            stage_metrics.count('CacheHits' if cached is not None else 'CacheMisses')
+            if cached is not None:
+                budget.add(cached)
+                return {'MetricDataResults': [dict(result) for result in cached]}
+
+    if READER_MODE == 'native':
+        response_payload = readFromArchive(bucket, key, request, hasWindow, columns)
+        if response_payload is not None:
+            budget.add(response_payload['MetricDataResults'])
+
+    if response_payload is None:
+        # Pass through the original event, with only the bucket and key as arguments. A source
+        # that pages its response is asked for every page, each folded in as it arrives
+        sourceRequest = {name: value for name, value in request.items() if name != 'NextToken'}
+        sourceRequest['Arguments'] = [bucket, key]
+        for _ in range(MAX_SOURCE_PAGES):
+            page = invokeSource(dict(event, GetMetricDataRequest=sourceRequest))
+            if columns and 'MetricDataResults' in page:
+                page['MetricDataResults'] = [result for result in page['MetricDataResults'] if result.get('Label') in columns]
+            budget.add(page.get('MetricDataResults', []))
+            response_payload = page if response_payload is None else mergeSourcePage(response_payload, page)
+            nextToken = response_payload.pop('NextToken', None)
+            if not nextToken:
+                break
+            logger.info("Source returned a partial response; requesting its next page")
+            sourceRequest = dict(sourceRequest, NextToken=nextToken)
+        else:
+            logger.error(f"Source returned more than {MAX_SOURCE_PAGES} pages")  # nosemgrep: logging-error-without-handling
+            raise RuntimeError(f"Source returned more than {MAX_SOURCE_PAGES} pages for s3://{bucket}/{key}")
+
+    if 'MetricDataResults' not in response_payload:
+        logger.error("MetricDataResults missing from response payload")  # nosemgrep: logging-error-without-handling
+        logger.error(f"Response payload keys: {list(response_payload.keys())}")  # nosemgrep: logging-error-without-handling
+        raise RuntimeError("MetricDataResults missing from response")
+
+    # Shifting replaces the lists in each result, so shallow copies keep the cached ones intact
+    if cacheKey is not None and isCacheable(response_payload):
+        result_cache.put(cacheKey, [dict(result) for result in response_payload['MetricDataResults']])
+    return response_payload
+
+
+def loadSources(event, bucket, keys, hasWindow, columns, period, budget, bucketStarts=()):
+    """
+    (key, MetricDataResults) for each key, loaded side by side on a bounded pool. A key
+    that cannot be loaded gets a single InternalError result instead of failing the others;
+    running out of budget fails the whole query.
+    """
+    sources = []
+    with ThreadPoolExecutor(max_workers=max(1, min(len(keys), MAX_CONCURRENT_KEYS)), thread_name_prefix='key') as executor:
+        futures = [(key, executor.submit(loadSource, event, bucket, key, hasWindow, columns, period, budget, bucketStarts)) for key in keys]
+        for key, future in futures:
+            try:
+                sources.append((key, future.result()['MetricDataResults']))
+            except ResponseTooLarge:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to load s3://{bucket}/{key}: {str(e)}")  # nosemgrep: logging-error-without-handling
+                sources.append((key, [{
+                    'Label': 'Error',
+                    'StatusCode': 'InternalError',
+                    'Messages': [{'Code': 'InternalError', 'Value': f"Error loading s3://{bucket}/{key}: {str(e)}"}],
+                    'Timestamps': [],
+                    'Values': []
+                }]))
+    return sources
+
+
+def labelResult(result, suffix, idSuffix):
+    """Tell apart copies of one result by appending to its Label, and to its Id when it has one"""
+    result['Label'] = f"{result.get('Label', result.get('Id', ''))} {suffix}"
+    if 'Id' in result:
+        result['Id'] = f"{result['Id']}_{idSuffix}"
+    return result
+
+
+def pageResponse(response_payload, shiftedResults, fingerprint, pageStart, session):
+    """response_payload holding the page of shiftedResults from pageStart, and a NextToken when more follow"""
+    page, nextPosition = page_results(shiftedResults, RESPONSE_PAGE_POINTS, *pageStart)
+    response_payload['MetricDataResults'] = page
+    stage_metrics.count('Points', sum(map(result_points, page)))
+    if nextPosition is not None:
+        response_payload['NextToken'] = encode_token(fingerprint, *nextPosition, session)
+        logger.info(f"Returning page from {pageStart} of {sum(map(result_points, shiftedResults))} points; next page from {nextPosition}")
+    return response_payload
+
+
 def handleGetMetricData(event, context):
     try:
         logger.info("=== Starting handleGetMetricData ===")
-        logger.info(f"Event structure: {json.dumps(event, default=str, indent=2)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Event structure: {json.dumps(event, default=str, indent=2)}")
         
         # Validate event structure
         if 'GetMetricDataRequest' not in event:
@@ -121,74 +418,99 @@ def handleGetMetricData(event, context):
             raise RuntimeError(f"Expected at least 3 arguments (bucket, key, duration), got {len(arguments)}")
         
         # Invoke the S3CloudWatchDataSourceLambda
-        durationString = arguments[2]
-        logger.info(f"Duration string from event: {durationString}")
-        
-        try:
-            duration = isodate.parse_duration(durationString)
-            logger.info(f"Parsed duration: {duration} (type: {type(duration)})")
-        except Exception as e:
-            logger.error(f"Failed to parse duration string '{durationString}': {str(e)}")  # nosemgrep: logging-error-without-handling
-            raise RuntimeError(f"Invalid ISO 8601 duration string: {durationString}")
-
-        # Remove the duration argument before passing to target lambda
-        del event['GetMetricDataRequest']['Arguments'][2]
-        
-        logger.info(f"Event after removing duration argument: {json.dumps(event, default=str, indent=2)}")
-        logger.info(f"Invoking target lambda: {target_lambda}")
-        
-        response = lambda_client.invoke(
-            FunctionName=target_lambda,
-            InvocationType='RequestResponse',  # Synchronous invocation
-            Payload=json.dumps(event)  # Pass through the original event, with only the first two arguments
-        )
-        logger.info(f"Lambda invoke response status: {response['StatusCode']}")
-        logger.info(f"Response metadata: {json.dumps({k: v for k, v in response.items() if k != 'Payload'}, default=str)}")
-        
+        durationStrings = parseDurations(arguments[2])
+        logger.info(f"Duration strings from event: {durationStrings}")
+
+        durations = []
+        for durationString in durationStrings:
+            try:
+                durations.append(parse_duration(durationString))
+            except Exception as e:
+                logger.error(f"Failed to parse duration string '{durationString}': {str(e)}")  # nosemgrep: logging-error-without-handling
+                raise RuntimeError(f"Invalid ISO 8601 duration string: {durationString}")
+        if not durations:
+            logger.error("No duration given in the third argument")  # nosemgrep: logging-error-without-handling
+            raise RuntimeError("Invalid ISO 8601 duration string: the third argument is empty")
+        logger.info(f"Parsed durations: {durations}")
+
+        # A NextToken asks for a later page of a response too large to return at once. The page
+        # is cut from the shifted results kept for the token's session; a container without them
+        # answers the query again, normally from the result cache, and keeps them for the next page
+        request = event['GetMetricDataRequest']
+        fingerprint = request_fingerprint(list(arguments), request.get('StartTime'), request.get('EndTime'), request.get('Period'))
+        pageStart, session = (0, 0), new_session()
+        if request.get('NextToken'):
+            resultIndex, pointOffset, session = decode_token(request['NextToken'], fingerprint)
+            pageStart = (resultIndex, pointOffset)
+            sessionResults = page_sessions.get(session_key(fingerprint, session))
+            stage_metrics.count('PageSessionHits' if sessionResults is not None else 'PageSessionMisses')
+            if sessionResults is not None:
+                logger.info(f"Cutting page from {pageStart} out of the results kept for paging session {session}")
+                return pageResponse({}, sessionResults, fingerprint, pageStart, session)
+
+        # Ask the source for the window the dashboard wants, moved back by the shift, so it
+        # only reads the part of the archive that will be shown. Several shifts share one
+        # read of the union of their windows
+        windowStart = request.get('StartTime')
+        windowEnd = request.get('EndTime')
+        hasWindow = all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in (windowStart, windowEnd))
+        if hasWindow:
+            shifts = [shift_seconds(duration, windowEnd) for duration in durations]
+            request['StartTime'], request['EndTime'] = union_window(windowStart, windowEnd, shifts)
+            logger.info(f"Reading source window {request['StartTime']}-{request['EndTime']} for requested window {windowStart}-{windowEnd}")
+        else:
+            logger.warning("GetMetricDataRequest has no numeric StartTime/EndTime; passing the window through unshifted")
+            now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+            shifts = [shift_seconds(duration, now) for duration in durations]
+
+        columns = parseColumns(arguments[3]) if len(arguments) > 3 else None
+
+        # Remove the duration and column arguments; the source only takes the bucket and key
+        bucket, keyArgument = arguments[0], arguments[1]
+        del event['GetMetricDataRequest']['Arguments'][2:]
+
+        period = request.get('Period')
+        # Resampled buckets start at the requested StartTime; without a window only the shifts are known
+        bucketStarts = [windowStart - shift if hasWindow else -shift for shift in shifts]
+        # Every duration gets its own shifted copy of the points loaded
+        budget = PointBudget(MAX_QUERY_POINTS // len(shifts))
+        isPattern = is_key_pattern(keyArgument)
+        if isPattern:
+            keys = list_matching_keys(s3_client, bucket, keyArgument, MAX_PATTERN_KEYS)
+            logger.info(f"{len(keys)} archives match s3://{bucket}/{keyArgument}; loading up to {MAX_CONCURRENT_KEYS} at a time")
+            stage_metrics.count('Keys', len(keys))
+            sources = loadSources(event, bucket, keys, hasWindow, columns, period, budget, bucketStarts)
+            response_payload = {'MetricDataResults': []}
+        else:
+            response_payload = loadSource(event, bucket, keyArgument, hasWindow, columns, period, budget, bucketStarts)
+            sources = [(keyArgument, response_payload['MetricDataResults'])]
+
     except Exception as e:
-        logger.error(f"Exception while calling source lambda: {str(e)}", exc_info=True)  # nosemgrep: logging-error-without-handling
+        logger.error(f"Exception while loading source data: {str(e)}", exc_info=True)  # nosemgrep: logging-error-without-handling
         return {
             'statusCode': 500,
-            'body': f'Error invoking S3CloudWatchDataSourceLambda: {str(e)}'
+            'body': f'Error loading source data: {str(e)}'
         }
 
-    # Read the response payload
-    try:
-        payload_bytes = response['Payload'].read()
-        logger.info(f"Payload size: {len(payload_bytes)} bytes")
-        response_payload = json.loads(payload_bytes.decode('utf-8'))
-        logger.info(f"Response payload structure: {json.dumps({k: type(v).__name__ for k, v in response_payload.items()})}")
-    except Exception as e:
-        logger.error(f"Failed to parse response payload: {str(e)}", exc_info=True)  # nosemgrep: logging-error-without-handling
-        raise
-    
     # Time-shift the timestamps
     try:
-        if 'MetricDataResults' not in response_payload:
-            logger.error("MetricDataResults missing from response payload")  # nosemgrep: logging-error-without-handling
-            logger.error(f"Response payload keys: {list(response_payload.keys())}")  # nosemgrep: logging-error-without-handling
-            raise RuntimeError("MetricDataResults missing from response")
-        
-        for idx, result in enumerate(response_payload['MetricDataResults']):
-            logger.info(f"Processing result {idx}: {result.get('Id', 'unknown')}")
-            
-            if 'Timestamps' not in result:
-                logger.warning(f"Result {idx} has no Timestamps field")
-                continue
-            
-            origTimestamps = result['Timestamps']
-            logger.info(f"Original timestamps count: {len(origTimestamps)}")
-            
-            newTimestamps = []
-            for i, origTime in enumerate(origTimestamps):
-                logger.debug(f"Original timestamp {i}: {origTime} (type: {type(origTime)})")
-                newTime = int(origTime + duration.total_seconds())
-                newTimestamps.append(newTime)
-                if i < 3:  # Log first 3 for debugging
-                    logger.info(f"Timestamp {i}: {origTime} -> {newTime} (shifted by {duration.total_seconds()}s)")
-            
-            result['Timestamps'] = newTimestamps
-            logger.info(f"Result {idx} timestamps shifted successfully")
+        shiftedResults = []
+        for keyIndex, (key, sourceResults) in enumerate(sources):
+            # Several offsets each get a copy of every result, all cut from the same source results.
+            # Labels are only extended after resampling, which reads each column's stat from its label
+            for durationIndex, (durationString, shiftSeconds) in enumerate(zip(durationStrings, shifts)):
+                copies = sourceResults if len(shifts) == 1 else [dict(result) for result in sourceResults]
+                for result in shiftResults(copies, shiftSeconds, hasWindow, windowStart, windowEnd, period):
+                    if isPattern:
+                        labelResult(result, key, keyIndex)
+                    if len(shifts) > 1:
+                        # Durations such as PT1.5H or -P1D would not make valid Ids
+                        labelResult(result, durationString, durationIndex)
+                    shiftedResults.append(result)
+
+        pageResponse(response_payload, shiftedResults, fingerprint, pageStart, session)
+        if 'NextToken' in response_payload:
+            page_sessions.put(session_key(fingerprint, session), shiftedResults)
 
         logger.info("=== handleGetMetricData completed successfully ===")
         logger.info(f"Returning payload with {len(response_payload.get('MetricDataResults', []))} results")
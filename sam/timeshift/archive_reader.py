@@ -0,0 +1,290 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import datetime
+import json
+import logging
+
+from binary_reader import MAGIC as BINARY_MAGIC, BinaryArchiveReader
+from lazy_client import error_code
+
+logger = logging.getLogger()
+
+HEADER_READ_SIZE = 64 * 1024
+PROBE_READ_SIZE = 16 * 1024
+# Once the search has narrowed the start of the window to this many bytes, stream from there
+SCAN_THRESHOLD = 256 * 1024
+MAX_PROBES = 64
+STREAM_CHUNK_SIZE = 256 * 1024
+
+# A partitioned archive has no object at its key, only per-day or per-hour CSVs under
+# <key>/ and an index of them (see migrate_metric/partitions.py)
+INDEX_NAME = '_index.json'
+
+
+class ArchiveFormatError(Exception):
+    """The object is not a CSV archive written by the migrate function"""
+
+
+def parse_epoch(field):
+    try:
+        parsed = datetime.datetime.fromisoformat(field.decode('utf-8'))
+    except (UnicodeDecodeError, ValueError):
+        raise ArchiveFormatError(f"Unexpected timestamp {field[:40]!r}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def object_size(response):
+    contentRange = response.get('ContentRange')
+    if contentRange and '/' in contentRange:
+        return int(contentRange.rsplit('/', 1)[1])
+    return response['ContentLength']
+
+
+class ArchiveReader:
+    """
+    Reads a time range out of an archive CSV written by migrate_metric: a
+    'timestamp,<column>,...' header followed by rows in ascending time order.
+
+    The first row of the range is found with ranged GETs, interpolating on
+    timestamps and falling back to bisection, so only a few small reads are
+    needed before streaming the rows that are actually wanted.
+    """
+
+    def __init__(self, client, bucket, key, response=None, head=None):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.requests = 0 if response is None else 1
+
+        if response is None:
+            response = self._get_object(f"bytes=0-{HEADER_READ_SIZE - 1}")
+            head = response['Body'].read()
+        self.etag = response.get('ETag')
+        self.size = object_size(response)
+        block = head
+        # Read on until the header and the first row are complete
+        while block.count(b'\n') < 2 and len(block) < self.size:
+            block += self._read(len(block), len(block) * 4)
+
+        header, newline, rest = block.partition(b'\n')
+        self.columns = header.decode('utf-8').rstrip('\r').split(',')
+        if self.columns[0] != 'timestamp':
+            raise ArchiveFormatError(f"s3://{bucket}/{key} does not start with a timestamp column")
+        self.columns = self.columns[1:]
+        self.headerEnd = len(header) + len(newline)
+        firstRow = rest.split(b',', 1)[0].split(b'\n', 1)[0]
+        self.firstTimestamp = parse_epoch(firstRow) if firstRow.strip() else None
+
+    def _get_object(self, byteRange, **kwargs):
+        self.requests += 1
+        if getattr(self, 'etag', None) is not None:
+            kwargs['IfMatch'] = self.etag
+        return self.client.get_object(Bucket=self.bucket, Key=self.key, Range=byteRange, **kwargs)
+
+    def _read(self, start, length):
+        return self._get_object(f"bytes={start}-{start + length - 1}")['Body'].read()
+
+    def _row_at_or_after(self, offset):
+        """(offset, timestamp) of the first row starting at or after offset, or (None, None) past the last row"""
+        if offset <= self.headerEnd:
+            return self.headerEnd, self.firstTimestamp
+        readSize = PROBE_READ_SIZE
+        while True:
+            # Start one byte early so a row beginning exactly at offset is found too
+            block = self._read(offset - 1, readSize)
+            newline = block.find(b'\n')
+            if newline >= 0:
+                rowStart = newline + 1
+                rowEnd = block.find(b'\n', rowStart)
+                field = block[rowStart:rowEnd if rowEnd >= 0 else len(block)].split(b',', 1)
+                if rowStart == len(block) and offset - 1 + len(block) >= self.size:
+                    return None, None
+                if len(field) > 1 or rowEnd >= 0 or offset - 1 + len(block) >= self.size:
+                    return offset - 1 + rowStart, parse_epoch(field[0])
+            elif offset - 1 + len(block) >= self.size:
+                return None, None
+            readSize *= 4
+
+    def _last_timestamp(self):
+        start = max(self.headerEnd, self.size - PROBE_READ_SIZE)
+        lastRow = self._read(start, self.size - start).rstrip(b'\n').rsplit(b'\n', 1)[-1]
+        return parse_epoch(lastRow.split(b',', 1)[0])
+
+    def find_offset(self, startEpoch):
+        """Byte offset of a row at or before the first row with timestamp >= startEpoch"""
+        if self.firstTimestamp is None or startEpoch <= self.firstTimestamp:
+            return self.headerEnd
+
+        lo, loTimestamp = self.headerEnd, self.firstTimestamp
+        hi, hiTimestamp = self.size, self._last_timestamp() + 1
+        if hiTimestamp <= startEpoch:
+            return self.size
+
+        # Rows are close to evenly spaced, so interpolating usually lands next to the target.
+        # Each guess is nudged away from the nearer bound so that it moves the bound that is
+        # still far away, and a guess that fails to halve the range is followed by a bisection
+        bisect = False
+        for _ in range(MAX_PROBES):
+            if hi - lo <= SCAN_THRESHOLD:
+                break
+            if bisect or hiTimestamp <= loTimestamp:
+                offset = lo + (hi - lo) // 2
+            else:
+                estimate = lo + int((hi - lo) * (startEpoch - loTimestamp) / (hiTimestamp - loTimestamp))
+                nudge = SCAN_THRESHOLD // 4
+                offset = estimate - nudge if estimate - lo > hi - estimate else estimate + nudge
+            offset = min(hi - 1, max(lo + 1, offset))
+            width = hi - lo
+            rowOffset, rowTimestamp = self._row_at_or_after(offset)
+            if rowOffset is None or rowOffset >= hi:
+                hi = offset
+            elif rowTimestamp < startEpoch:
+                lo, loTimestamp = rowOffset, rowTimestamp
+            else:
+                hi, hiTimestamp = rowOffset, rowTimestamp
+            bisect = not bisect and hi - lo > width // 2
+        return lo
+
+    def iter_rows(self, startEpoch, endEpoch):
+        """Yield (timestamp, fields) for each row with startEpoch <= timestamp < endEpoch"""
+        offset = self.find_offset(startEpoch)
+        if offset >= self.size:
+            return
+        body = self._get_object(f"bytes={offset}-")['Body']
+        try:
+            for line in body.iter_lines(chunk_size=STREAM_CHUNK_SIZE):
+                if not line:
+                    continue
+                fields = line.split(b',')
+                timestamp = parse_epoch(fields[0])
+                if timestamp < startEpoch:
+                    continue
+                if timestamp >= endEpoch:
+                    break
+                yield timestamp, fields
+        finally:
+            body.close()
+
+
+def open_archive(client, bucket, key):
+    """An ArchiveReader or BinaryArchiveReader for the object at key, told apart by its first bytes"""
+    response = client.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{HEADER_READ_SIZE - 1}")
+    head = response['Body'].read()
+    if head.startswith(BINARY_MAGIC):
+        return BinaryArchiveReader(client, bucket, key, response, head, object_size(response))
+    return ArchiveReader(client, bucket, key, response, head)
+
+
+def index_key(key):
+    return key.rstrip('/') + '/' + INDEX_NAME
+
+
+def load_index(client, bucket, key):
+    """The partition index of the archive at key, or None when it is not partitioned"""
+    try:
+        response = client.get_object(Bucket=bucket, Key=index_key(key))
+    except Exception as e:
+        if error_code(e) in ('NoSuchKey', '404'):
+            return None
+        raise
+    return json.loads(response['Body'].read())
+
+
+def overlapping_partitions(index, startEpoch, endEpoch):
+    """The index's partitions holding any time in [startEpoch, endEpoch), with their bounds as epochs"""
+    partitions = []
+    for entry in index['partitions']:
+        partitionStart, partitionEnd = parse_epoch(entry['start'].encode('utf-8')), parse_epoch(entry['end'].encode('utf-8'))
+        if partitionStart < endEpoch and partitionEnd > startEpoch:
+            partitions.append((partitionStart, partitionEnd, entry))
+    return partitions
+
+
+def iter_partition_rows(client, bucket, partitions, startEpoch, endEpoch, counter):
+    """
+    Yield (timestamp, fields) for the rows of each partition inside the window. A
+    partition the window covers completely is read with a single GET; only the
+    partitions at either edge of the window are searched with an ArchiveReader.
+    """
+    for partitionStart, partitionEnd, entry in partitions:
+        if startEpoch <= partitionStart and partitionEnd <= endEpoch:
+            counter['requests'] += 1
+            body = client.get_object(Bucket=bucket, Key=entry['key'])['Body']
+            try:
+                lines = body.iter_lines(chunk_size=STREAM_CHUNK_SIZE)
+                next(lines, None)
+                for line in lines:
+                    if line:
+                        fields = line.split(b',')
+                        yield parse_epoch(fields[0]), fields
+            finally:
+                body.close()
+        else:
+            reader = ArchiveReader(client, bucket, entry['key'])
+            try:
+                yield from reader.iter_rows(startEpoch, endEpoch)
+            finally:
+                counter['requests'] += reader.requests
+
+
+def read_window(client, bucket, key, startEpoch, endEpoch, columns=None):
+    """
+    Build GetMetricData style MetricDataResults, one per archive column (or per
+    requested column), holding the points with startEpoch <= timestamp < endEpoch.
+    Empty cells are gaps and produce no point.
+
+    Binary archives (see binary_reader.py) are recognised by their first bytes. When
+    there is no object at key but a partition index under it, only the partitions
+    overlapping the window are read.
+    """
+    reader = None
+    counter = {'requests': 0}
+    try:
+        reader = open_archive(client, bucket, key)
+    except Exception as e:
+        if error_code(e) not in ('NoSuchKey', '404'):
+            raise
+        # The failed GET of the key and the GET of the index
+        counter['requests'] += 2
+        index = load_index(client, bucket, key)
+        if index is None:
+            raise
+        available = index['header'].split(',')[1:]
+        partitions = overlapping_partitions(index, startEpoch, endEpoch)
+        logger.info(f"Reading {len(partitions)} of {len(index['partitions'])} partitions of s3://{bucket}/{key}")
+        rows = iter_partition_rows(client, bucket, partitions, startEpoch, endEpoch, counter)
+    else:
+        available = reader.columns
+        rows = reader.iter_rows(startEpoch, endEpoch) if isinstance(reader, ArchiveReader) else None
+
+    if columns:
+        missing = [column for column in columns if column not in available]
+        if missing:
+            raise ValueError(f"Columns {missing} not found in s3://{bucket}/{key}; available columns are {available}")
+        selected = [(available.index(column) + 1, column) for column in columns]
+    else:
+        selected = [(index + 1, column) for index, column in enumerate(available)]
+
+    results = [{'StatusCode': 'Complete', 'Label': column, 'Timestamps': [], 'Values': []} for _, column in selected]
+    if rows is None:
+        # Binary archives are decoded a column at a time
+        columnData = reader.read_columns(startEpoch, endEpoch, [index - 1 for index, _ in selected])
+        for result, (timestamps, values) in zip(results, columnData):
+            result['Timestamps'], result['Values'] = timestamps, values
+        logger.info(f"Read {sum(len(result['Values']) for result in results)} points of s3://{bucket}/{key} with {reader.requests} S3 requests")
+        return results
+
+    rowCount = 0
+    for timestamp, fields in rows:
+        rowCount += 1
+        for result, (index, _) in zip(results, selected):
+            if index < len(fields) and fields[index]:
+                result['Timestamps'].append(int(timestamp))
+                result['Values'].append(float(fields[index]))
+
+    requests = reader.requests if reader is not None else counter['requests']
+    logger.info(f"Read {rowCount} rows of s3://{bucket}/{key} with {requests} S3 requests")
+    return results
@@ -0,0 +1,129 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import json
+import operator
+import struct
+import zlib
+from array import array
+from bisect import bisect_left
+from itertools import accumulate, compress
+
+# Layout written by migrate_metric/binary_writer.py; keep the two in step
+MAGIC = b'MAB1'
+FORMAT_VERSION = 1
+BLOCK_HEADER = struct.Struct('<IIqq')
+TRAILER = struct.Struct('<QI4s')
+TAIL_READ_SIZE = 64 * 1024
+
+
+class BinaryFormatError(Exception):
+    """The object starts like a binary archive but cannot be decoded"""
+
+
+def unshuffle(data, typecode):
+    """Undo the byte shuffle of an array of 8 byte words"""
+    count = len(data) // 8
+    raw = bytearray(len(data))
+    for byte in range(8):
+        raw[byte::8] = data[byte * count:(byte + 1) * count]
+    words = array(typecode)
+    words.frombytes(raw)
+    return words
+
+
+def decode_block(data, columnCount, wanted):
+    """
+    Decode one block (header and payload) and return {column: (timestamps, values)}
+    for the column positions in wanted; gaps are left out of both lists.
+    """
+    payloadLength, rows, first, _ = BLOCK_HEADER.unpack_from(data)
+    payload = zlib.decompress(data[BLOCK_HEADER.size:BLOCK_HEADER.size + payloadLength])
+
+    deltas = list(accumulate(unshuffle(payload[:8 * rows], 'q')))
+    deltas[0] = first
+    timestamps = list(accumulate(deltas))
+
+    decoded = {}
+    offset = 8 * rows
+    for column in range(columnCount):
+        presence = payload[offset:offset + rows]
+        offset += rows
+        present = rows - presence.count(0)
+        if column in wanted:
+            bits = array('Q', accumulate(unshuffle(payload[offset:offset + 8 * present], 'Q'), operator.xor))
+            values = array('d', bits.tobytes()).tolist()
+            decoded[column] = (timestamps if present == rows else list(compress(timestamps, presence)), values)
+        offset += 8 * present
+    if offset != len(payload):
+        raise BinaryFormatError(f"Block of {rows} rows has {len(payload)} bytes, expected {offset}")
+    return decoded
+
+
+class BinaryArchiveReader:
+    """
+    Reads a time range out of a binary archive. The footer is located from the
+    trailer at the end of the object, and all the blocks overlapping the range are
+    then fetched with one ranged GET. Small archives are served entirely from the
+    first read.
+
+    response and head are the ranged GET of the start of the object that told it
+    apart from a CSV archive, and its body.
+    """
+
+    def __init__(self, client, bucket, key, response, head, size):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.etag = response.get('ETag')
+        self.size = size
+        self.head = head
+        self.requests = 1
+
+        tailStart = max(0, size - TAIL_READ_SIZE)
+        tail = head[tailStart:] if len(head) >= size else self._read(tailStart, size - tailStart)
+        if len(tail) < TRAILER.size:
+            raise BinaryFormatError(f"s3://{bucket}/{key} is too short to be a binary archive")
+        footerOffset, footerLength, magic = TRAILER.unpack(tail[-TRAILER.size:])
+        if magic != MAGIC:
+            raise BinaryFormatError(f"s3://{bucket}/{key} has no binary archive trailer")
+        if footerOffset >= tailStart:
+            footer = tail[footerOffset - tailStart:footerOffset - tailStart + footerLength]
+        else:
+            footer = self._read(footerOffset, footerLength)
+        footer = json.loads(zlib.decompress(footer))
+        if footer.get('version') != FORMAT_VERSION:
+            raise BinaryFormatError(f"s3://{bucket}/{key} is binary archive version {footer.get('version')}, expected {FORMAT_VERSION}")
+        self.columns = footer['columns']
+        # [offset, length, rows, first timestamp, last timestamp] per block
+        self.blocks = footer['blocks']
+
+    def _read(self, start, length):
+        self.requests += 1
+        return self.client.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{start + length - 1}",
+                                      IfMatch=self.etag)['Body'].read()
+
+    def read_columns(self, startEpoch, endEpoch, positions):
+        """(timestamps, values) for each column position in positions, with startEpoch <= timestamp < endEpoch"""
+        blocks = [block for block in self.blocks if block[3] < endEpoch and block[4] >= startEpoch]
+        columns = [([], []) for _ in positions]
+        if not blocks:
+            return columns
+
+        rangeStart, rangeEnd = blocks[0][0], blocks[-1][0] + blocks[-1][1]
+        data = self.head[rangeStart:rangeEnd] if rangeEnd <= len(self.head) else self._read(rangeStart, rangeEnd - rangeStart)
+
+        wanted = set(positions)
+        for offset, length, _, first, last in blocks:
+            decoded = decode_block(data[offset - rangeStart:offset - rangeStart + length], len(self.columns), wanted)
+            for (timestamps, values), position in zip(columns, positions):
+                blockTimestamps, blockValues = decoded[position]
+                if first >= startEpoch and last < endEpoch:
+                    timestamps.extend(blockTimestamps)
+                    values.extend(blockValues)
+                else:
+                    lo = bisect_left(blockTimestamps, startEpoch)
+                    hi = bisect_left(blockTimestamps, endEpoch, lo)
+                    timestamps.extend(blockTimestamps[lo:hi])
+                    values.extend(blockValues[lo:hi])
+        return columns
@@ -0,0 +1,84 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+from fnmatch import fnmatchcase
+
+from archive_reader import INDEX_NAME
+
+# The key argument is a pattern when it holds shell-style wildcards, or a prefix when it
+# ends with a slash. Objects the migrate function keeps next to an archive are never
+# archives themselves (see migrate_metric/rollups.py, slices.py and checkpoint.py)
+PATTERN_CHARACTERS = '*?['
+AUXILIARY_MARKERS = ('.rollups/', '.slices/')
+AUXILIARY_SUFFIXES = ('.checkpoint.json',)
+
+
+def is_key_pattern(key):
+    return key.endswith('/') or any(character in key for character in PATTERN_CHARACTERS)
+
+
+def key_pattern(key):
+    """The glob a key argument stands for: a prefix matches every archive under it"""
+    return key + '*' if key.endswith('/') else key
+
+
+def literal_prefix(pattern):
+    """The part of the pattern before its first wildcard, used to narrow the listing"""
+    positions = [pattern.find(character) for character in PATTERN_CHARACTERS if character in pattern]
+    return pattern[:min(positions)] if positions else pattern
+
+
+def is_auxiliary(key):
+    """Whether the object is one the migrate function keeps next to an archive"""
+    return any(marker in key for marker in AUXILIARY_MARKERS) or key.endswith(AUXILIARY_SUFFIXES)
+
+
+def indexes_passed(key, lastKey):
+    """
+    Whether a listing in key order that reached lastKey is past the partition index
+    every directory above key would have, so key cannot turn out to be a partition.
+    """
+    directories = key.split('/')[:-1]
+    return all('/'.join(directories[:depth]) + '/' + INDEX_NAME <= lastKey for depth in range(1, len(directories) + 1))
+
+
+def list_matching_keys(client, bucket, key, maxKeys):
+    """
+    Keys of the archives in bucket matching the key argument, in key order. A
+    partitioned archive is listed by its index and stands for everything under its
+    prefix; rollups, slices and checkpoints are left out.
+
+    Raises ValueError when the pattern starts with a wildcard, which would list the
+    whole bucket, or when more than maxKeys match. The listing stops at the first page
+    past which more than maxKeys matches are certain: matches are only counted once
+    the listing is past the index that would make them partitions.
+    """
+    pattern = key_pattern(key)
+    prefix = literal_prefix(pattern)
+    if not prefix:
+        raise ValueError(f"Key pattern '{key}' starts with a wildcard; start it with the prefix the archives are under")
+    indexSuffix = '/' + INDEX_NAME
+    matched = []
+    partitionPrefixes = ()
+    kwargs = {'Bucket': bucket, 'Prefix': prefix}
+    while True:
+        page = client.list_objects_v2(**kwargs)
+        pageKeys = [entry['Key'] for entry in page.get('Contents', [])]
+        for objectKey in pageKeys:
+            if objectKey.endswith(indexSuffix):
+                archiveKey = objectKey[:-len(indexSuffix)]
+                partitionPrefixes += (archiveKey + '/',)
+                # Partitions are listed before their index, and only then known not to be archives
+                matched = [matchedKey for matchedKey in matched if not matchedKey.startswith(archiveKey + '/')]
+                if fnmatchcase(archiveKey, pattern):
+                    matched.append(archiveKey)
+            elif not is_auxiliary(objectKey) and not objectKey.startswith(partitionPrefixes) and fnmatchcase(objectKey, pattern):
+                matched.append(objectKey)
+        if not page.get('IsTruncated'):
+            break
+        if pageKeys and sum(1 for matchedKey in matched if indexes_passed(matchedKey, pageKeys[-1])) > maxKeys:
+            raise ValueError(f"More than {maxKeys} archives match s3://{bucket}/{key}; at most {maxKeys} can be read in one query")
+        kwargs['ContinuationToken'] = page['NextContinuationToken']
+    if len(matched) > maxKeys:
+        raise ValueError(f"{len(matched)} archives match s3://{bucket}/{key}; at most {maxKeys} can be read in one query")
+    return sorted(matched)
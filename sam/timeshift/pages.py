@@ -0,0 +1,117 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import base64
+import binascii
+import hashlib
+import json
+import secrets
+import threading
+
+# A response holds at most this many points across its results, which keeps it well under
+# the 6 MB Lambda response limit: a point is two JSON numbers of at most ~25 characters.
+# Larger responses end with a NextToken; the request carrying it back gets the next page
+PAGE_POINTS = 100000
+TOKEN_VERSION = 2
+
+
+class ResponseTooLarge(Exception):
+    """A query loads more points than one invocation may hold"""
+
+
+class PointBudget:
+    """
+    Points one query may load across its keys and source pages, so that what an
+    invocation holds is bounded before the results are shifted, paged or kept.
+    Safe to share between the threads loading the keys of one pattern query.
+    """
+
+    def __init__(self, maxPoints):
+        self.maxPoints = maxPoints
+        self.points = 0
+        self.lock = threading.Lock()
+
+    def check(self):
+        if self.points > self.maxPoints:
+            raise ResponseTooLarge(
+                f"The query loads more than {self.maxPoints} points; narrow its time range, "
+                "select fewer columns, keys or durations, or ask for a coarser period"
+            )
+
+    def add(self, results):
+        """Count the points of results, raising ResponseTooLarge once the budget is exceeded"""
+        with self.lock:
+            self.points += sum(map(result_points, results))
+        self.check()
+
+
+def request_fingerprint(arguments, startTime, endTime, period):
+    """Ties a page token to the query it was issued for"""
+    query = json.dumps([arguments, startTime, endTime, period], default=str)
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()[:16]
+
+
+def new_session():
+    """Names the pages of one response, so later pages can be cut from the results of the first"""
+    return secrets.token_hex(8)
+
+
+def session_key(fingerprint, session):
+    return json.dumps([fingerprint, session])
+
+
+def encode_token(fingerprint, resultIndex, pointOffset, session):
+    position = json.dumps({'v': TOKEN_VERSION, 'f': fingerprint, 'r': resultIndex, 'p': pointOffset, 's': session})
+    return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii')
+
+
+def decode_token(token, fingerprint):
+    """(result index, point offset, session) a token resumes from; ValueError if it is not one of ours for this query"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError, AttributeError):
+        raise ValueError("NextToken is not a timeshift page token")
+    if not isinstance(position, dict) or position.get('v') != TOKEN_VERSION:
+        raise ValueError("NextToken is not a timeshift page token")
+    if position.get('f') != fingerprint:
+        raise ValueError("NextToken was issued for a different query")
+    return position['r'], position['p'], position['s']
+
+
+def result_points(result):
+    timestamps = result.get('Timestamps')
+    return len(timestamps) if isinstance(timestamps, list) else 0
+
+
+def page_results(results, maxPoints, resultIndex=0, pointOffset=0):
+    """
+    The page of results starting at (resultIndex, pointOffset) holding at most maxPoints
+    points, and the (result index, point offset) of the next page or None after the
+    last. A result split across pages is marked PartialData on all but its last page,
+    as GetMetricData does; the lists of the results passed in are never modified.
+    """
+    page = []
+    remaining = maxPoints
+    while resultIndex < len(results):
+        result = results[resultIndex]
+        points = result_points(result)
+        if points - pointOffset > remaining:
+            if remaining <= 0 and page:
+                return page, (resultIndex, pointOffset)
+            # Always make progress, even when a single point does not fit
+            end = pointOffset + max(remaining, 1)
+            part = dict(result, Timestamps=result['Timestamps'][pointOffset:end], StatusCode='PartialData')
+            if isinstance(result.get('Values'), list):
+                part['Values'] = result['Values'][pointOffset:end]
+            page.append(part)
+            return page, (resultIndex, end)
+        if pointOffset:
+            part = dict(result, Timestamps=result['Timestamps'][pointOffset:])
+            if isinstance(result.get('Values'), list):
+                part['Values'] = result['Values'][pointOffset:]
+            page.append(part)
+        else:
+            page.append(result)
+        remaining -= points - pointOffset
+        resultIndex, pointOffset = resultIndex + 1, 0
+    return page, None
@@ -0,0 +1,160 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+from itertools import groupby
+
+from shift import numpy_for
+
+# How the points of one bucket are combined, by the stat an archive column holds.
+# Columns are named <destinationMetricName>-<Stat>; Average is weighted by SampleCount
+# when it is available. Other stats, percentiles and trimmed means among them, cannot be
+# combined from finer points, so their series are returned at the period they were stored at
+COMBINE_RULES = {'Sum': 'sum', 'SampleCount': 'sum', 'Minimum': 'min', 'Maximum': 'max', 'Average': 'mean'}
+
+
+def column_stat(label):
+    return str(label).rsplit('-', 1)[-1]
+
+
+def combine_rule(label):
+    """How points of this column are combined, or None when they cannot be"""
+    return COMBINE_RULES.get(column_stat(label))
+
+
+def sample_count_label(label):
+    """Label of the SampleCount column that weights an Average column"""
+    stat = column_stat(label)
+    return str(label)[:-len(stat)] + 'SampleCount' if stat == 'Average' else None
+
+
+def average_weights(labels):
+    """
+    {index of each Average result: index of the SampleCount result weighting it}.
+    An archive holds one group of stat columns per metric and the labels repeat from
+    group to group, so an Average is weighted by the SampleCount in its own group: the
+    run of results before a label comes up again (as rollups.average_weights does
+    when the archive is written). An Average without one is left out.
+    """
+    weights = {}
+    group = {}
+    averages = []
+
+    def close_group():
+        for index, countLabel in averages:
+            if countLabel in group:
+                weights[index] = group[countLabel]
+
+    for index, label in enumerate(labels):
+        if label in group:
+            close_group()
+            group, averages = {}, []
+        group[label] = index
+        countLabel = sample_count_label(label)
+        if countLabel is not None:
+            averages.append((index, countLabel))
+    close_group()
+    return weights
+
+
+def is_at_period(timestamps, period):
+    """Whether ascending timestamps are already at least period seconds apart"""
+    if len(timestamps) < 2:
+        return True
+    np = numpy_for(len(timestamps))
+    if np is not None:
+        return int(np.diff(np.asarray(timestamps, dtype=np.int64)).min()) >= period
+    return all(later - earlier >= period for earlier, later in zip(timestamps, timestamps[1:]))
+
+
+def resample(timestamps, values, period, anchorEpoch, rule, weights=None):
+    """
+    Combine points into buckets of period seconds counted from anchorEpoch, each
+    stamped with its start. rule is 'sum', 'min', 'max' or 'mean'; weights, aligned
+    with values, weight the mean. Timestamps must be in ascending order.
+    """
+    if not timestamps:
+        return [], []
+    if weights is not None and len(weights) != len(values):
+        weights = None
+
+    np = numpy_for(len(timestamps))
+    if np is not None:
+        stamps = np.asarray(timestamps, dtype=np.int64)
+        buckets = (stamps - anchorEpoch) // period
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        points = np.asarray(values, dtype=np.float64)
+        if rule == 'sum':
+            combined = np.add.reduceat(points, starts)
+        elif rule == 'min':
+            combined = np.minimum.reduceat(points, starts)
+        elif rule == 'max':
+            combined = np.maximum.reduceat(points, starts)
+        elif weights is not None:
+            pointWeights = np.asarray(weights, dtype=np.float64)
+            totals = np.add.reduceat(pointWeights, starts)
+            weighted = np.add.reduceat(points * pointWeights, starts)
+            unweighted = np.add.reduceat(points, starts) / np.diff(np.append(starts, len(points)))
+            combined = np.where(totals > 0, weighted / np.where(totals > 0, totals, 1), unweighted)
+        else:
+            combined = np.add.reduceat(points, starts) / np.diff(np.append(starts, len(points)))
+        return (buckets[starts] * period + anchorEpoch).tolist(), combined.tolist()
+
+    resampledTimestamps, resampledValues = [], []
+    rows = zip(timestamps, values, weights if weights is not None else [None] * len(values))
+    for bucket, group in groupby(rows, key=lambda row: (row[0] - anchorEpoch) // period):
+        group = list(group)
+        points = [value for _, value, _ in group]
+        if rule == 'sum':
+            combined = sum(points)
+        elif rule == 'min':
+            combined = min(points)
+        elif rule == 'max':
+            combined = max(points)
+        else:
+            total = sum(weight for _, _, weight in group) if weights is not None else 0
+            if total > 0:
+                combined = sum(value * weight for _, value, weight in group) / total
+            else:
+                combined = sum(points) / len(points)
+        resampledTimestamps.append(bucket * period + anchorEpoch)
+        resampledValues.append(combined)
+    return resampledTimestamps, resampledValues
+
+
+def resample_results(results, period, anchorEpoch):
+    """
+    Resample every result with Timestamps and Values in place to period seconds,
+    each by the rule for its column's stat. Series already at the period or coarser,
+    and series of stats that cannot be combined, are left as they are. Returns the
+    number of points dropped.
+    """
+    weightsByIndex = {}
+    for index, countIndex in average_weights([result.get('Label') for result in results]).items():
+        counts = results[countIndex]
+        # Only weight by a SampleCount series holding exactly the same timestamps
+        if counts.get('Timestamps') == results[index].get('Timestamps'):
+            weightsByIndex[index] = counts['Values']
+
+    dropped = 0
+    resampled = []
+    for index, result in enumerate(results):
+        timestamps, values = result.get('Timestamps'), result.get('Values')
+        rule = combine_rule(result.get('Label'))
+        if timestamps is None or values is None or len(timestamps) != len(values) or rule is None:
+            resampled.append(None)
+            continue
+        weights = weightsByIndex.get(index)
+        if timestamps != sorted(timestamps):
+            order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+            timestamps, values = [timestamps[i] for i in order], [values[i] for i in order]
+            weights = [weights[i] for i in order] if weights is not None else None
+        if is_at_period(timestamps, period):
+            resampled.append(None)
+            continue
+        resampled.append(resample(timestamps, values, period, anchorEpoch, rule, weights))
+    # Weights are read from the SampleCount results, so nothing is replaced until every result is resampled
+    for result, series in zip(results, resampled):
+        if series is not None:
+            dropped += len(result['Timestamps']) - len(series[0])
+            result['Timestamps'], result['Values'] = series
+    return dropped
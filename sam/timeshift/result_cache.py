@@ -0,0 +1,206 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger()
+
+# A cached point costs about 80 bytes in memory: an int timestamp, a float value and a
+# list slot for each. ETags are kept for this many objects, the least recently used dropped
+POINT_BYTES = 80
+MAX_ETAGS = 1024
+
+
+def entry_points(value):
+    """Points held by a cached list of results; every entry counts as at least one"""
+    points = 0
+    if isinstance(value, list):
+        for result in value:
+            timestamps = result.get('Timestamps') if isinstance(result, dict) else None
+            points += len(timestamps) if isinstance(timestamps, list) else 0
+    return max(points, 1)
+
+
+def cache_key(bucket, key, etag, startTime, endTime, period=None, columns=None):
+    """Archives only change by being rewritten, so the ETag pins the content a result was read from"""
+    return json.dumps([bucket, key, etag, startTime, endTime, period, columns], default=str)
+
+
+class ResultCache:
+    """
+    Source results for recently queried windows, kept for the life of a warm
+    container. The memory tier is an LRU bounded by entry count and by the total
+    points of its entries; entries it evicts, and entries too large for it, can
+    spill to a directory (normally under /tmp) bounded by total size. Safe to
+    share between the threads reading the keys of one pattern query.
+    """
+
+    def __init__(self, maxEntries, maxPoints=None, spillDirectory=None, spillMaxBytes=0, etagTtl=60):
+        self.maxEntries = maxEntries
+        self.maxPoints = maxPoints
+        self.spillDirectory = spillDirectory if spillMaxBytes > 0 else None
+        self.spillMaxBytes = spillMaxBytes
+        self.etagTtl = etagTtl
+        self.entries = OrderedDict()
+        self.points = {}
+        self.totalPoints = 0
+        self.spilled = OrderedDict()
+        self.spilledBytes = 0
+        self.etags = OrderedDict()
+        self.hits = 0
+        self.spillHits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if self.spillDirectory is not None:
+            self._index_spill_directory()
+
+    @property
+    def enabled(self):
+        return self.maxEntries > 0 and (self.maxPoints is None or self.maxPoints > 0)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'spillHits': self.spillHits,
+            'misses': self.misses,
+            'entries': len(self.entries),
+            'points': self.totalPoints,
+            'spilledEntries': len(self.spilled),
+            'spilledBytes': self.spilledBytes
+        }
+
+    def _head(self, s3, bucket, key):
+        """(ETag, user metadata) of the object, looked up at most once per etagTtl seconds; None if it cannot be read"""
+        now = time.monotonic()
+        with self.lock:
+            cached = self.etags.get((bucket, key))
+            if cached is not None and now - cached[1] < self.etagTtl:
+                self.etags.move_to_end((bucket, key))
+                return cached[0], cached[2]
+        try:
+            head = s3.head_object(Bucket=bucket, Key=key)
+        except Exception as e:
+            # botocore is only imported once a lookup fails, so the connector's init never pays for it
+            from botocore.exceptions import BotoCoreError, ClientError
+            if not isinstance(e, (BotoCoreError, ClientError)):
+                raise
+            logger.warning(f"Cannot look up s3://{bucket}/{key}: {str(e)}")
+            return None
+        with self.lock:
+            self.etags[(bucket, key)] = (head['ETag'], now, head.get('Metadata', {}))
+            self.etags.move_to_end((bucket, key))
+            while len(self.etags) > MAX_ETAGS:
+                self.etags.popitem(last=False)
+        return head['ETag'], head.get('Metadata', {})
+
+    def object_etag(self, s3, bucket, key):
+        """The object's ETag; None if it cannot be read"""
+        head = self._head(s3, bucket, key)
+        return head[0] if head is not None else None
+
+    def object_metadata(self, s3, bucket, key):
+        """The object's user metadata, looked up along with its ETag; None if it cannot be read"""
+        head = self._head(s3, bucket, key)
+        return head[1] if head is not None else None
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            value = self._read_spilled(key)
+            if value is not None:
+                self.spillHits += 1
+                self._remember(key, value)
+                return value
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.enabled:
+            with self.lock:
+                self._remember(key, value)
+
+    def _remember(self, key, value):
+        self._forget(key)
+        points = entry_points(value)
+        if self.maxPoints is not None and points > self.maxPoints:
+            self._spill(key, value)
+            return
+        self.entries[key] = value
+        self.points[key] = points
+        self.totalPoints += points
+        while len(self.entries) > self.maxEntries or (self.maxPoints is not None and self.totalPoints > self.maxPoints):
+            evictedKey = next(iter(self.entries))
+            self._spill(evictedKey, self._forget(evictedKey))
+
+    def _forget(self, key):
+        """Drop key from the memory tier, returning its value"""
+        self.totalPoints -= self.points.pop(key, 0)
+        return self.entries.pop(key, None)
+
+    def _path(self, key):
+        return os.path.join(self.spillDirectory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _index_spill_directory(self):
+        os.makedirs(self.spillDirectory, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.spillDirectory):
+            if entry.is_file() and entry.name.endswith('.json'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.path, stat.st_size))
+        for _, path, size in sorted(files):
+            self.spilled[path] = size
+            self.spilledBytes += size
+
+    def _spill(self, key, value):
+        if self.spillDirectory is None:
+            return
+        data = json.dumps({'key': key, 'value': value}).encode('utf-8')
+        if len(data) > self.spillMaxBytes:
+            return
+        path = self._path(key)
+        self._forget_spilled(path)
+        while self.spilled and self.spilledBytes + len(data) > self.spillMaxBytes:
+            self._forget_spilled(next(iter(self.spilled)))
+        try:
+            with open(path, 'wb') as f:
+                f.write(data)
+        except OSError as e:
+            logger.warning(f"Could not spill a cached result to {path}: {str(e)}")
+            return
+        self.spilled[path] = len(data)
+        self.spilledBytes += len(data)
+
+    def _forget_spilled(self, path):
+        size = self.spilled.pop(path, None)
+        if size is None:
+            return
+        self.spilledBytes -= size
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _read_spilled(self, key):
+        if self.spillDirectory is None:
+            return None
+        path = self._path(key)
+        if path not in self.spilled:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                stored = json.loads(f.read())
+        except (OSError, ValueError):
+            self._forget_spilled(path)
+            return None
+        # The entry moves back to memory; its file is dropped so each result lives in one tier
+        self._forget_spilled(path)
+        return stored['value'] if stored.get('key') == key else None
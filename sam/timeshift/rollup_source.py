@@ -0,0 +1,38 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+# Archives written with rollups list their periods in this user metadata value, and
+# keep each rollup next to the archive (see migrate_metric/rollups.py)
+ROLLUPS_METADATA = 'rollups'
+
+
+def rollup_key(key, period):
+    return f"{key}.rollups/{period}"
+
+
+def parse_rollups(metadata):
+    """Rollup periods listed in an archive's user metadata, finest first"""
+    value = (metadata or {}).get(ROLLUPS_METADATA)
+    if not value:
+        return []
+    try:
+        return sorted(int(period) for period in value.split(','))
+    except ValueError:
+        return []
+
+
+def choose_rollup(key, metadata, period, bucketStarts=()):
+    """
+    Key of the coarsest rollup whose period still divides the requested period, or
+    None when the archive itself has to be read. bucketStarts are the source times
+    the requested buckets start at, one for each shift; a rollup is only chosen when
+    its own buckets start at each of them, so every requested bucket is made of
+    whole rollup buckets.
+    """
+    if isinstance(period, bool) or not isinstance(period, int) or period <= 0:
+        return None
+    usable = [
+        rollupPeriod for rollupPeriod in parse_rollups(metadata)
+        if period % rollupPeriod == 0 and all(start % rollupPeriod == 0 for start in bucketStarts)
+    ]
+    return rollup_key(key, usable[-1]) if usable else None
@@ -0,0 +1,148 @@
+# Copyright 2026 Amazon.com and its affiliates; all rights reserved.
+# This file is Amazon Web Services Content and may not be duplicated or distributed without permission.
+
+import calendar
+import datetime
+import math
+import re
+from itertools import islice, repeat
+from operator import add
+
+# NumPy is optional: it is not in requirements.txt, but when a layer provides it
+# large results are shifted in a single vectorized operation. Importing it takes longer
+# than the rest of the connector's init, so it is only imported once a result is large
+# enough to use it; None once it turns out not to be installed
+NOT_IMPORTED = object()
+numpy = NOT_IMPORTED
+
+# Below this many points converting to and from a NumPy array costs more than it saves
+NUMPY_MIN_POINTS = 256
+
+
+def numpy_for(points):
+    """The numpy module for a series of this many points, or None when the pure Python path should be taken"""
+    global numpy
+    if points < NUMPY_MIN_POINTS:
+        return None
+    if numpy is NOT_IMPORTED:
+        try:
+            import numpy as module
+        except ImportError:  # pragma: no cover - depends on the deployment
+            module = None
+        numpy = module
+    return numpy
+
+
+# ISO 8601 durations: PnYnMnWnDTnHnMnS, any part optional but at least one present, the
+# smallest given part may be fractional. Parsed here rather than with a library to keep
+# the connector's imports, and so its cold start, small
+DURATION_PATTERN = re.compile(
+    r'(?P<sign>[+-])?P(?!$)'
+    r'(?:(?P<years>\d+(?:[.,]\d+)?)Y)?(?:(?P<months>\d+(?:[.,]\d+)?)M)?'
+    r'(?:(?P<weeks>\d+(?:[.,]\d+)?)W)?(?:(?P<days>\d+(?:[.,]\d+)?)D)?'
+    r'(?:T(?=\d)(?:(?P<hours>\d+(?:[.,]\d+)?)H)?(?:(?P<minutes>\d+(?:[.,]\d+)?)M)?(?:(?P<seconds>\d+(?:[.,]\d+)?)S)?)?'
+)
+
+
+class CalendarDuration:
+    """
+    A duration with years or months, which have no fixed length. Subtracting it from a
+    datetime moves back whole months first, keeping the day of the month where it exists
+    (March 31 minus P1M is the last day of February), then by the rest of the duration.
+    """
+
+    def __init__(self, years, months, delta):
+        self.years = years
+        self.months = months
+        self.delta = delta
+
+    def __rsub__(self, other):
+        if not isinstance(other, datetime.datetime):
+            return NotImplemented
+        month = other.month - 1 - (self.years * 12 + self.months)
+        year, month = other.year + month // 12, month % 12 + 1
+        day = min(other.day, calendar.monthrange(year, month)[1])
+        return other.replace(year=year, month=month, day=day) - self.delta
+
+    def __eq__(self, other):
+        return isinstance(other, CalendarDuration) and (self.years, self.months, self.delta) == (other.years, other.months, other.delta)
+
+    def __repr__(self):
+        return f"CalendarDuration(years={self.years}, months={self.months}, delta={self.delta!r})"
+
+
+def parse_duration(text):
+    """
+    A timedelta for an ISO 8601 duration, or a CalendarDuration when it has years or
+    months. Raises ValueError for anything else, including fractional years or months.
+    """
+    match = DURATION_PATTERN.fullmatch(text.strip())
+    if match is None:
+        raise ValueError(f"'{text}' is not an ISO 8601 duration")
+    parts = {name: float(value.replace(',', '.')) for name, value in match.groupdict().items() if name != 'sign' and value is not None}
+    sign = -1 if match.group('sign') == '-' else 1
+    delta = sign * datetime.timedelta(
+        weeks=parts.get('weeks', 0), days=parts.get('days', 0),
+        hours=parts.get('hours', 0), minutes=parts.get('minutes', 0), seconds=parts.get('seconds', 0)
+    )
+    years, months = parts.get('years', 0.0), parts.get('months', 0.0)
+    if not (years.is_integer() and months.is_integer()):
+        raise ValueError(f"'{text}' has fractional years or months, which have no fixed length")
+    if years or months:
+        return CalendarDuration(sign * int(years), sign * int(months), delta)
+    return delta
+
+
+def shift_seconds(duration, anchorEpoch):
+    """
+    Length in seconds of a duration ending at anchorEpoch. Calendar durations such
+    as P1Y or P1M have no fixed length, so they are measured back from the anchor.
+    """
+    anchor = datetime.datetime.fromtimestamp(anchorEpoch, tz=datetime.timezone.utc)
+    return (anchor - (anchor - duration)).total_seconds()
+
+
+def union_window(startEpoch, endEpoch, shifts):
+    """
+    The source window holding the data that lands in [startEpoch, endEpoch) once
+    shifted forward by any of shifts, so that several shifts share one read
+    """
+    return math.floor(startEpoch - max(shifts)), math.ceil(endEpoch - min(shifts))
+
+
+def trim_to_window(timestamps, values, startEpoch, endEpoch):
+    """
+    Keep only the points with startEpoch <= timestamp < endEpoch, keeping values
+    aligned with their timestamps. Returns the inputs unchanged when nothing is trimmed.
+    """
+    np = numpy_for(len(timestamps))
+    if np is not None:
+        stamps = np.asarray(timestamps)
+        keep = (stamps >= startEpoch) & (stamps < endEpoch)
+        if keep.all():
+            return timestamps, values
+        indexes = np.flatnonzero(keep).tolist()
+    else:
+        indexes = [i for i, timestamp in enumerate(timestamps) if startEpoch <= timestamp < endEpoch]
+        if len(indexes) == len(timestamps):
+            return timestamps, values
+
+    trimmedValues = [values[i] for i in indexes] if values is not None and len(values) == len(timestamps) else values
+    return [timestamps[i] for i in indexes], trimmedValues
+
+
+def shift_timestamps(timestamps, shiftSeconds):
+    """
+    Shift epoch-second timestamps by shiftSeconds, truncating each result to an int.
+    The whole list is shifted at once rather than point by point.
+    """
+    np = numpy_for(len(timestamps))
+    if np is not None:
+        shifted = np.asarray(timestamps, dtype=np.float64) + shiftSeconds
+        return shifted.astype(np.int64).tolist()
+    return list(map(int, map(add, timestamps, repeat(shiftSeconds))))
+
+
+def sample_shifts(timestamps, shifted, count):
+    """The first count (original, shifted) pairs, for debug logging"""
+    return list(islice(zip(timestamps, shifted), count))